@@ -0,0 +1,137 @@
+"""
+Batch conversions between images and datasets, fanned out over a process pool:
+    images    images -> LAB datasets (CSV or .bin), e.g. ./dataset -> ./data/resized_batch
+    outputs   segmentation outputs (CSV, .bin or .lbl) -> images, e.g. to look at a batch of results
+The inputs are files, directories or glob patterns. An output newer than its input is left as
+it is (--force converts again). The conversions are headless: nothing is shown, only saved.
+
+    python3 ./plots/batch_convert.py images ./dataset --resize 90 60
+    python3 ./plots/batch_convert.py outputs './results/*.lbl' -o ./data/reconstructed_batch
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from config import in_img_dir, resized_batch_dir, reconstructed_batch_dir
+from csv_to_img import csv_to_img
+from dataset_io import EXTENSION, LABELMAP_EXTENSION
+from img_to_csv import image_to_csv
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff")
+DATASET_EXTENSIONS = (".csv", EXTENSION, LABELMAP_EXTENSION)
+
+
+def expand_inputs(patterns, extensions):
+    """Files of [patterns] (files, directories or globs) with one of [extensions], sorted."""
+    paths = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            candidates = [os.path.join(pattern, name) for name in os.listdir(pattern)]
+        else:
+            candidates = glob.glob(pattern)
+        paths.update(p for p in candidates if os.path.isfile(p) and p.lower().endswith(extensions))
+    return sorted(paths)
+
+
+def up_to_date(input_path, output_path):
+    return os.path.exists(output_path) and os.path.getmtime(output_path) >= os.path.getmtime(input_path)
+
+
+def convert_image(input_path, output_path, resize):
+    """Worker: one image to a dataset (prints go to the worker, only the result comes back)."""
+    start = time.perf_counter()
+    image_to_csv(input_path, output_path, resize)
+    return time.perf_counter() - start
+
+
+def convert_output(input_path, output_path):
+    """Worker: one segmentation output to an image."""
+    start = time.perf_counter()
+    csv_to_img(input_path, output_path, headless=True)
+    return time.perf_counter() - start
+
+
+def run_jobs(jobs, worker, workers, force):
+    """Runs worker(input, output, *extra) for every (input, output, extra) job not up to date."""
+    pending = [job for job in jobs if force or not up_to_date(job[0], job[1])]
+    skipped = len(jobs) - len(pending)
+    print(f"{len(jobs)} inputs: {len(pending)} to convert, {skipped} up to date")
+    if not pending:
+        return 0
+    for _, output_path, _ in pending:
+        os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+
+    failed = 0
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=min(workers, len(pending))) as pool:
+        futures = {pool.submit(worker, input_path, output_path, *extra): (input_path, output_path)
+                   for input_path, output_path, extra in pending}
+        for future in as_completed(futures):
+            input_path, output_path = futures[future]
+            try:
+                print(f"  {input_path} -> {output_path} ({future.result():.2f} s)")
+            except Exception as error:  # keep converting the others
+                failed += 1
+                print(f"  {input_path}: failed ({error})", file=sys.stderr)
+    print(f"{len(pending) - failed} converted in {time.perf_counter() - start:.2f} s"
+          + (f", {failed} failed" if failed else ""))
+    return 1 if failed else 0
+
+
+def images_command(args):
+    inputs = expand_inputs(args.inputs or [in_img_dir], IMAGE_EXTENSIONS)
+    extension = EXTENSION if args.format == "bin" else ".csv"
+    resize = tuple(args.resize) if args.resize else None
+    jobs = []
+    for path in inputs:
+        stem = os.path.splitext(os.path.basename(path))[0]
+        jobs.append((path, os.path.join(args.output_dir, f"{args.prefix}{stem}{extension}"), (resize,)))
+    return run_jobs(jobs, convert_image, args.jobs, args.force)
+
+
+def outputs_command(args):
+    inputs = expand_inputs(args.inputs, DATASET_EXTENSIONS)
+    jobs = []
+    for path in inputs:
+        stem = os.path.splitext(os.path.basename(path))[0]
+        jobs.append((path, os.path.join(args.output_dir, f"{stem}.{args.format}"), ()))
+    return run_jobs(jobs, convert_output, args.jobs, args.force)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert batches of images and datasets in parallel.")
+    parser.add_argument('--jobs', '-j', type=int, default=os.cpu_count() or 1,
+                        help="Worker processes (default: all cores)")
+    parser.add_argument('--force', '-f', action='store_true',
+                        help="Convert again even when the output is newer than its input")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    images = subparsers.add_parser("images", help="Images -> LAB datasets")
+    images.add_argument('inputs', nargs='*',
+                        help=f"Image files, directories or glob patterns (default: {in_img_dir})")
+    images.add_argument('--output-dir', '-o', default=resized_batch_dir,
+                        help=f"Output directory (default: {resized_batch_dir})")
+    images.add_argument('--resize', '-r', type=int, nargs=2, metavar=('WIDTH', 'HEIGHT'),
+                        help="Resize the images to WIDTH HEIGHT (default: original size)")
+    images.add_argument('--format', choices=["csv", "bin"], default="csv",
+                        help="Dataset format (default: csv)")
+    images.add_argument('--prefix', default="resized_",
+                        help="Prefix of the output names (default: resized_, as in data/resized_batch)")
+    images.set_defaults(func=images_command)
+
+    outputs = subparsers.add_parser("outputs", help="Segmentation outputs (CSV, .bin, .lbl) -> images")
+    outputs.add_argument('inputs', nargs='+', help="Output files, directories or glob patterns")
+    outputs.add_argument('--output-dir', '-o', default=reconstructed_batch_dir,
+                         help=f"Output directory (default: {reconstructed_batch_dir})")
+    outputs.add_argument('--format', choices=["png", "jpg"], default="png",
+                         help="Image format (default: png, lossless)")
+    outputs.set_defaults(func=outputs_command)
+
+    args = parser.parse_args()
+    sys.exit(args.func(args))
+
+
+if __name__ == "__main__":
+    main()
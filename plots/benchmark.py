@@ -0,0 +1,414 @@
+"""
+Benchmark harness: builds every target once, then runs every (variant, dataset, threads,
+bandwidth, kernel) combination of a YAML config with warm-up runs and repetitions, threads
+pinned with OMP_PLACES / OMP_PROC_BIND. The times come from the run records (--metrics-out).
+
+    python ./plots/benchmark.py run --config benchmark.yaml        # build, run, summary
+    python ./plots/benchmark.py summary --config benchmark.yaml    # table + baseline comparison
+    python ./plots/benchmark.py baseline --config benchmark.yaml   # save the results as baseline
+    python ./plots/benchmark.py sbatchman --config benchmark.yaml  # one sbatchman job per thread count
+
+With a weak_scaling section (benchmark_weak.yaml) the datasets are synthetic (synthetic_dataset.py),
+generated for every thread count with points_per_thread x threads points.
+
+Results:
+    <results_dir>/benchmark/<combination>.json      samples and statistics of every combination
+    <results_dir>/<variant>/<variant>_<t>_threads.jsonl   run records (read by strong_scaling.py)
+    <results_dir>/benchmark_summary.csv             one row per combination, with the baseline change
+"""
+import argparse
+import glob
+import json
+import math
+import os
+import re
+import socket
+import subprocess
+import sys
+import time
+import numpy as np
+import yaml
+from utils import load_run_records
+from config import strong_scaling_dir
+
+DEFAULT_CONFIG = "./benchmark.yaml"
+
+DEFAULTS = {
+    "build_dir": "./build",
+    "results_dir": strong_scaling_dir,
+    "warmups": 1,
+    "repetitions": 5,
+    "confidence": 0.95,         # of the intervals and of the slowdown test (0.90, 0.95 or 0.99)
+    "slowdown_threshold": 0.03, # slowdowns smaller than this fraction of the baseline are not flagged
+    "timers": ["slic", "mean_shift"],  # run record timers added up into the measured time
+    "pinning": {"OMP_PLACES": "cores", "OMP_PROC_BIND": "close"},
+    "variants": [],
+    "datasets": [],
+    "threads": [1],
+    "bandwidths": [None],       # None: default of the binary
+    "kernels": [None],
+    "timeout": None,            # seconds per run
+    "weak_scaling": None,       # {points_per_thread, modes, spread, duplicates, layout, seed}: synthetic datasets
+}
+
+WEAK_SCALING_DEFAULTS = {"points_per_thread": 4096, "modes": 8, "spread": 5.0, "duplicates": 0.0,
+                         "layout": "regions", "seed": 0}
+
+# Student t quantiles (df = 1..30, 40, 60, 120, normal beyond), for the intervals and Welch's test
+T_TABLE_DF = (1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16, 17, 18, 19, 20, 21, 22, 23, 24, 25, 26, 27, 28, 29, 30, 40, 60, 120)
+T_TABLE = {
+    0.9: (3.078, 1.886, 1.638, 1.533, 1.476, 1.440, 1.415, 1.397, 1.383, 1.372, 1.363, 1.356, 1.350, 1.345, 1.341, 1.337, 1.333, 1.330, 1.328, 1.325, 1.323, 1.321, 1.319, 1.318, 1.316, 1.315, 1.314, 1.313, 1.311, 1.310, 1.303, 1.296, 1.289),
+    0.95: (6.314, 2.920, 2.353, 2.132, 2.015, 1.943, 1.895, 1.860, 1.833, 1.812, 1.796, 1.782, 1.771, 1.761, 1.753, 1.746, 1.740, 1.734, 1.729, 1.725, 1.721, 1.717, 1.714, 1.711, 1.708, 1.706, 1.703, 1.701, 1.699, 1.697, 1.684, 1.671, 1.658),
+    0.975: (12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228, 2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093, 2.086, 2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042, 2.021, 2.000, 1.980),
+    0.99: (31.821, 6.965, 4.541, 3.747, 3.365, 3.143, 2.998, 2.896, 2.821, 2.764, 2.718, 2.681, 2.650, 2.624, 2.602, 2.583, 2.567, 2.552, 2.539, 2.528, 2.518, 2.508, 2.500, 2.492, 2.485, 2.479, 2.473, 2.467, 2.462, 2.457, 2.423, 2.390, 2.358),
+    0.995: (63.657, 9.925, 5.841, 4.604, 4.032, 3.707, 3.499, 3.355, 3.250, 3.169, 3.106, 3.055, 3.012, 2.977, 2.947, 2.921, 2.898, 2.878, 2.861, 2.845, 2.831, 2.819, 2.807, 2.797, 2.787, 2.779, 2.771, 2.763, 2.756, 2.750, 2.704, 2.660, 2.617),
+}
+NORMAL_QUANTILES = {0.9: 1.282, 0.95: 1.645, 0.975: 1.960, 0.99: 2.326, 0.995: 2.576}
+
+
+# ---------------- statistics ----------------
+def t_quantile(p, df):
+    """Quantile [p] of Student's t with [df] degrees of freedom (the largest tabulated df <= df)."""
+    p = round(p, 3)
+    if p not in T_TABLE:
+        raise ValueError(f"Unsupported quantile {p}: confidence must be one of 0.90, 0.95, 0.99")
+    if df < 1:
+        return math.inf
+    if df > T_TABLE_DF[-1]:
+        return NORMAL_QUANTILES[p]
+    column = max(i for i, tabulated in enumerate(T_TABLE_DF) if tabulated <= df)
+    return T_TABLE[p][column]
+
+
+def describe(samples, confidence):
+    """Mean, standard deviation and confidence interval (half-width) of the samples."""
+    values = np.asarray(samples, dtype=float)
+    n = len(values)
+    stats = {"n": n, "mean": float(values.mean()), "median": float(np.median(values)),
+             "min": float(values.min()), "max": float(values.max()), "std": 0.0, "ci": None}
+    if n > 1:
+        stats["std"] = float(values.std(ddof=1))
+        stats["ci"] = t_quantile((1 + confidence) / 2, n - 1) * stats["std"] / math.sqrt(n)
+    return stats
+
+
+def compare(baseline, current, confidence, threshold):
+    """Welch's one-sided t-test of current > baseline. Returns (relative change, slowdown flag)."""
+    change = (current["mean"] - baseline["mean"]) / baseline["mean"]
+    if current["n"] < 2 or baseline["n"] < 2:
+        return change, None  # no variance: no test
+    var_current = current["std"] ** 2 / current["n"]
+    var_baseline = baseline["std"] ** 2 / baseline["n"]
+    standard_error = math.sqrt(var_current + var_baseline)
+    if standard_error == 0:
+        significant = current["mean"] > baseline["mean"]
+    else:
+        t_value = (current["mean"] - baseline["mean"]) / standard_error
+        df = (var_current + var_baseline) ** 2 / (
+            var_current ** 2 / (current["n"] - 1) + var_baseline ** 2 / (baseline["n"] - 1))
+        significant = t_value > t_quantile(confidence, math.floor(df))
+    return change, bool(significant and change > threshold)
+
+
+# ---------------- configuration ----------------
+def load_config(path):
+    with open(path, "r", encoding="utf-8") as f:
+        config = {**DEFAULTS, **(yaml.safe_load(f) or {})}
+    if not config["variants"]:
+        raise ValueError(f"{path}: no variants to run")
+    for variant in config["variants"]:
+        variant.setdefault("args", [])
+        if "name" not in variant or "target" not in variant:
+            raise ValueError(f"{path}: every variant needs a name and a target")
+    if config["weak_scaling"] is not None:
+        config["weak_scaling"] = {**WEAK_SCALING_DEFAULTS, **config["weak_scaling"]}
+        config["datasets"] = []
+    datasets = []
+    for pattern in config["datasets"]:
+        matches = sorted(glob.glob(pattern))
+        if not matches:
+            print(f"Warning: no dataset matches {pattern}")
+        datasets.extend(matches)
+    config["datasets"] = datasets
+    config.setdefault("baseline", os.path.join(config["results_dir"], "baseline.json"))
+    t_quantile(config["confidence"], 1)  # validates the confidence
+    return config
+
+
+def weak_dataset_path(config, threads):
+    """Synthetic dataset of the weak scaling run with [threads] threads (named after its parameters)."""
+    weak = config["weak_scaling"]
+    points = weak["points_per_thread"] * threads
+    name = (f"synthetic_{points}_k{weak['modes']}_s{weak['spread']:g}_d{weak['duplicates']:g}"
+            f"_{weak['layout']}_seed{weak['seed']}.bin")
+    return os.path.join(config["results_dir"], "datasets", name)
+
+
+def generate_weak_datasets(config, combos):
+    """Generates the missing synthetic datasets of the weak scaling combinations."""
+    from synthetic_dataset import generate_dataset, grid_shape, save_dataset
+    weak = config["weak_scaling"]
+    for t in sorted({combo["threads"] for combo in combos}):
+        path = weak_dataset_path(config, t)
+        if os.path.exists(path):
+            continue
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        width, height = grid_shape(weak["points_per_thread"] * t)
+        values, _labels = generate_dataset(width, height, weak["modes"], weak["spread"], weak["duplicates"],
+                                           weak["layout"], weak["seed"])
+        save_dataset(path, values, width, height)
+        print(f"Generated {path} ({width}x{height})")
+
+
+def combinations(config, threads=None, variants=None):
+    for variant in config["variants"]:
+        if variants and variant["name"] not in variants:
+            continue
+        for t in config["threads"]:
+            if threads and t not in threads:
+                continue
+            datasets = [weak_dataset_path(config, t)] if config["weak_scaling"] else config["datasets"]
+            for dataset in datasets:
+                for bandwidth in config["bandwidths"]:
+                    for kernel in config["kernels"]:
+                        yield {"variant": variant["name"], "target": variant["target"], "args": variant["args"],
+                               "dataset": dataset, "threads": t, "bandwidth": bandwidth, "kernel": kernel}
+
+
+def combination_key(combo):
+    dataset = os.path.splitext(os.path.basename(combo["dataset"]))[0]
+    key = f"{combo['variant']}__{dataset}__t{combo['threads']}__bw{combo['bandwidth'] or 'default'}__{combo['kernel'] or 'default'}"
+    return re.sub(r"[^\w.\-]", "_", key)
+
+
+# ---------------- build and run ----------------
+def build_targets(config, targets):
+    """Builds every target once (configuring the build directory if needed)."""
+    build_dir = config["build_dir"]
+    if not os.path.exists(os.path.join(build_dir, "CMakeCache.txt")):
+        subprocess.run(["cmake", "-B", build_dir, "-DCMAKE_BUILD_TYPE=Release"], check=True)
+    for target in sorted(targets):
+        print(f"Building {target}...")
+        subprocess.run(["cmake", "--build", build_dir, "--target", target, "--parallel"], check=True)
+
+
+def run_binary(config, combo, record_path, log):
+    """One run of the combination. Returns (run record, wall time in seconds)."""
+    command = [os.path.abspath(os.path.join(config["build_dir"], combo["target"])), *map(str, combo["args"]),
+               "-i", os.path.abspath(combo["dataset"]),
+               "-o", os.path.abspath(os.path.join(config["results_dir"], "output", f"{combination_key(combo)}.bin")),
+               "--metrics-out", os.path.abspath(record_path)]
+    if combo["bandwidth"] is not None:
+        command += ["-b", str(combo["bandwidth"])]
+    if combo["kernel"] is not None:
+        command += ["-k", combo["kernel"]]
+
+    env = {**os.environ, **{k: str(v) for k, v in config["pinning"].items()}, "OMP_NUM_THREADS": str(combo["threads"])}
+    log.write(f"$ {' '.join(command)}\n")
+    log.flush()
+    start = time.perf_counter()
+    subprocess.run(command, env=env, stdout=log, stderr=subprocess.STDOUT, check=True, timeout=config["timeout"])
+    wall = time.perf_counter() - start
+    records = load_run_records(record_path)
+    if not records:
+        raise RuntimeError(f"{combo['target']} wrote no run record")
+    return records[-1], wall
+
+
+def measured_time(config, record, wall):
+    timers = record.get("timers", {})
+    if not any(label in timers for label in config["timers"]):
+        return wall  # binary built without TOTAL_TIMING: whole process
+    return sum(timers.get(label, 0.0) for label in config["timers"])
+
+
+def run_combination(config, combo, log):
+    # One scratch record per combination and process: the sbatchman jobs of a sweep share results_dir
+    scratch = os.path.join(config["results_dir"], "benchmark", f"{combination_key(combo)}.{os.getpid()}.jsonl")
+    records_path = os.path.join(config["results_dir"], combo["variant"],
+                                f"{combo['variant']}_{combo['threads']}_threads.jsonl")
+    os.makedirs(os.path.dirname(records_path), exist_ok=True)
+
+    samples, walls, points = [], [], None
+    for run in range(config["warmups"] + config["repetitions"]):
+        if os.path.exists(scratch):
+            os.remove(scratch)
+        record, wall = run_binary(config, combo, scratch, log)
+        if run < config["warmups"]:
+            continue
+        samples.append(measured_time(config, record, wall))
+        points = record.get("n")
+        walls.append(wall)
+        with open(records_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+    if os.path.exists(scratch):
+        os.remove(scratch)
+
+    return {
+        "key": combination_key(combo),
+        **{k: combo[k] for k in ("variant", "target", "args", "dataset", "threads", "bandwidth", "kernel")},
+        "points": points,
+        "host": socket.gethostname(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "warmups": config["warmups"],
+        "pinning": config["pinning"],
+        "timers": config["timers"],
+        "samples": samples,
+        "wall_samples": walls,
+        "stats": describe(samples, config["confidence"]),
+    }
+
+
+def run(config, args):
+    combos = list(combinations(config, args.threads, args.variants))
+    if not combos:
+        print("Nothing to run: check the variants, datasets and threads of the config")
+        return 1
+    if not args.skip_build and not args.dry_run:
+        build_targets(config, {combo["target"] for combo in combos})
+    if config["weak_scaling"] and not args.dry_run:
+        generate_weak_datasets(config, combos)
+
+    results_dir = os.path.join(config["results_dir"], "benchmark")
+    os.makedirs(results_dir, exist_ok=True)
+    os.makedirs(os.path.join(config["results_dir"], "output"), exist_ok=True)
+    log_path = os.path.join(config["results_dir"], "benchmark.log")
+    with open(log_path, "a", encoding="utf-8") as log:
+        for i, combo in enumerate(combos, 1):
+            key = combination_key(combo)
+            print(f"[{i}/{len(combos)}] {key}: {config['warmups']} warm-up + {config['repetitions']} runs")
+            if args.dry_run:
+                continue
+            result = run_combination(config, combo, log)
+            with open(os.path.join(results_dir, f"{key}.json"), "w", encoding="utf-8") as f:
+                json.dump(result, f, indent=2)
+            stats = result["stats"]
+            ci = f" +/- {stats['ci']:.4f}" if stats["ci"] is not None else ""
+            print(f"    {stats['mean']:.4f}{ci} s (std {stats['std']:.4f}, n={stats['n']})")
+    print(f"Output of the runs in {log_path}")
+    return 0 if args.dry_run else summary(config, args)
+
+
+# ---------------- results ----------------
+def load_results(config):
+    results = {}
+    for path in sorted(glob.glob(os.path.join(config["results_dir"], "benchmark", "*.json"))):
+        with open(path, "r", encoding="utf-8") as f:
+            result = json.load(f)
+        results[result["key"]] = result
+    return results
+
+
+def load_baseline(path):
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def summary(config, args):
+    results = load_results(config)
+    if not results:
+        print(f"No results in {config['results_dir']}/benchmark: run the benchmark first")
+        return 1
+    baseline = load_baseline(config["baseline"])
+    confidence = config["confidence"]
+
+    header = ["variant", "dataset", "threads", "bandwidth", "kernel", "n", "mean_s", "ci_s", "std_s",
+              "baseline_mean_s", "change_pct", "slowdown"]
+    rows, slowdowns = [], []
+    for key, result in sorted(results.items()):
+        stats = result["stats"]
+        row = [result["variant"], os.path.basename(result["dataset"]), result["threads"], result["bandwidth"],
+               result["kernel"], stats["n"], f"{stats['mean']:.4f}",
+               "" if stats["ci"] is None else f"{stats['ci']:.4f}", f"{stats['std']:.4f}", "", "", ""]
+        if key in baseline:
+            change, slowdown = compare(baseline[key]["stats"], stats, confidence, config["slowdown_threshold"])
+            row[9] = f"{baseline[key]['stats']['mean']:.4f}"
+            row[10] = f"{100 * change:+.1f}"
+            row[11] = "n/a" if slowdown is None else ("SLOWER" if slowdown else "")
+            if slowdown:
+                slowdowns.append(key)
+        rows.append([str(cell) if cell is not None else "" for cell in row])
+
+    widths = [max(len(row[c]) for row in [header] + rows) for c in range(len(header))]
+    for row in [header] + rows:
+        print("  ".join(cell.ljust(width) for cell, width in zip(row, widths)))
+
+    summary_path = os.path.join(config["results_dir"], "benchmark_summary.csv")
+    with open(summary_path, "w", encoding="utf-8") as f:
+        for row in [header] + rows:
+            f.write(",".join(row) + "\n")
+    print(f"Summary saved to {summary_path}")
+
+    if not baseline:
+        print(f"No baseline in {config['baseline']} (save one with: benchmark.py baseline)")
+        return 0
+    if slowdowns:
+        print(f"{len(slowdowns)} significant slowdown(s) against the baseline "
+              f"(one-sided Welch test at {confidence:.0%}, > {config['slowdown_threshold']:.0%}):")
+        for key in slowdowns:
+            print(f"  - {key}")
+        return 2
+    print("No significant slowdown against the baseline")
+    return 0
+
+
+def save_baseline(config, args):
+    results = load_results(config)
+    if not results:
+        print(f"No results in {config['results_dir']}/benchmark: run the benchmark first")
+        return 1
+    os.makedirs(os.path.dirname(os.path.abspath(config["baseline"])), exist_ok=True)
+    with open(config["baseline"], "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"Baseline of {len(results)} combinations saved to {config['baseline']}")
+    return 0
+
+
+def sbatchman(config, args):
+    """Writes an sbatchman launch file with one job per thread count, on the "<t>cpu" configs of
+    sbatchman_configs.yaml. Every job runs its combinations; 'summary' then reads all the results."""
+    if not args.skip_build:
+        build_targets(config, {variant["target"] for variant in config["variants"]})
+    launch = {
+        "variables": {"nCPUs": list(config["threads"])},
+        "command": f"python3 ./plots/benchmark.py run --config {args.config} --skip-build --threads {{nCPUs}}",
+        "jobs": [{"config": "{nCPUs}cpu", "config_jobs": [{"tag": "benchmark__{nCPUs}"}]}],
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        yaml.safe_dump(launch, f, sort_keys=False, width=1000)
+    print(f"sbatchman launch file saved to {args.output}")
+    print(f"Launch it with: sbatchman launch -f {args.output}")
+    print(f"then, once the jobs completed: python ./plots/benchmark.py summary --config {args.config}")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark harness for the mean-shift and SLIC binaries.")
+    parser.add_argument("--config", "-c", type=str, default=DEFAULT_CONFIG,
+                        help=f"YAML benchmark configuration (default: {DEFAULT_CONFIG})")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Build the targets, run the combinations, print the summary")
+    run_parser.add_argument("--threads", type=int, nargs="+", help="Only these thread counts")
+    run_parser.add_argument("--variants", nargs="+", help="Only these variants")
+    run_parser.add_argument("--skip-build", action="store_true", help="Use the binaries already built")
+    run_parser.add_argument("--dry-run", action="store_true", help="List the combinations without running them")
+
+    commands.add_parser("summary", help="Print the results and compare them with the baseline")
+    commands.add_parser("baseline", help="Save the current results as the baseline")
+
+    sbatchman_parser = commands.add_parser("sbatchman", help="Write an sbatchman launch file (one job per thread count)")
+    sbatchman_parser.add_argument("--output", "-o", type=str, default="./sbatchman_benchmark.yaml",
+                                  help="Launch file to write (default: ./sbatchman_benchmark.yaml)")
+    sbatchman_parser.add_argument("--skip-build", action="store_true", help="Use the binaries already built")
+
+    args = parser.parse_args()
+    config = load_config(args.config)
+    handlers = {"run": run, "summary": summary, "baseline": save_baseline, "sbatchman": sbatchman}
+    sys.exit(handlers[args.command](config, args))
+
+
+if __name__ == "__main__":
+    main()
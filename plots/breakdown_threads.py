@@ -0,0 +1,128 @@
+import os
+import numpy as np
+from results_store import open_store
+from utils import pyplot
+from config import (timing_colors, output_plots_dir, breakdown_threads_path_mean_shift,
+                    FONT_AXES, FONT_TICKS, FONT_LEGEND)
+
+# Per-thread phases of the shifting loop, timed inside the parallel region
+timing_labels = [
+    "distance_shift",
+    "coords_update",
+    "kernel",
+    "distance_kernel"
+]
+balance_label = "shift_points"
+
+def input_paths():
+    return [breakdown_threads_path_mean_shift] if os.path.exists(breakdown_threads_path_mean_shift) else []
+
+
+def load(store):
+    """Last run of every thread count (records written by breakdown_mean_shift --metrics-out), None without any."""
+    if not os.path.exists(breakdown_threads_path_mean_shift):
+        print(f"Error: File {breakdown_threads_path_mean_shift} does not exist!")
+        return None
+
+    runs = {}
+    for record in store.runs(source=breakdown_threads_path_mean_shift):
+        per_thread = record.get("per_thread", {})
+        if f"{balance_label}_busy" in per_thread:
+            runs[len(per_thread[f"{balance_label}_busy"])] = record
+
+    if not runs:
+        print(f"Error: no per-thread timers in {breakdown_threads_path_mean_shift}")
+        return None
+    return runs
+
+
+def render(runs, output_dir=output_plots_dir):
+    """Phases and busy / idle time per thread of every run, and the imbalance. Returns the saved paths."""
+    plt = pyplot()
+    saved = []
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+
+    for num_threads, record in sorted(runs.items()):
+        per_thread = record["per_thread"]
+        busy = np.array(per_thread[f"{balance_label}_busy"])
+        idle = np.array(per_thread[f"{balance_label}_idle"])
+        items = np.array(per_thread[f"{balance_label}_items"])
+        y = np.arange(num_threads)
+
+        fig, (ax_phases, ax_balance) = plt.subplots(1, 2, figsize=(14, max(4.5, 0.35 * num_threads + 2.5)), sharey=True)
+
+        # Left: time of every phase per thread
+        left = np.zeros(num_threads)
+        for label in timing_labels:
+            widths = np.array(per_thread.get(label, [0.0] * num_threads))
+            ax_phases.barh(y, widths, left=left, color=timing_colors[label], label=label)
+            left += widths
+        ax_phases.set_xlabel("Execution Time (s)", fontsize=FONT_AXES)
+        ax_phases.set_ylabel("Thread", fontsize=FONT_AXES)
+        ax_phases.set_title("Phases per thread", fontsize=FONT_AXES)
+        ax_phases.set_xlim(0, left.max() * 1.15 if left.max() > 0 else 1)
+        ax_phases.legend(loc="upper center", bbox_to_anchor=(0.5, -0.16), ncol=len(timing_labels), fontsize=FONT_LEGEND)
+
+        # Right: busy and idle (waiting for the other threads) time in the shifting loop
+        ax_balance.barh(y, busy, color=timing_colors["coords_update"], label="busy")
+        ax_balance.barh(y, idle, left=busy, color=timing_colors["idle"], label="idle")
+        for t in range(num_threads):
+            ax_balance.text(busy[t] + idle[t], t, f" {int(items[t])} pts", va="center", fontsize=FONT_LEGEND)
+        stats = record.get("stats", {})
+        imbalance = stats.get(f"{balance_label}_imbalance", 1.0)
+        idle_fraction = stats.get(f"{balance_label}_idle_fraction", 0.0)
+        ax_balance.set_xlabel("Time in the shifting loop (s)", fontsize=FONT_AXES)
+        ax_balance.set_title(f"Busy / idle (imbalance {imbalance:.3f}, idle {100 * idle_fraction:.1f}%)", fontsize=FONT_AXES)
+        ax_balance.set_xlim(0, (busy + idle).max() * 1.15)
+        ax_balance.legend(loc="upper center", bbox_to_anchor=(0.5, -0.16), ncol=2, fontsize=FONT_LEGEND)
+
+        for ax in (ax_phases, ax_balance):
+            ax.set_yticks(y)
+            ax.set_yticklabels([str(t) for t in y], fontsize=FONT_TICKS)
+            ax.tick_params(axis="x", labelsize=FONT_TICKS)
+            ax.grid(axis="x", linestyle="--", alpha=0.7)
+        ax_phases.invert_yaxis()
+
+        fig.suptitle(f"MeanShift breakdown per thread ({num_threads} threads, "
+                     f"{record.get('kernel', '')} kernel, bandwidth {record.get('bandwidth', '')})")
+        plt.tight_layout()
+        output_path = f"{output_dir}/breakdown_threads_{num_threads}.png"
+        plt.savefig(output_path)
+        print(f"Plot saved to {output_path}")
+        saved.append(output_path)
+        plt.close(fig)
+
+    # Imbalance against the number of threads
+    if len(runs) > 1:
+        thread_counts = sorted(runs)
+        imbalance = [runs[t].get("stats", {}).get(f"{balance_label}_imbalance", 1.0) for t in thread_counts]
+        idle = [100 * runs[t].get("stats", {}).get(f"{balance_label}_idle_fraction", 0.0) for t in thread_counts]
+
+        fig, ax = plt.subplots(figsize=(8, 5))
+        ax.plot(thread_counts, imbalance, marker="o", color=timing_colors["kernel"], label="max/mean busy")
+        ax.set_xlabel("Threads", fontsize=FONT_AXES)
+        ax.set_ylabel("Load imbalance (max/mean busy)", fontsize=FONT_AXES)
+        ax.set_xscale("log", base=2)
+        ax.set_xticks(thread_counts)
+        ax.set_xticklabels([str(t) for t in thread_counts], fontsize=FONT_TICKS)
+        ax_idle = ax.twinx()
+        ax_idle.plot(thread_counts, idle, marker="s", linestyle="--", color=timing_colors["distance_cluster"], label="idle %")
+        ax_idle.set_ylabel("Idle time (%)", fontsize=FONT_AXES)
+        ax.grid(True, linestyle="--", alpha=0.7)
+        fig.legend(loc="upper left", bbox_to_anchor=(0.12, 0.88), fontsize=FONT_LEGEND)
+        plt.tight_layout()
+        plt.savefig(f"{output_dir}/breakdown_threads_imbalance.png")
+        print(f"Imbalance plot saved to {output_dir}/breakdown_threads_imbalance.png")
+        saved.append(f"{output_dir}/breakdown_threads_imbalance.png")
+        plt.close(fig)
+
+    return saved
+
+
+if __name__ == "__main__":
+    with open_store(input_paths()) as store:
+        runs = load(store)
+    if runs is None:
+        exit(1)
+    render(runs)
@@ -0,0 +1,52 @@
+"""
+sRGB <-> CIE LAB conversions in NumPy only (D65 white point, 2 degree observer), the same
+formulas as skimage.color.rgb2lab / lab2rgb. Every step is a whole-array operation.
+"""
+import numpy as np
+
+# sRGB (linear) -> XYZ, rows X, Y, Z
+RGB_TO_XYZ = np.array([[0.412453, 0.357580, 0.180423],
+                       [0.212671, 0.715160, 0.072169],
+                       [0.019334, 0.119193, 0.950227]])
+XYZ_TO_RGB = np.linalg.inv(RGB_TO_XYZ)
+WHITE_D65 = np.array([0.95047, 1.0, 1.08883])
+
+EPSILON = 0.008856      # (6/29)^3
+KAPPA = 7.787           # (29/6)^2 / 3
+
+
+def rgb_to_lab(rgb):
+    """
+    LAB values of an sRGB image.
+
+    :param rgb: uint8 array (..., 3), or floats in [0, 1]
+    :return: float64 array (..., 3) of L, A, B
+    """
+    rgb = np.asarray(rgb)
+    rgb = rgb / 255.0 if rgb.dtype == np.uint8 else rgb.astype(np.float64)
+    linear = np.where(rgb > 0.04045, ((rgb + 0.055) / 1.055) ** 2.4, rgb / 12.92)
+    xyz = linear @ RGB_TO_XYZ.T / WHITE_D65
+    f = np.where(xyz > EPSILON, np.cbrt(xyz), KAPPA * xyz + 16.0 / 116.0)
+    lab = np.empty_like(f)
+    lab[..., 0] = 116.0 * f[..., 1] - 16.0
+    lab[..., 1] = 500.0 * (f[..., 0] - f[..., 1])
+    lab[..., 2] = 200.0 * (f[..., 1] - f[..., 2])
+    return lab
+
+
+def lab_to_rgb(lab):
+    """
+    sRGB image of LAB values, clipped to the sRGB gamut.
+
+    :param lab: array (..., 3) of L, A, B
+    :return: uint8 array (..., 3)
+    """
+    lab = np.asarray(lab, dtype=np.float64)
+    fy = (lab[..., 0] + 16.0) / 116.0
+    f = np.stack([fy + lab[..., 1] / 500.0, fy, fy - lab[..., 2] / 200.0], axis=-1)
+    np.maximum(f[..., 2], 0.0, out=f[..., 2])  # z < 0 is out of gamut
+    xyz = np.where(f ** 3 > EPSILON, f ** 3, (f - 16.0 / 116.0) / KAPPA) * WHITE_D65
+    linear = xyz @ XYZ_TO_RGB.T
+    rgb = np.where(linear > 0.0031308, 1.055 * np.power(np.maximum(linear, 0.0031308), 1 / 2.4) - 0.055,
+                   12.92 * linear)
+    return (np.clip(rgb, 0.0, 1.0) * 255).astype(np.uint8)
@@ -3,11 +3,19 @@ in_img_path = "./dataset/12003.jpg"
 original_csv_path = "./data/original.csv"
 modified_csv_path = "./data/modified.csv"
 out_img_path = "./data/reconstructed.jpg"
+in_img_dir = "./dataset"
+resized_batch_dir = "./data/resized_batch"
+reconstructed_batch_dir = "./data/reconstructed_batch"
 metrics_path = "./data/metrics_mean_shift.txt"
 breakdown_results_path_mean_shift = "./data/breakdown_results_mean_shift.txt"
+breakdown_records_path_mean_shift = "./data/breakdown_results_mean_shift.jsonl"
+breakdown_threads_path_mean_shift = "./data/breakdown_threads_mean_shift.jsonl"
+perf_counters_path = "./data/perf_counters.jsonl"
 breakdown_results_path_slic = "./data/breakdown_results_slic.txt"
 strong_scaling_dir = 'results_strong_scaling'
+weak_scaling_dir = 'results_weak_scaling'
 output_plots_dir = "./data/plots"
+results_db_path = "./data/results.sqlite"
 
 threads = [1, 2, 4, 8, 16, 32, 64, 96]
 
@@ -35,6 +43,7 @@ timing_colors = {
     "distance_shift": "#86bbd8", 
     "distance_kernel": "#f6ae2d",
     "kernel": "#f26419",
+    "idle": "#c9c9c9",
     # SLIC components
     "slic_distance_calc": "#f26419",
     "center_init": "#a7d886",
@@ -2,28 +2,48 @@ import argparse
 import numpy as np
 import pandas as pd
 from PIL import Image
-from skimage import color  # per lab2rgb
 from config import modified_csv_path, out_img_path
+from colorspace import lab_to_rgb
+from dataset_io import is_binary_dataset, read_dataset, read_csv_dataset, is_label_map, read_label_map
 
-def csv_to_img(csv_path, output_img_path):
-    df = pd.read_csv(csv_path, header=None)
-    print("Clusters found (LAB):")
-    print(df.iloc[3:].drop_duplicates())  # Print unique LAB values
+def read_lab_values(csv_path):
+    """Read (width, height, lab_values) from a CSV or a binary dataset."""
+    if is_binary_dataset(csv_path):
+        width, height, lab_values, _ = read_dataset(csv_path)
+        return width, height, lab_values
+    return read_csv_dataset(csv_path)
 
-    width, height = int(df.iloc[1, 0]), int(df.iloc[1, 1])
+def label_map_to_rgb(path, headless=False):
+    """Image of a label map: only the palette is converted to RGB, then looked up by every pixel."""
+    width, height, palette, labels = read_label_map(path)
+    if not headless:
+        print(f"Clusters found (LAB): {len(palette)}")
+        print(pd.DataFrame(palette))
 
-    # pixel values start from fourth row
-    lab_values = df.iloc[3:].values.astype(np.float64)
-    lab_array = lab_values.reshape((height, width, 3))
+    rgb_palette = lab_to_rgb(palette)
+    return rgb_palette[labels].reshape((height, width, 3))
 
-    # Convert LAB to RGB
-    rgb_array = color.lab2rgb(lab_array)  
-    rgb_array = (rgb_array * 255).astype(np.uint8) 
+def csv_to_img(csv_path, output_img_path, headless=False):
+    """
+    Convert a segmentation output (CSV, binary dataset or label map) to an image.
+    With [headless] the image is only saved (no viewer, no cluster listing).
+    """
+    if is_label_map(csv_path):
+        rgb_array = label_map_to_rgb(csv_path, headless)
+    else:
+        width, height, lab_values = read_lab_values(csv_path)
+        if not headless:
+            print("Clusters found (LAB):")
+            print(pd.DataFrame(lab_values).drop_duplicates())  # Print unique LAB values
+
+        # Convert LAB to RGB
+        rgb_array = lab_to_rgb(np.asarray(lab_values).reshape((height, width, 3)))
 
     # create image
     img = Image.fromarray(rgb_array, "RGB")
     img.save(output_img_path)
-    img.show()
+    if not headless:
+        img.show()
     print(f"Image saved as \"{output_img_path}\"")
 
 def main():
@@ -34,7 +54,7 @@ def main():
         '--csv', '--input', '-i',
         type=str,
         default=modified_csv_path,
-        help=f"Path to the modified CSV (default: {modified_csv_path})"
+        help=f"Path to the modified CSV, binary dataset or label map (default: {modified_csv_path})"
     )
     parser.add_argument(
         '--output', '-o',
@@ -42,8 +62,13 @@ def main():
         default=out_img_path,
         help=f"Path to save the output image (default: {out_img_path})"
     )
+    parser.add_argument(
+        '--headless',
+        action='store_true',
+        help="Only save the image: no image viewer and no listing of the clusters"
+    )
     args = parser.parse_args()
-    csv_to_img(args.csv, args.output)
+    csv_to_img(args.csv, args.output, args.headless)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,131 @@
+import struct
+import numpy as np
+import pandas as pd
+
+# Binary dataset container shared with src/include/dataset_io.h:
+# [64 bytes header][width*height*dim values][optional width*height int32 labels]
+MAGIC = b"MSDS"
+VERSION = 1
+HEADER = struct.Struct("<4s7I2Q16x")  # magic, version, width, height, dim, dtype, flags, header_size, data_offset, labels_offset
+DTYPES = {1: np.dtype("<f4"), 2: np.dtype("<f8")}
+HAS_LABELS = 0x1
+EXTENSION = ".bin"
+
+# Label map shared with src/include/dataset_io.h (segmentation outputs ending in .lbl):
+# [64 bytes header][palette_size*dim values][width*height uint16/uint32 palette indices]
+LABELMAP_MAGIC = b"MSLM"
+LABELMAP_HEADER = struct.Struct("<4s9I2Q8x")  # magic, version, width, height, dim, dtype, label_size, palette_size, flags, header_size, palette_offset, labels_offset
+LABEL_DTYPES = {2: np.dtype("<u2"), 4: np.dtype("<u4")}
+LABELMAP_EXTENSION = ".lbl"
+
+
+def is_binary_dataset(path):
+    """Check the magic bytes at the start of the file."""
+    with open(path, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def is_label_map(path):
+    """Check the label map magic bytes at the start of the file."""
+    with open(path, "rb") as f:
+        return f.read(len(LABELMAP_MAGIC)) == LABELMAP_MAGIC
+
+
+def write_dataset(path, values, width, height, labels=None):
+    """
+    Write a (width*height, dim) array as a binary dataset with a single bulk write per plane.
+
+    :param values: array-like of shape (width*height, dim), stored as float32
+    :param labels: optional array of width*height int32 labels
+    """
+    values = np.ascontiguousarray(values, dtype=DTYPES[1]).reshape(width * height, -1)
+    data_offset = HEADER.size
+    flags = 0
+    labels_offset = 0
+    if labels is not None:
+        labels = np.ascontiguousarray(labels, dtype="<i4").reshape(-1)
+        flags |= HAS_LABELS
+        labels_offset = data_offset + values.nbytes
+
+    header = HEADER.pack(MAGIC, VERSION, width, height, values.shape[1], 1, flags,
+                         HEADER.size, data_offset, labels_offset)
+    with open(path, "wb") as f:
+        f.write(header)
+        values.tofile(f)
+        if labels is not None:
+            labels.tofile(f)
+
+
+def read_dataset(path):
+    """
+    Memory-map a binary dataset.
+
+    :return: (width, height, values, labels) where values is a read-only (width*height, dim)
+             view on the file and labels is None when the file has no label plane
+    """
+    with open(path, "rb") as f:
+        header = f.read(HEADER.size)
+    (magic, version, width, height, dim, dtype, flags,
+     _header_size, data_offset, labels_offset) = HEADER.unpack(header)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"{path} is not a version {VERSION} binary dataset")
+
+    n = width * height
+    values = np.memmap(path, dtype=DTYPES[dtype], mode="r", offset=data_offset, shape=(n, dim))
+    labels = None
+    if flags & HAS_LABELS:
+        labels = np.memmap(path, dtype="<i4", mode="r", offset=labels_offset, shape=(n,))
+    return width, height, values, labels
+
+
+def read_label_map(path):
+    """
+    Read a label map.
+
+    :return: (width, height, palette, labels) where palette is a (palette_size, dim) array and
+             labels a read-only (width*height,) view on the file with the palette index of every pixel
+    """
+    with open(path, "rb") as f:
+        header = f.read(LABELMAP_HEADER.size)
+    (magic, version, width, height, dim, dtype, label_size, palette_size,
+     _flags, _header_size, palette_offset, labels_offset) = LABELMAP_HEADER.unpack(header)
+    if magic != LABELMAP_MAGIC or version != VERSION:
+        raise ValueError(f"{path} is not a version {VERSION} label map")
+
+    palette = np.fromfile(path, dtype=DTYPES[dtype], count=palette_size * dim, offset=palette_offset)
+    labels = np.memmap(path, dtype=LABEL_DTYPES[label_size], mode="r", offset=labels_offset,
+                       shape=(width * height,))
+    return width, height, palette.reshape(palette_size, dim), labels
+
+
+# Rows formatted per write of write_csv_dataset
+CSV_CHUNK_ROWS = 65536
+
+
+def write_csv_dataset(path, values, width, height):
+    """
+    Write a (width*height, dim) array as a CSV dataset (the width,height / L,A,B header then one
+    row per pixel). The values go through float32, the type of the engine, with 9 significant
+    digits: they read back bit for bit. Every chunk of rows is formatted by a single % operation.
+    """
+    values = np.ascontiguousarray(values, dtype=np.float32).reshape(width * height, -1)
+    row_format = ",".join(["%.9g"] * values.shape[1]) + "\n"
+    with open(path, "w", encoding="utf-8", newline="\n") as f:
+        f.write(f"width,height,\n{width},{height},\nL,A,B\n")
+        for start in range(0, len(values), CSV_CHUNK_ROWS):
+            chunk = values[start:start + CSV_CHUNK_ROWS].astype(np.float64)
+            f.write((row_format * len(chunk)) % tuple(chunk.ravel()))
+
+
+def read_csv_dataset(path):
+    """
+    Read a CSV dataset (input or output of the engine) with the C parser of pandas.
+
+    :return: (width, height, values) where values is a (width*height, dim) float64 array
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        f.readline()
+        width, height = (int(v) for v in f.readline().split(",")[:2])
+        f.readline()
+        values = pd.read_csv(f, header=None, dtype=np.float64, engine="c").to_numpy()
+    return width, height, values
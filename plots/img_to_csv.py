@@ -1,17 +1,18 @@
 import argparse
 import numpy as np
-import pandas as pd
 from PIL import Image
-from skimage import color  # per conversione LAB
 from config import in_img_path, original_csv_path
+from colorspace import rgb_to_lab
+from dataset_io import write_dataset, write_csv_dataset, EXTENSION
 
 
 def image_to_csv(input_img_path, output_csv_path, resize=None):
     """
     Converte un'immagine in CSV (spazio colore LAB), con resize opzionale.
+    Se il path di output termina in .bin viene scritto il formato binario (vedi dataset_io.py).
 
     :param input_img_path: Path immagine input
-    :param output_csv_path: Path CSV di output
+    :param output_csv_path: Path CSV (o .bin) di output
     :param resize: tuple (width, height) oppure None per mantenere dimensioni originali
     """
 
@@ -21,23 +22,13 @@ def image_to_csv(input_img_path, output_csv_path, resize=None):
 
     width, height = image.size
 
-    # Convert image to LAB
-    rgb_image = np.array(image) / 255.0  # Normalize to [0, 1]
-    lab_image = color.rgb2lab(rgb_image)
+    # Convert image to LAB and flatten the pixels (L, A, B)
+    pixels = rgb_to_lab(np.asarray(image)).reshape(-1, 3)
 
-    # Flatten the pixels (L, A, B)
-    pixels = lab_image.reshape(-1, 3)
-
-    data = [
-        ["width", "height"],
-        [width, height],
-        ["L", "A", "B"]  
-    ]
-    data.extend(pixels.tolist())  # Add pixel data
-
-    # Save the data to CSV
-    df = pd.DataFrame(data)
-    df.to_csv(output_csv_path, index=False, header=False)
+    if output_csv_path.endswith(EXTENSION):
+        write_dataset(output_csv_path, pixels, width, height)
+    else:
+        write_csv_dataset(output_csv_path, pixels, width, height)
 
     print(f"\"{input_img_path}\" converted to LAB at \"{output_csv_path}\" - size: {width}x{height}")
 
@@ -55,7 +46,7 @@ def main():
         '--output', '--csv', '-o',
         type=str,
         default=original_csv_path,
-        help=f"Path to save the output CSV (default: {original_csv_path})"
+        help=f"Path to save the output CSV, or binary dataset if it ends in {EXTENSION} (default: {original_csv_path})"
     )
     # 90x60 or 128x85
     parser.add_argument(
@@ -0,0 +1,153 @@
+"""
+Every figure of the report from one command:
+    python3 ./plots/plots.py                                   # all the figures with data
+    python3 ./plots/plots.py breakdown_mean_shift breakdown_slic
+    python3 ./plots/plots.py roofline --peak-gflops 1000 --peak-bandwidth 200
+The logs are synced into the results store and the data of every figure is loaded once, here; the
+figures are then rendered in parallel by worker processes, which import matplotlib (Agg backend)
+for the first figure they draw. A figure whose data and plotting code did not change since it was
+last rendered is skipped (--force renders it again): the signatures of the rendered figures are
+kept next to them, in <output-dir>/.plots_manifest.json.
+"""
+import argparse
+import hashlib
+import importlib
+import json
+import os
+import pickle
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from config import output_plots_dir, weak_scaling_dir
+from results_store import open_store
+
+MANIFEST_NAME = ".plots_manifest.json"
+
+# Modules also drawn by every figure (colours, fonts, shared chart helpers)
+SHARED_SOURCES = ("config", "utils")
+
+
+def figures(args):
+    """Figure name -> (module with input_paths / load / render, options of load)."""
+    return {
+        "strong_scaling_mean_shift": ("strong_scaling", {"impl_type": "mean_shift"}),
+        "strong_scaling_slic_ms": ("strong_scaling", {"impl_type": "slic_ms"}),
+        "breakdown_mean_shift": ("breakdown_mean_shift", {}),
+        "breakdown_slic": ("breakdown_slic", {}),
+        "breakdown_threads": ("breakdown_threads", {}),
+        "roofline": ("roofline", {"peak_gflops": args.peak_gflops, "peak_bandwidth": args.peak_bandwidth}),
+        "weak_scaling": ("weak_scaling", {"results_dir": args.weak_scaling_dir}),
+        "strong_scaling_all": ("strong_scaling_all_plot_sbatchman", {}),
+    }
+
+
+def source_digest(module_name):
+    with open(importlib.import_module(module_name).__file__, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def signature(module_name, data):
+    """Hash of the data of a figure and of the code drawing it."""
+    digest = hashlib.sha1(pickle.dumps(data, protocol=4))
+    for name in (module_name,) + SHARED_SOURCES:
+        digest.update(source_digest(name).encode())
+    return digest.hexdigest()
+
+
+def read_manifest(output_dir):
+    try:
+        with open(os.path.join(output_dir, MANIFEST_NAME), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def write_manifest(output_dir, manifest):
+    os.makedirs(output_dir, exist_ok=True)
+    with open(os.path.join(output_dir, MANIFEST_NAME), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+
+
+def up_to_date(entry, sign):
+    return entry is not None and entry["signature"] == sign and all(os.path.exists(p) for p in entry["outputs"])
+
+
+def render_figure(module_name, data, output_dir):
+    """Worker: renders one figure, returns the saved paths and the time taken."""
+    start = time.perf_counter()
+    saved = importlib.import_module(module_name).render(data, output_dir)
+    return saved, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render the figures of the report in parallel, skipping the unchanged ones.")
+    parser.add_argument('figures', nargs='*', metavar='FIGURE',
+                        help="Figures to render (default: all, see --list)")
+    parser.add_argument('--list', action='store_true', help="List the figures and exit")
+    parser.add_argument('--jobs', '-j', type=int, default=os.cpu_count() or 1,
+                        help="Worker processes (default: all cores)")
+    parser.add_argument('--force', '-f', action='store_true',
+                        help="Render again even when the data did not change")
+    parser.add_argument('--output-dir', '-o', default=output_plots_dir,
+                        help=f"Output directory (default: {output_plots_dir})")
+    parser.add_argument('--peak-gflops', type=float, default=None, help="Roofline: peak compute of the node (G ops/s)")
+    parser.add_argument('--peak-bandwidth', type=float, default=None, help="Roofline: peak memory bandwidth of the node (GB/s)")
+    parser.add_argument('--weak-scaling-dir', default=weak_scaling_dir,
+                        help=f"results_dir of the weak scaling config (default: {weak_scaling_dir})")
+    args = parser.parse_args()
+
+    available = figures(args)
+    if args.list:
+        for name, (module_name, _) in available.items():
+            print(f"{name:<28}{module_name}.py")
+        return 0
+    unknown = [name for name in args.figures if name not in available]
+    if unknown:
+        parser.error(f"unknown figures: {', '.join(unknown)} (available: {', '.join(available)})")
+    selected = {name: available[name] for name in (args.figures or available)}
+
+    # Data of every figure, loaded once from a single sync of the results store
+    start = time.perf_counter()
+    modules = {module_name for module_name, _ in selected.values()}
+    paths = sorted({path for module_name in modules for path in importlib.import_module(module_name).input_paths()})
+    data = {}
+    with open_store(paths) as store:
+        for name, (module_name, options) in selected.items():
+            figure_data = importlib.import_module(module_name).load(store, **options)
+            if figure_data is None:
+                print(f"{name}: no data, skipped")
+            else:
+                data[name] = figure_data
+    print(f"Data loaded in {time.perf_counter() - start:.2f} s")
+
+    manifest = read_manifest(args.output_dir)
+    signatures = {name: signature(selected[name][0], figure_data) for name, figure_data in data.items()}
+    pending = [name for name in data if args.force or not up_to_date(manifest.get(name), signatures[name])]
+    print(f"{len(selected)} figures: {len(pending)} to render, {len(data) - len(pending)} up to date, "
+          f"{len(selected) - len(data)} without data")
+    if not pending:
+        return 0
+
+    failed = 0
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=min(args.jobs, len(pending))) as pool:
+        futures = {pool.submit(render_figure, selected[name][0], data[name], args.output_dir): name
+                   for name in pending}
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                saved, seconds = future.result()
+            except Exception as error:  # keep rendering the others
+                failed += 1
+                print(f"  {name}: failed ({error})", file=sys.stderr)
+                continue
+            manifest[name] = {"signature": signatures[name], "outputs": saved}
+            print(f"  {name} ({seconds:.2f} s): {', '.join(saved)}")
+    write_manifest(args.output_dir, manifest)
+    print(f"{len(pending) - failed} figures rendered in {time.perf_counter() - start:.2f} s"
+          + (f", {failed} failed" if failed else ""))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
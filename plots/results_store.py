@@ -0,0 +1,317 @@
+"""
+Results store: every benchmark log is parsed once into a local SQLite database, keyed by the path,
+modification time and size of the file, so only new or changed logs are parsed again.
+
+    run records (.jsonl, --metrics-out)   one run per line
+    text output (.txt, .log)              one run per block ending with the ===== line of main()
+
+The text runs are turned into the same shape as the run records (timers, stats, kernel, bandwidth,
+threads, ...), so the plot scripts read both kinds the same way. They call sync() on their inputs
+and query the runs by folder, source, backend, threads, dataset, bandwidth or kernel (indexed columns).
+
+    python3 ./plots/results_store.py sync results_strong_scaling data
+    python3 ./plots/results_store.py query --folder results_strong_scaling/mean_shift --threads 8
+"""
+import argparse
+import json
+import os
+import re
+import sqlite3
+from config import results_db_path
+
+# Stored in PRAGMA user_version: a store written by another version of the parsers is rebuilt
+SCHEMA_VERSION = 1
+
+LOG_EXTENSIONS = (".jsonl", ".txt", ".log")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sources (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    runs INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    source TEXT NOT NULL,
+    folder TEXT NOT NULL,
+    position INTEGER NOT NULL,      -- index of the run in its source
+    kind TEXT NOT NULL,             -- 'records' or 'text'
+    executable TEXT,
+    backend TEXT,
+    threads INTEGER,
+    dataset TEXT,
+    bandwidth REAL,
+    kernel TEXT,
+    slic TEXT,
+    record TEXT NOT NULL            -- the whole run, as JSON
+);
+CREATE TABLE IF NOT EXISTS timers (
+    run_id INTEGER NOT NULL,
+    label TEXT NOT NULL,
+    seconds REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS runs_source ON runs (source, position);
+CREATE INDEX IF NOT EXISTS runs_folder ON runs (folder, threads);
+CREATE INDEX IF NOT EXISTS runs_backend ON runs (backend, threads);
+CREATE INDEX IF NOT EXISTS runs_dataset ON runs (dataset);
+CREATE INDEX IF NOT EXISTS runs_parameters ON runs (bandwidth, kernel);
+CREATE INDEX IF NOT EXISTS timers_run ON timers (run_id, label);
+"""
+
+# Columns of the runs table that queries can filter on
+QUERY_COLUMNS = ("source", "folder", "kind", "executable", "backend", "threads", "dataset", "bandwidth",
+                 "kernel", "slic")
+
+# ---------------- text output ----------------
+
+# Every line the parser needs, in a single pattern (one search per line)
+TEXT_LINE = re.compile(
+    r"(?P<timer>\w+) (?:total )?execution time: (?P<seconds>[\d.eE+-]+)"
+    r"|Running with (?P<threads>\d+) threads"
+    r"|- Kernel: (?P<kernel>\w+)"
+    r"|- Bandwidth: (?P<bandwidth>[\d.eE+-]+)"
+    r"|- Backend: (?P<backend>\w+)"
+    r"|- Superpixels: (?P<superpixels>\d+)"
+    r"|- Compactness: (?P<compactness>[\d.eE+-]+)"
+    r"|Dataset: \[(?P<dataset>[^\]]*)\]\s+(?P<width>\d+)x(?P<height>\d+) \((?P<n>\d+) elements\)"
+    r"|shift_single_point total calls: (?P<calls>\d+)"
+)
+THREADS_IN_NAME = re.compile(r"_(\d+)_threads\.")
+
+
+def decode_log(data):
+    """Text of a log: UTF-16 when it starts with a BOM (PowerShell redirections), UTF-8 otherwise."""
+    if data.startswith((b"\xff\xfe", b"\xfe\xff")):
+        return data.decode("utf-16")
+    try:
+        return data.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        return data.decode("latin1")
+
+
+def parse_text_log(text):
+    """Runs of the text output of the binaries, as run records."""
+    runs = []
+    run = {"timers": {}, "stats": {}}
+    for line in text.splitlines():
+        stripped = line.strip()
+        if stripped and stripped.strip("=") == "":
+            # the line of = closing a run (the section headers have a title inside)
+            if run["timers"] or run["stats"]:
+                runs.append(run)
+            run = {"timers": {}, "stats": {}}
+            continue
+        match = TEXT_LINE.search(line)
+        if not match:
+            continue
+        group = match.lastgroup
+        if match.group("timer"):
+            label = match.group("timer")
+            run["timers"][label] = run["timers"].get(label, 0.0) + float(match.group("seconds"))
+        elif group == "threads":
+            run["threads"] = int(match.group("threads"))
+        elif group in ("kernel", "backend"):
+            run[group] = match.group(group)
+        elif group in ("bandwidth", "compactness"):
+            run[group] = float(match.group(group))
+        elif group == "superpixels":
+            run["superpixels"] = int(match.group("superpixels"))
+            run["slic"] = "on"
+        elif group == "n":
+            run["dataset"] = match.group("dataset")
+            run["width"], run["height"], run["n"] = (int(match.group(k)) for k in ("width", "height", "n"))
+        elif group == "calls":
+            run["stats"]["shift_single_point_calls"] = int(match.group("calls"))
+    if run["timers"] or run["stats"]:
+        runs.append(run)
+    for run in runs:
+        run.setdefault("slic", "on" if "slic" in run["timers"] else "off")
+    return runs
+
+
+def parse_records(text):
+    """Run records of a JSON Lines file (malformed lines are skipped, as load_run_records does)."""
+    runs = []
+    for line_number, line in enumerate(text.splitlines(), 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            runs.append(json.loads(line))
+        except json.JSONDecodeError as e:
+            print(f"Skipping line {line_number}: {e}")
+    return runs
+
+
+# ---------------- store ----------------
+
+class ResultsStore:
+    """SQLite store of the parsed runs (see the module docstring)."""
+
+    def __init__(self, path=results_db_path):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.db = sqlite3.connect(path)
+        if self.db.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+            self.db.executescript("DROP TABLE IF EXISTS sources; DROP TABLE IF EXISTS runs; "
+                                  "DROP TABLE IF EXISTS timers;")
+            self.db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _remove_source(self, path):
+        self.db.execute("DELETE FROM timers WHERE run_id IN (SELECT id FROM runs WHERE source = ?)", (path,))
+        self.db.execute("DELETE FROM runs WHERE source = ?", (path,))
+        self.db.execute("DELETE FROM sources WHERE path = ?", (path,))
+
+    def _insert_runs(self, source, kind, runs, mtime_ns, size):
+        self._remove_source(source)
+        folder = os.path.dirname(source)
+        name_threads = THREADS_IN_NAME.search(os.path.basename(source))
+        for position, run in enumerate(runs):
+            if run.get("threads") is None and name_threads:
+                run["threads"] = int(name_threads.group(1))
+            bandwidth = run.get("bandwidth")
+            cursor = self.db.execute(
+                "INSERT INTO runs (source, folder, position, kind, executable, backend, threads, dataset,"
+                " bandwidth, kernel, slic, record) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (source, folder, position, kind, run.get("executable"), run.get("backend"), run.get("threads"),
+                 run.get("dataset"), float(bandwidth) if bandwidth is not None else None, run.get("kernel"),
+                 run.get("slic"), json.dumps(run)))
+            self.db.executemany("INSERT INTO timers (run_id, label, seconds) VALUES (?, ?, ?)",
+                                [(cursor.lastrowid, label, seconds)
+                                 for label, seconds in run.get("timers", {}).items() if seconds is not None])
+        self.db.execute("INSERT INTO sources (path, mtime_ns, size, runs) VALUES (?, ?, ?, ?)",
+                        (source, mtime_ns, size, len(runs)))
+
+    def sync(self, paths):
+        """
+        Parse the logs of [paths] (files, or directories searched recursively) that are new or changed
+        since the last sync, and forget the logs deleted from the synced directories.
+
+        :return: (parsed, unchanged, removed) numbers of logs
+        """
+        files, roots = [], []
+        for path in paths:
+            path = os.path.normpath(path)
+            if os.path.isdir(path):
+                roots.append(path)
+                for directory, _, names in os.walk(path):
+                    files.extend(os.path.join(directory, n) for n in names if n.endswith(LOG_EXTENSIONS))
+            elif os.path.isfile(path):
+                files.append(path)
+
+        known = {row[0]: (row[1], row[2]) for row in self.db.execute("SELECT path, mtime_ns, size FROM sources")}
+        parsed = unchanged = removed = 0
+        with self.db:
+            for path in sorted(set(files)):
+                stat = os.stat(path)
+                if known.get(path) == (stat.st_mtime_ns, stat.st_size):
+                    unchanged += 1
+                    continue
+                with open(path, "rb") as f:
+                    text = decode_log(f.read())
+                if path.endswith(".jsonl"):
+                    self._insert_runs(path, "records", parse_records(text), stat.st_mtime_ns, stat.st_size)
+                else:
+                    self._insert_runs(path, "text", parse_text_log(text), stat.st_mtime_ns, stat.st_size)
+                parsed += 1
+            for path in known:
+                inside = any(path == root or path.startswith(root + os.sep) for root in roots)
+                if inside and not os.path.exists(path):
+                    self._remove_source(path)
+                    removed += 1
+        return parsed, unchanged, removed
+
+    def sync_text(self, source, text):
+        """Store the runs of a log that is not a file (e.g. the stdout of a job), keyed by its length."""
+        row = self.db.execute("SELECT size FROM sources WHERE path = ?", (source,)).fetchone()
+        if row and row[0] == len(text):
+            return False
+        with self.db:
+            self._insert_runs(source, "text", parse_text_log(text), 0, len(text))
+        return True
+
+    @staticmethod
+    def _where(filters):
+        clauses, values = [], []
+        for column, value in filters.items():
+            if column not in QUERY_COLUMNS:
+                raise ValueError(f"unknown filter {column}, available: {', '.join(QUERY_COLUMNS)}")
+            if value is None:
+                continue
+            if column in ("folder", "source"):
+                value = os.path.normpath(value)
+            clauses.append(f"runs.{column} = ?")
+            values.append(float(value) if column == "bandwidth" else value)
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), values
+
+    def runs(self, **filters):
+        """Run records matching [filters] (column=value, None = any), in the order of their logs."""
+        where, values = self._where(filters)
+        rows = self.db.execute(f"SELECT record FROM runs{where} ORDER BY source, position", values)
+        return [json.loads(row[0]) for row in rows]
+
+    def timer_values(self, label, **filters):
+        """Seconds of timer [label] in the runs matching [filters]."""
+        where, values = self._where(filters)
+        where = (where + " AND" if where else " WHERE") + " timers.label = ?"
+        rows = self.db.execute(f"SELECT timers.seconds FROM runs JOIN timers ON timers.run_id = runs.id{where}"
+                               " ORDER BY runs.source, runs.position", values + [label])
+        return [row[0] for row in rows]
+
+    def distinct(self, column, **filters):
+        """Distinct values of [column] in the runs matching [filters], sorted."""
+        if column not in QUERY_COLUMNS:
+            raise ValueError(f"unknown column {column}")
+        where, values = self._where(filters)
+        rows = self.db.execute(f"SELECT DISTINCT {column} FROM runs{where}", values)
+        return sorted(row[0] for row in rows if row[0] is not None)
+
+
+def open_store(paths, path=results_db_path):
+    """Store synced with [paths] (the missing ones are ignored)."""
+    store = ResultsStore(path)
+    parsed, unchanged, removed = store.sync([p for p in paths if os.path.exists(p)])
+    if parsed or removed:
+        print(f"results store: {parsed} logs parsed, {unchanged} unchanged, {removed} removed ({path})")
+    return store
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parse benchmark logs into the results store and query it.")
+    parser.add_argument('--db', default=results_db_path, help=f"SQLite store (default: {results_db_path})")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    sync = subparsers.add_parser("sync", help="Parse the new and changed logs")
+    sync.add_argument('paths', nargs='+', help="Log files or directories")
+    query = subparsers.add_parser("query", help="List the stored runs")
+    for column in QUERY_COLUMNS:
+        query.add_argument(f"--{column}", type=float if column == "bandwidth" else int if column == "threads" else str)
+    query.add_argument('--timer', default="mean_shift", help="Timer to print (default: mean_shift)")
+    args = parser.parse_args()
+
+    with ResultsStore(args.db) as store:
+        if args.command == "sync":
+            parsed, unchanged, removed = store.sync(args.paths)
+            print(f"{parsed} logs parsed, {unchanged} unchanged, {removed} removed")
+            return
+        filters = {column: getattr(args, column) for column in QUERY_COLUMNS}
+        print(f"{'backend':<14}{'threads':>8}{'bandwidth':>10}  {'kernel':<14}{args.timer:>14}  dataset")
+        for run in store.runs(**filters):
+            seconds = run.get("timers", {}).get(args.timer)
+            print(f"{str(run.get('backend')):<14}{str(run.get('threads')):>8}{str(run.get('bandwidth')):>10}  "
+                  f"{str(run.get('kernel')):<14}{'-' if seconds is None else f'{seconds:.6f}':>14}  "
+                  f"{run.get('dataset')}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+import argparse
+import os
+import numpy as np
+from results_store import open_store
+from utils import pyplot
+from config import perf_counters_path, output_plots_dir, FONT_AXES, FONT_TICKS, FONT_LEGEND
+
+CACHE_LINE_BYTES = 64  # bytes moved from memory per LLC miss
+
+backend_markers = {"basic": "o", "matrix": "s", "matrix_blas": "^", "acc": "D"}
+
+
+def aggregate_counters(records):
+    """Counters of every (backend, phase), added up over the records (runs) of that backend."""
+    totals = {}
+    for record in records:
+        backend = record.get("backend", "unknown")
+        for phase, counters in record.get("counters", {}).items():
+            entry = totals.setdefault((backend, phase), {"runs": 0, "threads": counters.get("threads", 1)})
+            entry["runs"] += 1
+            for name, value in counters.items():
+                if name in ("threads", "runs"):
+                    continue
+                if value is None:
+                    entry[name] = None  # n/a in one run: n/a overall
+                elif entry.get(name, 0) is not None:
+                    entry[name] = entry.get(name, 0) + value
+    return totals
+
+
+def ratio(numerator, denominator):
+    if numerator is None or denominator is None or denominator <= 0:
+        return None
+    return numerator / denominator
+
+
+def derived_metrics(counters):
+    """IPC, LLC miss rate, misses per kilo-instruction, operations, bytes and seconds of a phase."""
+    # FP operations if the CPU counts them, instructions otherwise (instruction roofline)
+    operations = counters.get("fp_ops")
+    operation_kind = "FP ops"
+    if operations is None:
+        operations = counters.get("instructions")
+        operation_kind = "instructions"
+    llc_misses = counters.get("llc_misses")
+    task_clock = counters.get("task_clock")
+    threads = counters.get("threads", 1) or 1
+    return {
+        "ipc": ratio(counters.get("instructions"), counters.get("cycles")),
+        "llc_miss_rate": ratio(llc_misses, counters.get("llc_references")),
+        "llc_mpki": ratio(None if llc_misses is None else 1000.0 * llc_misses, counters.get("instructions")),
+        "operations": operations,
+        "operation_kind": operation_kind,
+        "bytes": None if llc_misses is None else llc_misses * CACHE_LINE_BYTES,
+        # task clock is CPU time summed over the threads: wall time of the phase ~ task clock / threads
+        "seconds": None if task_clock is None else task_clock / threads,
+    }
+
+
+def fmt(value, spec):
+    return "n/a" if value is None else format(value, spec)
+
+
+def print_table(totals, table_path):
+    """IPC / miss-rate table per backend and phase, printed and saved as CSV."""
+    header = ["backend", "phase", "runs", "calls", "cycles", "instructions", "IPC",
+              "LLC misses", "LLC miss rate %", "LLC MPKI", "FP ops", "task clock s"]
+    rows = []
+    for (backend, phase), counters in sorted(totals.items()):
+        metrics = derived_metrics(counters)
+        rows.append([
+            backend, phase, str(counters["runs"]), fmt(counters.get("calls"), ".0f"),
+            fmt(counters.get("cycles"), ".4g"), fmt(counters.get("instructions"), ".4g"),
+            fmt(metrics["ipc"], ".2f"), fmt(counters.get("llc_misses"), ".4g"),
+            fmt(None if metrics["llc_miss_rate"] is None else 100 * metrics["llc_miss_rate"], ".1f"),
+            fmt(metrics["llc_mpki"], ".2f"), fmt(counters.get("fp_ops"), ".4g"),
+            fmt(counters.get("task_clock"), ".4g"),
+        ])
+
+    widths = [max(len(row[c]) for row in [header] + rows) for c in range(len(header))]
+    for row in [header] + rows:
+        print("  ".join(cell.ljust(width) for cell, width in zip(row, widths)))
+
+    with open(table_path, "w", encoding="utf-8") as f:
+        for row in [header] + rows:
+            f.write(",".join(row) + "\n")
+    print(f"Table saved to {table_path}")
+
+
+def plot_roofline(totals, peak_gflops, peak_bandwidth, plot_path):
+    """Roofline-style chart: performance against arithmetic intensity (operations / DRAM byte)."""
+    plt = pyplot()
+    points = []
+    for (backend, phase), counters in sorted(totals.items()):
+        metrics = derived_metrics(counters)
+        if None in (metrics["operations"], metrics["bytes"], metrics["seconds"]) or metrics["bytes"] <= 0 \
+                or metrics["seconds"] <= 0:
+            continue
+        intensity = metrics["operations"] / metrics["bytes"]
+        performance = metrics["operations"] / metrics["seconds"] / 1e9
+        points.append((backend, phase, intensity, performance, metrics["operation_kind"]))
+
+    if not points:
+        print("No phase has operation, LLC miss and task clock counts: no roofline plot "
+              "(hardware counters unavailable on this machine?)")
+        return None
+
+    operation_kind = "FP ops" if all(p[4] == "FP ops" for p in points) else "instructions"
+    rate_unit = "GFLOP/s" if operation_kind == "FP ops" else "Ginstructions/s"
+    fig, ax = plt.subplots(figsize=(10, 7))
+    colors = plt.cm.tab10(np.linspace(0, 1, 10))
+    phase_colors = {phase: colors[i % 10] for i, phase in enumerate(sorted({p[1] for p in points}))}
+
+    for backend, phase, intensity, performance, _ in points:
+        ax.scatter(intensity, performance, s=80, color=phase_colors[phase],
+                   marker=backend_markers.get(backend, "o"), edgecolors="black", zorder=3)
+        ax.annotate(f"{backend}:{phase}", (intensity, performance), textcoords="offset points",
+                    xytext=(6, 4), fontsize=FONT_LEGEND)
+
+    intensities = [p[2] for p in points]
+    x = np.logspace(np.log10(min(intensities) / 10), np.log10(max(intensities) * 10), 200)
+    if peak_bandwidth is not None:
+        roof = peak_bandwidth * x
+        label = f"roof ({peak_bandwidth:g} GB/s"
+        if peak_gflops is not None:
+            roof = np.minimum(roof, peak_gflops)
+            ax.axvline(peak_gflops / peak_bandwidth, color="grey", linestyle=":", linewidth=1)
+            label += f", {peak_gflops:g} {rate_unit}"
+        ax.plot(x, roof, color="black", linewidth=2, label=label + ")")
+    elif peak_gflops is not None:
+        ax.axhline(peak_gflops, color="black", linewidth=2, label=f"peak {peak_gflops:g} {rate_unit}")
+
+    ax.set_xscale("log")
+    ax.set_yscale("log")
+    ax.set_xlabel(f"Arithmetic intensity ({operation_kind} / DRAM byte, LLC misses x {CACHE_LINE_BYTES} B)", fontsize=FONT_AXES)
+    ax.set_ylabel(f"Performance ({rate_unit})", fontsize=FONT_AXES)
+    ax.tick_params(axis="both", labelsize=FONT_TICKS)
+    ax.grid(True, which="both", linestyle="--", alpha=0.5)
+    handles = [plt.Line2D([], [], marker=marker, linestyle="", color="grey", label=backend)
+               for backend, marker in backend_markers.items() if any(p[0] == backend for p in points)]
+    ax.legend(handles=handles + ax.get_legend_handles_labels()[0], fontsize=FONT_LEGEND, loc="lower right")
+    plt.tight_layout()
+    plt.savefig(plot_path)
+    plt.close(fig)
+    print(f"Roofline plot saved to {plot_path}")
+    return plot_path
+
+
+def input_paths(records=(perf_counters_path,)):
+    return [path for path in records if os.path.exists(path)]
+
+
+def load(store, records=(perf_counters_path,), peak_gflops=None, peak_bandwidth=None):
+    """Counters per (backend, phase) of the records with counters, and the roof. None without any."""
+    with_counters = []
+    for path in records:
+        with_counters.extend(r for r in store.runs(source=path) if r.get("counters"))
+    if not with_counters:
+        print("Error: no record with counters (run the binaries with --perf-counters on --metrics-out ...)")
+        return None
+    return aggregate_counters(with_counters), peak_gflops, peak_bandwidth
+
+
+def render(roofline, output_dir=output_plots_dir):
+    """IPC / miss-rate table and roofline chart. Returns the saved paths."""
+    totals, peak_gflops, peak_bandwidth = roofline
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+    print_table(totals, f"{output_dir}/perf_counters_table.csv")
+    plot_path = plot_roofline(totals, peak_gflops, peak_bandwidth, f"{output_dir}/roofline.png")
+    return [f"{output_dir}/perf_counters_table.csv"] + ([plot_path] if plot_path else [])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Roofline chart and IPC / miss-rate table from --perf-counters run records.")
+    parser.add_argument("records", nargs="*", default=[perf_counters_path],
+                        help=f"Run records written with --perf-counters on --metrics-out (default: {perf_counters_path})")
+    parser.add_argument("--peak-gflops", type=float, default=None, help="Peak compute of the node (G ops/s), for the roof")
+    parser.add_argument("--peak-bandwidth", type=float, default=None, help="Peak memory bandwidth of the node (GB/s), for the roof")
+    parser.add_argument("--output", "-o", type=str, default=output_plots_dir, help=f"Output directory (default: {output_plots_dir})")
+    args = parser.parse_args()
+
+    for path in args.records:
+        if not os.path.exists(path):
+            print(f"Error: File {path} does not exist!")
+            exit(1)
+    with open_store(args.records) as store:
+        roofline = load(store, args.records, args.peak_gflops, args.peak_bandwidth)
+    if roofline is None:
+        exit(1)
+    render(roofline, args.output)
+
+
+if __name__ == "__main__":
+    main()
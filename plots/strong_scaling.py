@@ -1,14 +1,19 @@
-import matplotlib.pyplot as plt
 import numpy as np
 import os
 import argparse
-from utils import try_read_file, extract_times, extract_separate_times
+from utils import pyplot, record_times, record_separate_times
+from results_store import open_store
 from config import (
     threads, implementations, strong_scaling_dir, output_plots_dir,
     slic_to_ms_map, FONT_AXES, FONT_TICKS, 
     FONT_LEGEND, LANDSCAPE_INCHES
 )
 
+impl_types = {
+    "mean_shift": ["mean_shift", "mean_shift_matrix", "mean_shift_matrix_blas"],
+    "slic_ms": ["slic_ms", "slic_ms_matrix", "slic_ms_matrix_blas"],
+}
+
 def get_color(impl_folder, lighter=False):
     """Get color for implementation."""
     for impl in implementations:
@@ -22,29 +27,30 @@ def get_color(impl_folder, lighter=False):
             return impl["color"]
     return "#666666"
 
-def get_timing_data(impl_folder, combined=False):
+def get_timing_data(store, impl_folder, combined=False):
     """Get timing data for all thread counts."""
+    folder = os.path.join(strong_scaling_dir, impl_folder)
     data = {}
     for t in threads:
-        filepath = os.path.join(strong_scaling_dir, impl_folder, f"{impl_folder}_{t}_threads.txt")
-        if os.path.exists(filepath):
-            content = try_read_file(filepath)
-            if combined:
-                data[t] = extract_separate_times(content)
-            else:
-                data[t] = extract_times(content, include_slic=True)
+        # Run records (--metrics-out) when there are some, the parsed text output otherwise
+        records = (store.runs(folder=folder, threads=t, kind="records")
+                   or store.runs(folder=folder, threads=t, kind="text"))
+        if combined:
+            data[t] = record_separate_times(records)
         else:
-            data[t] = ([], []) if combined else []
+            data[t] = record_times(records, include_slic=True)
     return data
 
-def plot_bars(impl_folders, combined=False, separate=False, save_path=None):
-    """Generic bar plotting function."""
+def plot_bars(timing, combined=False, separate=False, save_path=None):
+    """Generic bar plotting function ([timing]: get_timing_data of every implementation)."""
+    plt = pyplot()
+    impl_folders = list(timing)
     fig, ax = plt.subplots(figsize=LANDSCAPE_INCHES)
     x = np.arange(len(threads))
     width = 0.25
     
     for i, impl in enumerate(impl_folders):
-        data = get_timing_data(impl, combined)
+        data = timing[impl]
         impl_entry = next((imp for imp in implementations if imp["folder"] == impl), None)
         impl_name = impl_entry["name"] if impl_entry else impl
 
@@ -102,24 +108,44 @@ def plot_bars(impl_folders, combined=False, separate=False, save_path=None):
         print(f"Plot saved to {save_path}")
     plt.close()
 
-def create_plots(impl_type="mean_shift"):
-    """Create strong scaling plots."""
+def input_paths():
+    return [strong_scaling_dir] if os.path.isdir(strong_scaling_dir) else []
+
+def load(store, impl_type="mean_shift"):
+    """Timing data of every implementation of [impl_type], None if no run was found."""
+    combined = impl_type == "slic_ms"
+    timing = {impl: get_timing_data(store, impl, combined) for impl in impl_types[impl_type]}
+    if not any((times[0] or times[1]) if combined else times
+               for data in timing.values() for times in data.values()):
+        print(f"No {impl_type} runs in {strong_scaling_dir}")
+        return None
+    return impl_type, timing
+
+def render(scaling, output_dir=output_plots_dir):
+    """Strong scaling plots (load of one implementation type). Returns the saved paths."""
+    impl_type, timing = scaling
     # Ensure output directory exists
-    os.makedirs(output_plots_dir, exist_ok=True)
-    
+    os.makedirs(output_dir, exist_ok=True)
+
     if impl_type == "mean_shift":
-        impls = ["mean_shift", "mean_shift_matrix", "mean_shift_matrix_blas"]
-        save_path = os.path.join(output_plots_dir, "strong_scaling_mean_shift.png")
-        plot_bars(impls, save_path=save_path)
-    
-    elif impl_type == "slic_ms":
-        impls = ["slic_ms", "slic_ms_matrix", "slic_ms_matrix_blas"]
-        # Total time plot
-        save_path_total = os.path.join(output_plots_dir, "strong_scaling_slic_total.png")
-        plot_bars(impls, combined=True, save_path=save_path_total)
-        # Separate plot
-        save_path_separate = os.path.join(output_plots_dir, "strong_scaling_slic_separate.png")
-        plot_bars(impls, combined=True, separate=True, save_path=save_path_separate)
+        save_path = os.path.join(output_dir, "strong_scaling_mean_shift.png")
+        plot_bars(timing, save_path=save_path)
+        return [save_path]
+
+    # Total time plot
+    save_path_total = os.path.join(output_dir, "strong_scaling_slic_total.png")
+    plot_bars(timing, combined=True, save_path=save_path_total)
+    # Separate plot
+    save_path_separate = os.path.join(output_dir, "strong_scaling_slic_separate.png")
+    plot_bars(timing, combined=True, separate=True, save_path=save_path_separate)
+    return [save_path_total, save_path_separate]
+
+def create_plots(impl_type="mean_shift"):
+    """Create strong scaling plots."""
+    with open_store(input_paths()) as store:
+        scaling = load(store, impl_type)
+    if scaling is not None:
+        render(scaling)
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Plot strong scaling results.")
@@ -127,4 +153,4 @@ if __name__ == "__main__":
                         help='Type of plot to generate: mean_shift or slic_ms')
     args = parser.parse_args()
 
-    create_plots(args.type)
\ No newline at end of file
+    create_plots(args.type)
@@ -1,91 +1,121 @@
+import os
 import numpy as np
-from utils import extract_times, create_scaling_bar_chart
-from config import threads, implementations
-import sbatchman as sbm
-
-print("Analyzing strong scaling performance across implementations...")
-
-# Dictionary to store execution times for each implementation
-all_execution_times = {impl["name"]: {t: [] for t in threads} for impl in implementations}
-all_mean_times = {impl["name"]: [] for impl in implementations}
-
-jobs = sbm.jobs_list(status=[sbm.Status.COMPLETED])
-print(jobs)
-
-# Read result files for each implementation
-for impl in implementations:
-    print(f"Analyzing implementation: {impl['name']}")
-    # exp = list(filter(lambda j: j.parse_command_args()[0].split('/')[-1] == impl['name'], jobs))
-    exp = list(filter(lambda j: j.tag.split('__')[0] == impl['name'], jobs))
-    
-    for t in threads:
-        exp = list(filter(lambda j: j.config_name == f'{t}cpu', exp))
-        if exp:
-            times = extract_times(exp[0].get_stdout())
+from utils import pyplot, record_times, create_scaling_bar_chart
+from config import threads, implementations, output_plots_dir
+from results_store import ResultsStore
+
+
+def input_paths():
+    return []  # stdout of the sbatchman jobs, synced into the store by load()
+
+
+def load(store):
+    """Mean execution time of every implementation and thread count over the completed jobs, None without any."""
+    try:
+        import sbatchman as sbm
+    except ImportError:
+        print("sbatchman is not installed: no sbatchman jobs to analyze")
+        return None
+
+    print("Analyzing strong scaling performance across implementations...")
+
+    # Dictionary to store execution times for each implementation
+    all_execution_times = {impl["name"]: {t: [] for t in threads} for impl in implementations}
+    all_mean_times = {impl["name"]: [] for impl in implementations}
+
+    jobs = sbm.jobs_list(status=[sbm.Status.COMPLETED])
+    print(jobs)
+
+    # Read result files for each implementation (the output of every job is parsed once into the results store)
+    for impl in implementations:
+        print(f"Analyzing implementation: {impl['name']}")
+        # exp = list(filter(lambda j: j.parse_command_args()[0].split('/')[-1] == impl['name'], jobs))
+        exp = list(filter(lambda j: j.tag.split('__')[0] == impl['name'], jobs))
+
+        for t in threads:
+            exp_t = list(filter(lambda j: j.config_name == f'{t}cpu', exp))
+            if exp_t:
+                source = f"sbatchman/{exp_t[0].tag}/{exp_t[0].config_name}"
+                store.sync_text(source, exp_t[0].get_stdout())
+                times = record_times(store.runs(source=source))
+                if times:
+                    all_execution_times[impl["name"]][t].extend(times)
+                    print(f"  Thread {t}: found {len(times)} measurements")
+                else:
+                    print(f"  No times found for implementation {impl['name']}, {t} threads")
+
+    print(all_execution_times)
+
+    # Calculate means for each implementation
+    for impl_name in all_execution_times:
+        for t in threads:
+            times = all_execution_times[impl_name][t]
             if times:
-                all_execution_times[impl["name"]][t].extend(times)
-                print(f"  Thread {t}: found {len(times)} measurements")
+                mean_time = np.mean(times)
+                all_mean_times[impl_name].append(mean_time)
+                print(f"{impl_name} with {t} threads: mean time = {mean_time:.4f} seconds")
             else:
-                print(f"  No times found for implementation {impl["name"]}, {t} threads")
-
-print(all_execution_times)
-
-# Calculate means for each implementation
-for impl_name in all_execution_times:
-    for t in threads:
-        times = all_execution_times[impl_name][t]
-        if times:
-            mean_time = np.mean(times)
-            all_mean_times[impl_name].append(mean_time)
-            print(f"{impl_name} with {t} threads: mean time = {mean_time:.4f} seconds")
+                all_mean_times[impl_name].append(0)
+                print(f"Warning: no data available for {impl_name} with {t} threads")
+
+    # Check if we have valid data
+    if not any(any(means) for means in all_mean_times.values()):
+        print("No valid data found in the files. Check the input files.")
+        return None
+    return all_mean_times
+
+
+def render(all_mean_times, output_dir=output_plots_dir):
+    """Execution time and speedup of every implementation. Returns the saved paths."""
+    plt = pyplot()
+    os.makedirs(output_dir, exist_ok=True)
+    time_path = os.path.join(output_dir, "strong_scaling_all.png")
+    speedup_path = os.path.join(output_dir, "strong_scaling_speedup_all.png")
+
+    # Create execution time plot
+    plot, _ = create_scaling_bar_chart(
+        implementations,
+        threads,
+        all_mean_times,
+        'Strong Scaling: Execution Time Comparison between Implementations',
+        'Mean Execution Time (seconds)',
+        time_path,
+        log_scale=True
+    )
+    plt.close(plot)
+
+    # Calculate speedup for each implementation
+    speedups = {impl["name"]: [] for impl in implementations}
+    for impl_name in all_mean_times:
+        base_time = all_mean_times[impl_name][0]  # Time with 1 thread
+        if base_time > 0:
+            speedups[impl_name] = [base_time/t if t > 0 else 0 for t in all_mean_times[impl_name]]
         else:
-            all_mean_times[impl_name].append(0)
-            print(f"Warning: no data available for {impl_name} with {t} threads")
-
-# Check if we have valid data
-has_data = False
-for impl_name in all_mean_times:
-    if any(all_mean_times[impl_name]):
-        has_data = True
-        break
-
-if not has_data:
-    print("No valid data found in the files. Check the input files.")
-    exit(1)
-
-# Create execution time plot
-create_scaling_bar_chart(
-    implementations, 
-    threads, 
-    all_mean_times,
-    'Strong Scaling: Execution Time Comparison between Implementations',
-    'Mean Execution Time (seconds)',
-    'strong_scaling_all.png',
-    log_scale=True
-)
-
-# Calculate speedup for each implementation
-speedups = {impl["name"]: [] for impl in implementations}
-for impl_name in all_mean_times:
-    base_time = all_mean_times[impl_name][0]  # Time with 1 thread
-    if base_time > 0:
-        speedups[impl_name] = [base_time/t if t > 0 else 0 for t in all_mean_times[impl_name]]
-    else:
-        speedups[impl_name] = [0] * len(threads)
-
-# Create speedup plot
-plot, ax = create_scaling_bar_chart(
-    implementations, 
-    threads, 
-    speedups,
-    'Strong Scaling: Speedup Comparison between Implementations',
-    'Speedup',
-    'strong_scaling_speedup_all.png'
-)
-
-# Add ideal speedup line
-ax.plot(np.arange(len(threads)), threads, 'r--', label='Ideal Speedup')
-ax.legend(fontsize=12)
-plot.savefig('strong_scaling_speedup_all.png')
-
-print("Plots generated: strong_scaling_all.png and strong_scaling_speedup_all.png")
\ No newline at end of file
+            speedups[impl_name] = [0] * len(threads)
+
+    # Create speedup plot
+    plot, ax = create_scaling_bar_chart(
+        implementations,
+        threads,
+        speedups,
+        'Strong Scaling: Speedup Comparison between Implementations',
+        'Speedup',
+        speedup_path
+    )
+
+    # Add ideal speedup line
+    ax.plot(np.arange(len(threads)), threads, 'r--', label='Ideal Speedup')
+    ax.legend(fontsize=12)
+    plot.savefig(speedup_path)
+    plt.close(plot)
+
+    print(f"Plots generated: {time_path} and {speedup_path}")
+    return [time_path, speedup_path]
+
+
+if __name__ == "__main__":
+    with ResultsStore() as store:
+        all_mean_times = load(store)
+    if all_mean_times is None:
+        exit(1)
+    render(all_mean_times)
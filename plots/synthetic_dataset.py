@@ -0,0 +1,116 @@
+import argparse
+import math
+import numpy as np
+from dataset_io import write_dataset, EXTENSION
+
+# LAB ranges of the generated modes (L in [0, 100], a and b in about [-100, 100])
+L_RANGE = (10.0, 90.0)
+AB_RANGE = (-60.0, 60.0)
+LAB_MIN = np.array([0.0, -100.0, -100.0])
+LAB_MAX = np.array([100.0, 100.0, 100.0])
+
+
+def grid_shape(points):
+    """Width and height of the near-square image holding at least [points] pixels."""
+    width = max(1, math.ceil(math.sqrt(points)))
+    height = max(1, math.ceil(points / width))
+    return width, height
+
+
+def mode_centres(rng, modes, spread):
+    """[modes] LAB centres, kept at least 4 spreads apart when the colour space allows it."""
+    low = np.array([L_RANGE[0], AB_RANGE[0], AB_RANGE[0]])
+    high = np.array([L_RANGE[1], AB_RANGE[1], AB_RANGE[1]])
+    centres = []
+    for _ in range(modes):
+        for _attempt in range(1000):
+            candidate = rng.uniform(low, high)
+            if all(np.linalg.norm(candidate - c) >= 4 * spread for c in centres):
+                break
+        centres.append(candidate)
+    return np.array(centres)
+
+
+def generate_dataset(width, height, modes=8, spread=5.0, duplicates=0.0, layout="regions", seed=0):
+    """
+    Synthetic LAB image of [modes] Gaussian colour clusters.
+
+    :param spread: standard deviation of every cluster, in LAB units
+    :param duplicates: fraction of the pixels that repeat the colour of another pixel of the same cluster
+    :param layout: "regions" (every cluster fills a Voronoi region of the image, like an object)
+                   or "shuffled" (the clusters are scattered over the image)
+    :return: (values, labels) with values of shape (width*height, 3) and the cluster of every pixel
+    """
+    if modes < 1:
+        raise ValueError("modes must be at least 1")
+    if not 0.0 <= duplicates < 1.0:
+        raise ValueError("duplicates must be in [0, 1)")
+    rng = np.random.default_rng(seed)
+    n = width * height
+    centres = mode_centres(rng, modes, spread)
+
+    if layout == "regions":
+        seeds = rng.uniform((0, 0), (width, height), size=(modes, 2))
+        ys, xs = np.divmod(np.arange(n), width)
+        pixels = np.stack([xs + 0.5, ys + 0.5], axis=1)
+        labels = np.empty(n, dtype=np.int32)
+        for start in range(0, n, 1 << 16):  # chunks keep the distance matrix small
+            chunk = pixels[start:start + (1 << 16)]
+            distances = ((chunk[:, None, :] - seeds[None, :, :]) ** 2).sum(axis=2)
+            labels[start:start + len(chunk)] = distances.argmin(axis=1)
+    elif layout == "shuffled":
+        labels = rng.integers(0, modes, size=n, dtype=np.int32)
+    else:
+        raise ValueError(f"Unknown layout {layout}")
+
+    values = centres[labels] + rng.normal(0.0, spread, size=(n, 3))
+    values = np.clip(values, LAB_MIN, LAB_MAX)
+
+    if duplicates > 0:
+        for mode in range(modes):
+            members = np.flatnonzero(labels == mode)
+            copies = int(round(duplicates * len(members)))
+            if copies == 0 or copies == len(members):
+                continue
+            rng.shuffle(members)
+            targets, sources = members[:copies], members[copies:]
+            values[targets] = values[rng.choice(sources, size=copies)]
+
+    return values.astype(np.float32), labels
+
+
+def save_dataset(path, values, width, height):
+    """Writes the dataset as a binary dataset (.bin) or in the CSV input format."""
+    if path.endswith(EXTENSION):
+        write_dataset(path, values, width, height)
+        return
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(f"width,height,\n{width},{height},\nL,A,B\n")
+        np.savetxt(f, values, fmt="%.6f", delimiter=",")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic LAB dataset with a known number of modes.")
+    size = parser.add_mutually_exclusive_group(required=True)
+    size.add_argument('--points', '-n', type=int, help="Number of points (rounded up to a near-square image)")
+    size.add_argument('--size', type=int, nargs=2, metavar=('WIDTH', 'HEIGHT'), help="Image size")
+    parser.add_argument('--modes', '-k', type=int, default=8, help="Number of colour clusters (default: 8)")
+    parser.add_argument('--spread', type=float, default=5.0,
+                        help="Standard deviation of every cluster in LAB units (default: 5)")
+    parser.add_argument('--duplicates', type=float, default=0.0,
+                        help="Fraction of pixels repeating another pixel's colour (default: 0)")
+    parser.add_argument('--layout', choices=['regions', 'shuffled'], default='regions',
+                        help="Clusters as image regions or scattered over the image (default: regions)")
+    parser.add_argument('--seed', type=int, default=0, help="Random seed (default: 0)")
+    parser.add_argument('--output', '-o', type=str, required=True,
+                        help=f"Output CSV, or binary dataset if it ends in {EXTENSION}")
+    args = parser.parse_args()
+
+    width, height = tuple(args.size) if args.size else grid_shape(args.points)
+    values, _labels = generate_dataset(width, height, args.modes, args.spread, args.duplicates, args.layout, args.seed)
+    save_dataset(args.output, values, width, height)
+    print(f"Synthetic dataset with {args.modes} modes saved at \"{args.output}\" - size: {width}x{height}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,67 +1,16 @@
 import re
+import json
 import numpy as np
-import matplotlib.pyplot as plt
 
-# File reading utilities
-def try_read_file(filepath):
-    """Try different encodings"""
-    encodings = ['utf-8', 'utf-16', 'latin1', 'cp1252']
-    
-    for encoding in encodings:
-        try:
-            with open(filepath, 'r', encoding=encoding) as file:
-                return file.read()
-        except UnicodeDecodeError:
-            continue
-    
-    # If all encodings fail, try binary mode
-    try:
-        with open(filepath, 'rb') as file:
-            return file.read().decode('utf-8', errors='ignore')
-    except Exception as e:
-        print(f"Error reading file {filepath}: {str(e)}")
-        return ""
 
-# Data extraction functions
-def extract_times(file_content, include_slic=True):
-    """Extract execution times from file content."""
-    # Extract both SLIC and mean shift times
-    slic_times = re.findall(r'slic execution time: (\d+\.\d+)', file_content)
-    mean_shift_times = re.findall(r'mean_shift execution time: (\d+\.\d+)', file_content)
-    
-    if not mean_shift_times:
-        return []
-    
-    mean_shift_times = [float(time) for time in mean_shift_times]
-    
-    # For SLIC implementations, add the preprocessing time if requested
-    if include_slic and slic_times and "slic" in file_content.lower():
-        slic_times = [float(time) for time in slic_times]
-        # Return combined times (SLIC + mean_shift)
-        return [slic_times[i] + mean_shift_times[i] for i in range(min(len(slic_times), len(mean_shift_times)))]
-    else:
-        return mean_shift_times
+def pyplot():
+    """matplotlib.pyplot on the Agg backend (files only, no display), imported on first use:
+    loading the data of the plots does not pay for it."""
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    return plt
 
-def extract_separate_times(file_content):
-    """Extract SLIC and mean shift times separately."""
-    # Extract both SLIC and mean shift times
-    slic_times = re.findall(r'slic execution time: (\d+\.\d+)', file_content)
-    mean_shift_times = re.findall(r'mean_shift execution time: (\d+\.\d+)', file_content)
-    
-    if not mean_shift_times:
-        return [], []
-    
-    # Convert to float
-    mean_shift_times = [float(time) for time in mean_shift_times]
-    
-    # For SLIC implementations, return both times separately
-    if slic_times and "slic" in file_content.lower():
-        slic_times = [float(time) for time in slic_times]
-        # Return both time arrays separately
-        return slic_times[:len(mean_shift_times)], mean_shift_times
-    else:
-        # No SLIC times or not a SLIC implementation
-        return [], mean_shift_times
 
 def parse_perf_file(filename):
     """Parse performance metrics file for MeanShift."""
@@ -97,10 +46,57 @@ def parse_perf_file(filename):
             continue
     return data
 
+
+# Run records (--metrics-out): one JSON object per line
+def load_run_records(filepath):
+    """Load the JSON Lines run records written by the binaries with --metrics-out."""
+    records = []
+    with open(filepath, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError as e:
+                print(f"Skipping line {line_number} of {filepath}: {e}")
+    return records
+
+def records_to_frame(records):
+    """Flatten run records into a DataFrame, with 'timers.<label>' and 'stats.<key>' columns."""
+    import pandas as pd
+    return pd.json_normalize(records)
+
+def record_times(records, include_slic=True):
+    """Mean-shift times of the records, plus the SLIC time if requested (as extract_times)."""
+    times = []
+    for record in records:
+        timers = record.get("timers", {})
+        if "mean_shift" not in timers:
+            continue
+        time = timers["mean_shift"]
+        if include_slic and record.get("slic") == "on":
+            time += timers.get("slic", 0.0)
+        times.append(time)
+    return times
+
+def record_separate_times(records):
+    """SLIC and mean-shift times of the records (as extract_separate_times)."""
+    slic_times, mean_shift_times = [], []
+    for record in records:
+        timers = record.get("timers", {})
+        if "mean_shift" not in timers:
+            continue
+        mean_shift_times.append(timers["mean_shift"])
+        if record.get("slic") == "on":
+            slic_times.append(timers.get("slic", 0.0))
+    return slic_times, mean_shift_times
+
     
 def create_scaling_bar_chart(implementations, threads, times_dict, 
                            title, ylabel, filename, log_scale=False):
     """Create bar chart for scaling data with multiple implementations."""
+    plt = pyplot()
     plt.rcParams.update({'font.size': 14})
     fig, ax = plt.subplots(figsize=(14, 8))
     
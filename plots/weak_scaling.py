@@ -0,0 +1,144 @@
+"""
+Weak scaling plots of the benchmark results (python ./plots/benchmark.py --config benchmark_weak.yaml run):
+    weak_scaling_efficiency.png   efficiency T(1 thread) / T(p threads) of every backend (1 = ideal)
+    weak_scaling_time_vs_n.png    time against N (log-log) with the fitted exponent k of T ~ N^k
+The exponent of the work (time x threads) is printed too: about 2 for the O(N^2) backends, while
+the time grows as N^(k_work - 1) when N grows with the threads and the parallel part scales.
+"""
+import argparse
+import glob
+import json
+import os
+import numpy as np
+from utils import pyplot
+from config import (
+    implementations, weak_scaling_dir, output_plots_dir,
+    FONT_AXES, FONT_TICKS, FONT_LEGEND, LANDSCAPE_INCHES
+)
+
+
+def load_results(results_dir):
+    """Mean time and points of every (variant, threads) of the benchmark results."""
+    results = {}
+    for path in glob.glob(os.path.join(results_dir, "benchmark", "*.json")):
+        with open(path, "r", encoding="utf-8") as f:
+            result = json.load(f)
+        if not result.get("points"):
+            continue
+        results.setdefault(result["variant"], []).append(
+            (result["threads"], result["points"], result["stats"]["mean"], result["stats"]["ci"] or 0.0))
+    return {variant: sorted(rows) for variant, rows in results.items()}
+
+
+def fit_exponent(points, times):
+    """Least-squares slope and intercept of log(time) against log(points)."""
+    if len(set(points)) < 2:
+        return None, None
+    slope, intercept = np.polyfit(np.log(points), np.log(times), 1)
+    return slope, intercept
+
+
+def implementation(variant):
+    entry = next((impl for impl in implementations if impl["folder"] == variant), None)
+    return (entry["name"], entry["color"]) if entry else (variant, None)
+
+
+def plot_efficiency(results, save_path):
+    plt = pyplot()
+    fig, ax = plt.subplots(figsize=LANDSCAPE_INCHES)
+    all_threads = sorted({t for rows in results.values() for t, _, _, _ in rows})
+    for variant, rows in sorted(results.items()):
+        reference = next((time for t, _, time, _ in rows if t == 1), None)
+        if reference is None:
+            print(f"{variant}: no 1-thread run, no efficiency")
+            continue
+        threads = [t for t, _, _, _ in rows]
+        efficiency = [reference / time for _, _, time, _ in rows]
+        name, color = implementation(variant)
+        ax.plot(threads, efficiency, marker="o", label=name, color=color)
+
+    ax.axhline(1.0, color="#666666", linestyle="--", linewidth=1, label="Ideal")
+    ax.set_xscale("log", base=2)
+    ax.set_xticks(all_threads)
+    ax.set_xticklabels(all_threads, fontsize=FONT_TICKS)
+    ax.set_xlabel("Number of Threads (points per thread constant)", fontsize=FONT_AXES)
+    ax.set_ylabel("Weak scaling efficiency T(1) / T(p)", fontsize=FONT_AXES)
+    ax.set_ylim(bottom=0)
+    ax.tick_params(axis="y", labelsize=FONT_TICKS)
+    ax.legend(fontsize=FONT_LEGEND)
+    ax.grid(True, alpha=0.3)
+    plt.tight_layout()
+    plt.savefig(save_path, dpi=300, bbox_inches="tight")
+    print(f"Plot saved to {save_path}")
+    plt.close()
+
+
+def plot_time_vs_n(results, save_path):
+    plt = pyplot()
+    fig, ax = plt.subplots(figsize=LANDSCAPE_INCHES)
+    print(f"{'backend':<28}{'k (time)':>10}{'k (work)':>10}")
+    for variant, rows in sorted(results.items()):
+        threads = np.array([t for t, _, _, _ in rows], dtype=float)
+        points = np.array([n for _, n, _, _ in rows], dtype=float)
+        times = np.array([time for _, _, time, _ in rows])
+        cis = np.array([ci for _, _, _, ci in rows])
+        name, color = implementation(variant)
+
+        slope, intercept = fit_exponent(points, times)
+        work_slope, _ = fit_exponent(points, times * threads)
+        label = name if slope is None else f"{name} (k = {slope:.2f})"
+        ax.errorbar(points, times, yerr=cis, marker="o", linestyle="none", capsize=3, label=label, color=color)
+        if slope is not None:
+            fit = np.exp(intercept) * points ** slope
+            ax.plot(points, fit, linestyle="--", linewidth=1, color=color)
+            print(f"{variant:<28}{slope:>10.2f}{work_slope:>10.2f}")
+
+    ax.set_xscale("log")
+    ax.set_yscale("log")
+    ax.set_xlabel("Points N (grows with the threads)", fontsize=FONT_AXES)
+    ax.set_ylabel("Execution Time (seconds)", fontsize=FONT_AXES)
+    ax.tick_params(axis="both", labelsize=FONT_TICKS)
+    ax.legend(fontsize=FONT_LEGEND)
+    ax.grid(True, which="both", alpha=0.3)
+    plt.tight_layout()
+    plt.savefig(save_path, dpi=300, bbox_inches="tight")
+    print(f"Plot saved to {save_path}")
+    plt.close()
+
+
+def input_paths():
+    return []  # benchmark results (JSON), not logs of the results store
+
+
+def load(store=None, results_dir=weak_scaling_dir):
+    """load_results of [results_dir] (the results store is not used), None without results."""
+    results = load_results(results_dir)
+    if not results:
+        print(f"No results in {results_dir}/benchmark: run ./plots/benchmark.py --config benchmark_weak.yaml run")
+        return None
+    return results
+
+
+def render(results, output_dir=output_plots_dir):
+    """Efficiency and time against N plots. Returns the saved paths."""
+    os.makedirs(output_dir, exist_ok=True)
+    saved = [os.path.join(output_dir, "weak_scaling_efficiency.png"),
+             os.path.join(output_dir, "weak_scaling_time_vs_n.png")]
+    plot_efficiency(results, saved[0])
+    plot_time_vs_n(results, saved[1])
+    return saved
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Plot the weak scaling results of the benchmark harness.")
+    parser.add_argument('--results-dir', '-r', type=str, default=weak_scaling_dir,
+                        help=f"results_dir of the weak scaling config (default: {weak_scaling_dir})")
+    args = parser.parse_args()
+
+    results = load(results_dir=args.results_dir)
+    if results:
+        render(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Mean shift segmentation on NumPy arrays, through the shared library of the C engine.
+
+    import meanshift
+    result = meanshift.segment(lab_image, bandwidth=9.0, backend="matrix", threads=8)
+    result.shifted, result.labels, result.modes
+
+The points are passed to the engine and the outputs are filled by it in place, without copies
+or text round trips. The GIL is released during the computation, so several Python threads can
+segment images at the same time (each with its own thread count).
+"""
+import ctypes
+from collections import namedtuple
+import numpy as np
+from ._library import lib, MS_OK
+
+__all__ = ["segment", "backends", "Segmentation", "MeanShiftError", "DIM"]
+
+DIM = lib.ms_point_dim()
+
+# shifted: (N, DIM) float32, the mode of every point
+# labels:  (N,) int32, index of the mode of every point in [modes]
+# modes:   (K, DIM) float32, view on the first K rows of an (N, DIM) buffer
+Segmentation = namedtuple("Segmentation", ["shifted", "labels", "modes"])
+
+
+class MeanShiftError(RuntimeError):
+    """Error status returned by the engine."""
+
+    def __init__(self, status):
+        super().__init__(lib.ms_status_message(status).decode())
+        self.status = status
+
+
+def backends():
+    """Backends linked in the library, "auto" last."""
+    return lib.ms_backends().decode().split(",")
+
+
+def _points_view(points, shape):
+    """(N, DIM) view of [points] and the (height, width) of the image, if known."""
+    if not isinstance(points, np.ndarray) or points.dtype != np.float32 or not points.flags.c_contiguous:
+        raise ValueError("points must be a C-contiguous float32 array "
+                         "(np.ascontiguousarray(points, dtype=np.float32))")
+    if points.ndim == 3 and points.shape[2] == DIM:
+        shape = points.shape[:2] if shape is None else shape
+        points = points.reshape(-1, DIM)
+    if points.ndim != 2 or points.shape[1] != DIM:
+        raise ValueError(f"points must have shape (N, {DIM}) or (height, width, {DIM}), got {points.shape}")
+    return points, shape
+
+
+def segment(points, bandwidth=9.0, kernel="epanechnikov", backend="basic", threads=0,
+            superpixels=0, compactness=10.0, shape=None):
+    """
+    Mean shift of the LAB [points], as ./build/mean_shift_all does on a dataset file.
+
+    :param points: C-contiguous float32 array of shape (N, 3), or (height, width, 3)
+    :param bandwidth: kernel bandwidth, in LAB units
+    :param kernel: "gaussian", "uniform" or "epanechnikov"
+    :param backend: one of backends(), as --backend
+    :param threads: OpenMP threads of this call, 0 = OMP_NUM_THREADS / all cores
+    :param superpixels: > 0 runs SLIC first and shifts the superpixels (needs the image shape)
+    :param compactness: SLIC compactness m
+    :param shape: (height, width) of the image, for (N, 3) points with superpixels > 0
+    :return: Segmentation(shifted, labels, modes)
+    """
+    points, shape = _points_view(points, shape)
+    count = points.shape[0]
+    if count == 0:
+        raise ValueError("points is empty")
+    height, width = shape if shape is not None else (1, count)
+    if superpixels > 0 and height * width != count:
+        raise ValueError(f"superpixels need the image shape: {shape} does not match {count} points")
+
+    shifted = np.empty((count, DIM), dtype=np.float32)
+    labels = np.empty(count, dtype=np.int32)
+    modes = np.empty((count, DIM), dtype=np.float32)
+    mode_count = ctypes.c_uint(0)
+    status = lib.ms_segment(points.ctypes.data, count, width, height, bandwidth,
+                            kernel.encode(), backend.encode(), threads, superpixels, compactness,
+                            shifted.ctypes.data, labels.ctypes.data, modes.ctypes.data,
+                            ctypes.byref(mode_count))
+    if status != MS_OK:
+        raise MeanShiftError(status)
+    return Segmentation(shifted, labels, modes[:mode_count.value])
@@ -0,0 +1,82 @@
+"""
+ctypes bindings of the C API of libmeanshift (src/include/meanshift_api.h).
+
+The library is looked up in $MEANSHIFT_LIBRARY, then in the build directory of the repository
+(cmake --build build --target meanshift), then on the system library path. ctypes releases the
+GIL for the whole duration of every call into the library.
+"""
+import ctypes
+import ctypes.util
+import os
+import sys
+
+API_VERSION = 1
+
+MS_OK = 0
+MS_ERROR_ARGUMENT = 1
+MS_ERROR_KERNEL = 2
+MS_ERROR_BACKEND = 3
+MS_ERROR_MEMORY = 4
+
+_REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+if sys.platform == "win32":
+    _LIBRARY_NAMES = ["meanshift.dll", "libmeanshift.dll"]
+elif sys.platform == "darwin":
+    _LIBRARY_NAMES = ["libmeanshift.dylib"]
+else:
+    _LIBRARY_NAMES = ["libmeanshift.so"]
+
+
+def _candidates():
+    path = os.environ.get("MEANSHIFT_LIBRARY")
+    if path:
+        yield path
+        return
+    for name in _LIBRARY_NAMES:
+        yield os.path.join(_REPO_ROOT, "build", name)
+    system = ctypes.util.find_library("meanshift")
+    if system:
+        yield system
+
+
+def _load():
+    tried = []
+    for path in _candidates():
+        if os.path.sep in path and not os.path.exists(path):
+            tried.append(path)
+            continue
+        lib = ctypes.CDLL(path)
+        break
+    else:
+        raise OSError("libmeanshift not found (tried: {}): build it with "
+                      "'cmake --build build --target meanshift' or set MEANSHIFT_LIBRARY"
+                      .format(", ".join(tried) or "nothing"))
+
+    lib.ms_api_version.restype = ctypes.c_int
+    lib.ms_api_version.argtypes = []
+    lib.ms_point_dim.restype = ctypes.c_int
+    lib.ms_point_dim.argtypes = []
+    lib.ms_backends.restype = ctypes.c_char_p
+    lib.ms_backends.argtypes = []
+    lib.ms_status_message.restype = ctypes.c_char_p
+    lib.ms_status_message.argtypes = [ctypes.c_int]
+    lib.ms_segment.restype = ctypes.c_int
+    lib.ms_segment.argtypes = [
+        ctypes.c_void_p,                    # points
+        ctypes.c_uint, ctypes.c_uint, ctypes.c_uint,  # count, width, height
+        ctypes.c_double,                    # bandwidth
+        ctypes.c_char_p, ctypes.c_char_p,   # kernel, backend
+        ctypes.c_int,                       # threads
+        ctypes.c_uint, ctypes.c_double,     # superpixels, compactness
+        ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p,  # shifted, labels, modes
+        ctypes.POINTER(ctypes.c_uint),      # mode_count
+    ]
+
+    version = lib.ms_api_version()
+    if version != API_VERSION:
+        raise OSError(f"libmeanshift API version {version}, this package needs {API_VERSION}")
+    return lib
+
+
+lib = _load()
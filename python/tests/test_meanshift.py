@@ -0,0 +1,121 @@
+"""
+Tests of the NumPy binding against the command line program.
+
+They need the library and mean_shift_all of the same build (cmake --build build), and are skipped
+without them. MEANSHIFT_LIBRARY and MEANSHIFT_BUILD_DIR point them to another build:
+    MEANSHIFT_BUILD_DIR=./build python3 -m pytest -q python/tests
+"""
+import os
+import subprocess
+import sys
+import threading
+import numpy as np
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+BUILD_DIR = os.path.abspath(os.environ.get("MEANSHIFT_BUILD_DIR", os.path.join(REPO_ROOT, "build")))
+if "MEANSHIFT_LIBRARY" not in os.environ and os.path.exists(os.path.join(BUILD_DIR, "libmeanshift.so")):
+    os.environ["MEANSHIFT_LIBRARY"] = os.path.join(BUILD_DIR, "libmeanshift.so")
+sys.path.insert(0, os.path.join(REPO_ROOT, "python"))
+sys.path.insert(0, os.path.join(REPO_ROOT, "plots"))
+
+try:
+    import meanshift
+    from meanshift._library import MS_ERROR_ARGUMENT, MS_ERROR_BACKEND, MS_ERROR_KERNEL
+except OSError as error:  # library not built
+    pytest.skip(str(error), allow_module_level=True)
+
+from dataset_io import read_dataset, write_dataset
+
+WIDTH, HEIGHT = 20, 9
+BANDWIDTH = 9.0
+
+
+@pytest.fixture(scope="module")
+def lab():
+    """Three well separated LAB blobs of 60 points, as a (HEIGHT, WIDTH, 3) image."""
+    rng = np.random.default_rng(0)
+    centres = np.array([[30.0, 0.0, 0.0], [60.0, 20.0, -20.0], [80.0, -30.0, 30.0]])
+    points = np.repeat(centres, WIDTH * HEIGHT // len(centres), axis=0) + rng.normal(0.0, 2.0, (WIDTH * HEIGHT, 3))
+    return np.ascontiguousarray(points.reshape(HEIGHT, WIDTH, 3), dtype=np.float32)
+
+
+def run_cli(lab, tmp_path, kernel):
+    binary = os.path.join(BUILD_DIR, "mean_shift_all")
+    if not os.path.exists(binary):
+        pytest.skip(f"{binary} not built")
+    input_path, output_path = str(tmp_path / "input.bin"), str(tmp_path / "output.bin")
+    write_dataset(input_path, lab.reshape(-1, 3), WIDTH, HEIGHT)
+    subprocess.run([binary, "-i", input_path, "-o", output_path, "--backend", "basic",
+                    "-b", str(BANDWIDTH), "-k", kernel], check=True, stdout=subprocess.DEVNULL)
+    return np.array(read_dataset(output_path)[2])
+
+
+@pytest.mark.parametrize("kernel", ["epanechnikov", "gaussian"])
+def test_segment_matches_cli(lab, tmp_path, kernel):
+    result = meanshift.segment(lab, bandwidth=BANDWIDTH, kernel=kernel, backend="basic")
+    expected = run_cli(lab, tmp_path, kernel)
+
+    np.testing.assert_allclose(result.shifted, expected, atol=1e-4)
+    assert len(result.modes) == len(np.unique(expected, axis=0))
+    np.testing.assert_array_equal(result.modes[result.labels], result.shifted)
+
+
+def test_concurrent_calls(lab):
+    expected = meanshift.segment(lab, bandwidth=BANDWIDTH, backend="basic")
+    results = [None] * 4
+
+    def work(i):
+        results[i] = meanshift.segment(lab, bandwidth=BANDWIDTH, backend="basic", threads=1 + i % 2)
+
+    workers = [threading.Thread(target=work, args=(i,)) for i in range(len(results))]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    for result in results:
+        np.testing.assert_array_equal(result.shifted, expected.shifted)
+        np.testing.assert_array_equal(result.labels, expected.labels)
+
+
+@pytest.mark.parametrize("options, status", [
+    ({"backend": "no_such_backend"}, MS_ERROR_BACKEND),
+    ({"kernel": "no_such_kernel"}, MS_ERROR_KERNEL),
+    ({"bandwidth": 0.0}, MS_ERROR_ARGUMENT),
+])
+def test_error_status(lab, options, status):
+    with pytest.raises(meanshift.MeanShiftError) as error:
+        meanshift.segment(lab, **options)
+    assert error.value.status == status
+
+
+def test_invalid_points(lab):
+    with pytest.raises(ValueError):
+        meanshift.segment(lab.astype(np.float64))
+    with pytest.raises(ValueError):
+        meanshift.segment(lab[:, :, :2].copy())
+    with pytest.raises(ValueError):
+        meanshift.segment(lab.reshape(-1, 3), superpixels=4, shape=(HEIGHT + 1, WIDTH))
+
+
+def test_auto_leaves_stdout_alone(lab, tmp_path, monkeypatch, capfd):
+    monkeypatch.chdir(tmp_path)  # no backend cache here: the call calibrates
+    done = threading.Event()
+    written = []
+
+    def write_markers():
+        while not done.is_set():
+            os.write(1, b"<marker>\n")
+            written.append(1)
+
+    writer = threading.Thread(target=write_markers)
+    writer.start()
+    try:
+        result = meanshift.segment(lab, bandwidth=BANDWIDTH, backend="auto")
+    finally:
+        done.set()
+        writer.join()
+    out = capfd.readouterr().out
+    assert out.count("<marker>") == len(written)
+    assert "backend auto" not in out
+    np.testing.assert_array_equal(result.modes[result.labels], result.shifted)
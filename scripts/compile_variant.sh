@@ -10,17 +10,8 @@ VARIANT="$1"
 
 echo "Compiling variant: $VARIANT"
 
-executable="./build/${VARIANT}"
-if [[ -f "$executable" ]]; then
-    # echo "Warning: $executable already exists and may be overwritten by recompilation."
-    # read -p "Recompile $VARIANT? (y/n): " answer
-    # [[ "$answer" != "y" ]] && exit 0
-    echo "$VARIANT already compiled. Skipping compilation."
-    exit 0
-fi
-
-# Clean previous build and compile
-make -C build clean
+# Incremental build: make only recompiles the sources that changed, and the other
+# targets (e.g. mean_shift_all) keep their objects
 make -C build "$VARIANT"
 
 if [[ $? -eq 0 ]]; then
@@ -13,4 +13,4 @@ for t in "${threads[@]}"; do
 done
 echo "SLIC-MeanShift Breakdown completed!"
 echo "Generating SLIC-MeanShift Breakdown plot..."
-python ./plots/breakdown_slic.py
+python ./plots/plots.py breakdown_slic
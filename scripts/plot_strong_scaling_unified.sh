@@ -72,17 +72,16 @@ mkdir -p "${OUTPUT_DIR}"
 case "${1:-all}" in
     meanshift)
         run_tests meanshift
-        python plots/strong_scaling.py --type mean_shift
+        python plots/plots.py strong_scaling_mean_shift
         ;;
     slicms)
         run_tests slicms
-        python plots/strong_scaling.py --type slic_ms
+        python plots/plots.py strong_scaling_slic_ms
         ;;
     all|"")
         run_tests meanshift
         run_tests slicms
-        python plots/strong_scaling.py --type mean_shift
-        python plots/strong_scaling.py --type slic_ms
+        python plots/plots.py strong_scaling_mean_shift strong_scaling_slic_ms
         ;;
     -h|--help)
         usage
@@ -0,0 +1,16 @@
+#!/bin/bash
+threads=(1 2 4 8 16 32 64 96)
+
+RECORDS_PATH="./data/breakdown_threads_mean_shift.jsonl"
+./scripts/compile_variant.sh "breakdown_mean_shift"
+
+for t in "${threads[@]}"; do
+    echo "Running mean-shift breakdown with ${t} threads..."
+    export OMP_NUM_THREADS=${t}
+    ./build/breakdown_mean_shift -k epanechnikov --metrics-out ${RECORDS_PATH}
+done
+echo "Mean-shift thread breakdown completed! records saved to ${RECORDS_PATH}"
+
+echo "Generating per-thread breakdown plots..."
+python ./plots/plots.py breakdown_threads
+echo "Per-thread breakdown plots generated!"
@@ -0,0 +1,9 @@
+#!/bin/bash
+
+# Weak scaling of the mean-shift backends, configured in benchmark_weak.yaml: every thread count runs on
+# a synthetic dataset of points_per_thread x threads points (generated once in ./results_weak_scaling/datasets),
+# then plots the efficiency and the time against N with the fitted exponent in ./data/plots
+# Extra arguments are passed to the harness, e.g. --threads 1 2 4 or --variants mean_shift
+
+python3 ./plots/benchmark.py --config ./benchmark_weak.yaml run "$@"
+python3 ./plots/plots.py weak_scaling --weak-scaling-dir ./results_weak_scaling
@@ -0,0 +1,334 @@
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <omp.h>
+#include "include/point.h"
+#include "include/utils.h"
+#include "include/mean_shift.h"
+#include "include/spatial_index.h"
+#include "include/tiling.h"
+#include "include/backends.h"
+#include "metrics/run_record.h"
+#include "metrics/perf_counters.h"
+
+#ifndef _WIN32
+#include <unistd.h>
+#include <fcntl.h>
+#endif
+
+const char *backend_cache_path = BACKEND_CACHE_PATH;
+
+typedef struct {
+    const char *name;           // value of --backend
+    void (*run)(unsigned int dataset_size, const Point dataset[],
+                unsigned int support_size, const Point support[], const T support_weights[],
+                Point shifted_dataset[], T bandwidth,
+                T (*kernel_func)(T, T), Point cluster_modes[],
+                unsigned int *cluster_count);
+    int squared_kernel;         // takes the *_kernel_sqrd version of the kernel
+} Backend;
+
+// Backends linked in this executable, the first one is the default
+static const Backend backends[] = {
+#ifdef BACKEND_BASIC
+    {"basic", mean_shift_basic, 0},
+#endif
+#ifdef BACKEND_MATRIX
+    {"matrix", mean_shift_matrix, 0},
+#endif
+#ifdef BACKEND_MATRIX_BLAS
+    {"matrix_blas", mean_shift_matrix_blas, 1},
+#endif
+#ifdef BACKEND_ACC
+    {"acc", mean_shift_acc, 0},
+#endif
+};
+static const int backend_count = sizeof(backends) / sizeof(backends[0]);
+
+static int selected = 0;        // index in [backends], -1 = auto (resolved on the first run)
+
+int select_backend(const char *name)
+{
+    if (strcmp(name, "auto") == 0) {
+        selected = -1;
+        return 0;
+    }
+    for (int b = 0; b < backend_count; b++) {
+        if (strcmp(name, backends[b].name) == 0) {
+            selected = b;
+            return 0;
+        }
+    }
+    fprintf(stderr, "Invalid backend '%s'. Available options:", name);
+    for (int b = 0; b < backend_count; b++) {
+        fprintf(stderr, " '%s',", backends[b].name);
+    }
+    fprintf(stderr, " 'auto'\n");
+    return -1;
+}
+
+const char *selected_backend_name(void)
+{
+    return selected < 0 ? "auto" : backends[selected].name;
+}
+
+// ---------------- kernels ----------------
+static const struct {
+    const char *name;
+    T (*kernel)(T, T);
+    T (*kernel_sqrd)(T, T);
+} kernels[] = {
+    {"gaussian", gaussian_kernel, gaussian_kernel_sqrd},
+    {"uniform", uniform_kernel, uniform_kernel_sqrd},
+    {"epanechnikov", epanechnikov_kernel, epanechnikov_kernel_sqrd},
+};
+static const int kernel_count = sizeof(kernels) / sizeof(kernels[0]);
+
+static T (*squared_kernel(T (*kernel_func)(T, T)))(T, T)
+{
+    for (int k = 0; k < kernel_count; k++) {
+        if (kernels[k].kernel == kernel_func) return kernels[k].kernel_sqrd;
+    }
+    return kernel_func; // already a squared-distance kernel
+}
+
+static const char *kernel_name(T (*kernel_func)(T, T))
+{
+    for (int k = 0; k < kernel_count; k++) {
+        if (kernels[k].kernel == kernel_func) return kernels[k].name;
+    }
+    return "custom";
+}
+
+static void run_backend(int b, unsigned int dataset_size, const Point dataset[],
+                        unsigned int support_size, const Point support[], const T support_weights[],
+                        Point shifted_dataset[], T bandwidth,
+                        T (*kernel_func)(T, T), Point cluster_modes[],
+                        unsigned int *cluster_count)
+{
+    if (backends[b].squared_kernel) kernel_func = squared_kernel(kernel_func);
+    backends[b].run(dataset_size, dataset, support_size, support, support_weights, shifted_dataset,
+                    bandwidth, kernel_func, cluster_modes, cluster_count);
+}
+
+// ---------------- auto-tuner ----------------
+
+// Everything the choice depends on: machine, threads, problem size (power of 2), kernel,
+// bandwidth, memory budget (power of 2 in GB), index option and the backends to choose from
+static void cache_key(char *key, size_t key_size, unsigned int dataset_size,
+                      T bandwidth, T (*kernel_func)(T, T))
+{
+    char host[128] = "localhost";
+#ifndef _WIN32
+    if (gethostname(host, sizeof(host)) != 0) strcpy(host, "localhost");
+    host[sizeof(host) - 1] = '\0';
+#endif
+    int size_log2 = 0;
+    while ((dataset_size >> (size_log2 + 1)) > 0) size_log2++;
+    size_t memory_gb = memory_budget_bytes() >> 30;
+    size_t memory_bucket = 1;
+    while (memory_bucket * 2 <= memory_gb) memory_bucket *= 2;
+
+    int written = snprintf(key, key_size, "host=%s threads=%d n=2^%d kernel=%s bandwidth=%g mem=%zuGB index=%s backends=",
+                           host, omp_get_max_threads(), size_log2, kernel_name(kernel_func), (double)bandwidth,
+                           memory_bucket, spatial_index_enabled ? "grid" : "none");
+    for (int b = 0; b < backend_count && written > 0 && (size_t)written < key_size; b++) {
+        written += snprintf(key + written, key_size - written, b ? ",%s" : "%s", backends[b].name);
+    }
+}
+
+// Backend stored for [key] (the last matching line wins), -1 if none
+static int read_cached_backend(const char *key)
+{
+    FILE *file = fopen(backend_cache_path, "r");
+    if (!file) return -1;
+
+    int found = -1;
+    char line[1024];
+    size_t key_length = strlen(key);
+    while (fgets(line, sizeof(line), file)) {
+        if (strncmp(line, key, key_length) != 0 || line[key_length] != '\t') continue;
+        char *name = line + key_length + 1;
+        name[strcspn(name, "\t\r\n")] = '\0';
+        for (int b = 0; b < backend_count; b++) {
+            if (strcmp(name, backends[b].name) == 0) found = b;
+        }
+    }
+    fclose(file);
+    return found;
+}
+
+static void write_cached_backend(const char *key, int b, double seconds)
+{
+    FILE *file = fopen(backend_cache_path, "a");
+    if (!file) {
+        fprintf(stderr, "Warning: cannot write the backend cache %s\n", backend_cache_path);
+        return;
+    }
+    fprintf(file, "%s\t%s\t%f\n", key, backends[b].name, seconds);
+    fclose(file);
+}
+
+// The backends print their progress: keep it out of the calibration output.
+// Only for the command line: the redirection is process-wide.
+static int silence_stdout(void)
+{
+    fflush(stdout);
+#ifndef _WIN32
+    int saved = dup(STDOUT_FILENO);
+    int devnull = open("/dev/null", O_WRONLY);
+    if (saved >= 0 && devnull >= 0) dup2(devnull, STDOUT_FILENO);
+    if (devnull >= 0) close(devnull);
+    return saved;
+#else
+    return -1;
+#endif
+}
+
+static void restore_stdout(int saved)
+{
+    fflush(stdout);
+#ifndef _WIN32
+    if (saved >= 0) {
+        dup2(saved, STDOUT_FILENO);
+        close(saved);
+    }
+#endif
+}
+
+// Times every backend on AUTOTUNE_SAMPLE_SIZE evenly spaced points of [dataset] and returns the
+// fastest. Skipped when the decision for the same key is already in the cache.
+// [quiet] (library calls) prints nothing and leaves stdout, the run record and the perf counters
+// alone: they are shared by the whole process, other threads may be segmenting meanwhile.
+static int autotune_backend(unsigned int dataset_size, const Point dataset[],
+                            T bandwidth, T (*kernel_func)(T, T), int quiet)
+{
+    char key[512];
+    cache_key(key, sizeof(key), dataset_size, bandwidth, kernel_func);
+
+    int cached = read_cached_backend(key);
+    if (cached >= 0) {
+        if (!quiet) printf("backend auto: %s (cached in %s)\n", backends[cached].name, backend_cache_path);
+        return cached;
+    }
+    if (backend_count == 1) {
+        if (!quiet) printf("backend auto: %s (only backend in this build)\n", backends[0].name);
+        return 0;
+    }
+
+    unsigned int sample_size = dataset_size < AUTOTUNE_SAMPLE_SIZE ? dataset_size : AUTOTUNE_SAMPLE_SIZE;
+    Point *sample = (Point *)malloc(sample_size * sizeof(Point));
+    Point *shifted = (Point *)malloc(sample_size * sizeof(Point));
+    Point *modes = (Point *)malloc(sample_size * sizeof(Point));
+    if (!sample || !shifted || !modes) {
+        fprintf(stderr, "Error: Memory allocation failed in autotune_backend\n");
+        free(sample);
+        free(shifted);
+        free(modes);
+        return 0;
+    }
+    for (unsigned int i = 0; i < sample_size; i++) {
+        copy_point(&dataset[(size_t)i * dataset_size / sample_size], &sample[i]);
+    }
+
+    if (!quiet) printf("backend auto: calibrating on %u of %u points\n", sample_size, dataset_size);
+    double calibration_start = omp_get_wtime();
+    int best = 0;
+    double best_time = 0;
+    for (int b = 0; b < backend_count; b++) {
+        unsigned int count = 0;
+        int saved = -1;
+        if (!quiet) {
+            saved = silence_stdout();
+            pause_run_record(1);
+            pause_perf_counters(1);
+        }
+        double start = omp_get_wtime();
+        run_backend(b, sample_size, sample, sample_size, sample, NULL, shifted, bandwidth, kernel_func, modes, &count);
+        double elapsed = omp_get_wtime() - start;
+        if (!quiet) {
+            pause_perf_counters(0);
+            pause_run_record(0);
+            restore_stdout(saved);
+            printf("\t- %s: %f s\n", backends[b].name, elapsed);
+        }
+        if (b == 0 || elapsed < best_time) {
+            best = b;
+            best_time = elapsed;
+        }
+    }
+    if (!quiet) {
+        printf("backend auto: %s\n", backends[best].name);
+        record_timer("backend_calibration", omp_get_wtime() - calibration_start);
+    }
+    write_cached_backend(key, best, best_time);
+
+    free(sample);
+    free(shifted);
+    free(modes);
+    return best;
+}
+
+// ---------------- dispatch ----------------
+void mean_shift(unsigned int dataset_size, const Point dataset[],
+                Point shifted_dataset[], T bandwidth,
+                T (*kernel_func)(T, T), Point cluster_modes[],
+                unsigned int *cluster_count)
+{
+    mean_shift_weighted(dataset_size, dataset, dataset_size, dataset, NULL, shifted_dataset,
+                        bandwidth, kernel_func, cluster_modes, cluster_count);
+}
+
+void mean_shift_weighted(unsigned int dataset_size, const Point dataset[],
+                         unsigned int support_size, const Point support[], const T support_weights[],
+                         Point shifted_dataset[], T bandwidth,
+                         T (*kernel_func)(T, T), Point cluster_modes[],
+                         unsigned int *cluster_count)
+{
+    if (selected < 0) {
+        selected = autotune_backend(dataset_size, dataset, bandwidth, kernel_func, 0);
+    }
+    run_backend(selected, dataset_size, dataset, support_size, support, support_weights, shifted_dataset,
+                bandwidth, kernel_func, cluster_modes, cluster_count);
+}
+
+const char *available_backends(void)
+{
+    static const char names[] = ""
+#ifdef BACKEND_BASIC
+        "basic,"
+#endif
+#ifdef BACKEND_MATRIX
+        "matrix,"
+#endif
+#ifdef BACKEND_MATRIX_BLAS
+        "matrix_blas,"
+#endif
+#ifdef BACKEND_ACC
+        "acc,"
+#endif
+        "auto";
+    return names;
+}
+
+int mean_shift_weighted_backend(const char *name, unsigned int dataset_size, const Point dataset[],
+                                unsigned int support_size, const Point support[], const T support_weights[],
+                                Point shifted_dataset[], T bandwidth,
+                                T (*kernel_func)(T, T), Point cluster_modes[],
+                                unsigned int *cluster_count)
+{
+    int b = -1;
+    if (strcmp(name, "auto") == 0) {
+        // one calibration at a time: it times the backends and appends to the cache file
+        #pragma omp critical(backend_autotune)
+        b = autotune_backend(dataset_size, dataset, bandwidth, kernel_func, 1);
+    } else {
+        for (int k = 0; k < backend_count; k++) {
+            if (strcmp(name, backends[k].name) == 0) b = k;
+        }
+    }
+    if (b < 0) return -1;
+    run_backend(b, dataset_size, dataset, support_size, support, support_weights, shifted_dataset,
+                bandwidth, kernel_func, cluster_modes, cluster_count);
+    return 0;
+}
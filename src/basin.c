@@ -0,0 +1,234 @@
+#include <stdio.h>
+#include <stdlib.h>
+#include <omp.h>
+#include "include/utils.h"
+#include "include/point.h"
+#include "include/mean_shift.h"
+#include "include/spatial_index.h"
+#include "include/soa.h"
+#include "include/basin.h"
+#include "metrics/run_record.h"
+
+T basin_radius = 0;
+T basin_path_radius = 0;
+unsigned int basin_verify_samples = 0;
+
+#ifdef TIMING_BREAKDOWN
+#define BASIN_PARALLEL 0 // the breakdown timers and call counter are not thread safe
+#else
+#define BASIN_PARALLEL 1
+#endif
+
+// Index of the mode nearest to [point] within [radius], -1 if none
+static int find_mode(const BasinTable *table, const Point *point, T radius)
+{
+    unsigned int count;
+    #pragma omp atomic read seq_cst
+    count = table->count;
+
+    int best = -1;
+    T best_distance = radius;
+    for (unsigned int m = 0; m < count; m++) {
+        T distance = euclidean_distance(point, &table->modes[m]);
+        if (distance <= best_distance) {
+            best = m;
+            best_distance = distance;
+        }
+    }
+    return best;
+}
+
+// Adds the converged [point] to the table, unless another thread already added a mode
+// within [radius]. Returns the index of the mode.
+static int publish_mode(BasinTable *table, const Point *point, T radius)
+{
+    int mode;
+    #pragma omp critical(basin_table)
+    {
+        mode = find_mode(table, point, radius);
+        if (mode < 0) {
+            // every point publishes at most once, so capacity == dataset size is enough
+            mode = table->count;
+            copy_point(point, &table->modes[mode]);
+            #pragma omp atomic write seq_cst
+            table->count = mode + 1;
+        }
+    }
+    return mode;
+}
+
+typedef struct {
+    int *labels;
+    int mode;
+} PathLabel;
+
+// Gives the trajectory's mode to a dataset point near the path, unless it already has one
+static void label_point(unsigned int id, void *user)
+{
+    PathLabel *path = (PathLabel *)user;
+    int label;
+    #pragma omp atomic read seq_cst
+    label = path->labels[id];
+    if (label < 0) {
+        #pragma omp atomic write seq_cst
+        path->labels[id] = path->mode;
+    }
+}
+
+unsigned long long mean_shift_basins(unsigned int dataset_size, const Point dataset[],
+                                     unsigned int support_size, const Point support[], const T support_weights[],
+                                     Point shifted_dataset[], T bandwidth,
+                                     T (*kernel_func)(T, T), const SpatialIndex *shift_index,
+                                     const PointsSoA *shift_soa, SoaKernel soa_kernel)
+{
+    BasinTable table;
+    table.count = 0;
+    table.capacity = dataset_size;
+    table.modes = (Point *)malloc(dataset_size * sizeof(Point));
+    table.labels = (int *)malloc(dataset_size * sizeof(int));
+    if (!table.modes || !table.labels) {
+        fprintf(stderr, "Error: Memory allocation failed in mean_shift_basins\n");
+        free(table.modes);
+        free(table.labels);
+        return 0;
+    }
+
+    // Path labelling needs a radius query on the dataset: reuse the shift index or build one.
+    // The labels are per dataset point, so the support must be the dataset itself.
+    SpatialIndex path_index;
+    const SpatialIndex *label_index = NULL;
+    int owns_path_index = 0;
+    T path_radius = basin_path_radius;
+    if (path_radius > 0 && support != dataset) {
+        printf("basin path labelling disabled: the support is not the dataset\n");
+    } else if (path_radius > 0) {
+        if (shift_index) {
+            label_index = shift_index;
+        } else if (build_spatial_index(&path_index, dataset, dataset_size, NULL, bandwidth) == 0) {
+            label_index = &path_index;
+            owns_path_index = 1;
+        }
+        if (label_index && path_radius > label_index->cell_size) {
+            printf("basin path radius clamped to the grid cell size: %f\n", label_index->cell_size);
+            path_radius = label_index->cell_size;
+        }
+    }
+
+    #pragma omp parallel for
+    for (unsigned int i = 0; i < dataset_size; i++) {
+        table.labels[i] = -1;
+    }
+
+    unsigned long long shifts = 0;
+    unsigned long long early_exits = 0;
+    unsigned long long path_labelled = 0;
+
+    #pragma omp parallel for schedule(dynamic) if(BASIN_PARALLEL) reduction(+:shifts, early_exits, path_labelled)
+    for (int i = 0; i < dataset_size; i++) {
+        int mode;
+        #pragma omp atomic read seq_cst
+        mode = table.labels[i];
+        if (mode >= 0) {
+            // a previous trajectory passed near this point
+            copy_point(&table.modes[mode], &shifted_dataset[i]);
+            path_labelled++;
+            continue;
+        }
+
+        Point path[BASIN_MAX_PATH];
+        unsigned int path_len = 0;
+        Point prev_point;
+        Point next_point;
+        copy_point(&dataset[i], &prev_point);
+
+        for (;;) {
+            if (label_index && path_len < BASIN_MAX_PATH) {
+                copy_point(&prev_point, &path[path_len++]);
+            }
+            if (shift_index) {
+                shift_single_point_indexed(&prev_point, &next_point, shift_index, bandwidth, kernel_func);
+            } else if (shift_soa) {
+                shift_single_point_soa(&prev_point, &next_point, shift_soa, bandwidth, soa_kernel);
+            } else {
+                shift_single_point(&prev_point, &next_point, support, support_size, support_weights,
+                                   bandwidth, kernel_func);
+            }
+            shifts++;
+
+            T shift_distance = euclidean_distance(&prev_point, &next_point);
+            copy_point(&next_point, &prev_point);
+            if (shift_distance <= EPSILON) {
+                // converged on its own: the position becomes (or joins) a known mode
+                mode = publish_mode(&table, &prev_point, basin_radius);
+                copy_point(&prev_point, &shifted_dataset[i]);
+                break;
+            }
+            mode = find_mode(&table, &prev_point, basin_radius);
+            if (mode >= 0) {
+                // inside the basin of a known mode: stop and adopt it
+                copy_point(&table.modes[mode], &shifted_dataset[i]);
+                early_exits++;
+                break;
+            }
+        }
+
+        #pragma omp atomic write seq_cst
+        table.labels[i] = mode;
+
+        if (label_index) {
+            PathLabel label = { table.labels, mode };
+            for (unsigned int k = 0; k < path_len; k++) {
+                spatial_index_radius_query(label_index, &path[k], path_radius, label_point, &label);
+            }
+        }
+    }
+
+    unsigned long long converged = dataset_size - early_exits - path_labelled;
+    printf("basin modes found: %u\n", table.count);
+    printf("basin early exits: %llu (%.2f%%), path labelled: %llu (%.2f%%), converged: %llu (%.2f%%)\n",
+           early_exits, 100.0 * early_exits / dataset_size,
+           path_labelled, 100.0 * path_labelled / dataset_size,
+           converged, 100.0 * converged / dataset_size);
+    printf("basin shifts: %llu (%.2f per point)\n", shifts, (double)shifts / dataset_size);
+    record_stat("basin_modes", table.count);
+    record_stat("basin_early_exits", (double)early_exits);
+    record_stat("basin_path_labelled", (double)path_labelled);
+    record_stat("basin_converged", (double)converged);
+    record_stat("basin_shifts", (double)shifts);
+
+    if (owns_path_index) free_spatial_index(&path_index);
+    free(table.modes);
+    free(table.labels);
+    return shifts;
+}
+
+void report_basin_accuracy(unsigned int dataset_size, const Point dataset[],
+                           const Point shifted_dataset[], T bandwidth, T (*kernel_func)(T, T))
+{
+    if (basin_verify_samples == 0 || dataset_size == 0) return;
+    unsigned int samples = basin_verify_samples < dataset_size ? basin_verify_samples : dataset_size;
+    double stride = (double)dataset_size / samples;
+
+    double sum_displacement = 0.0;
+    double max_displacement = 0.0;
+    unsigned int agreeing = 0;
+
+    #pragma omp parallel for schedule(dynamic) if(BASIN_PARALLEL) reduction(+:sum_displacement, agreeing) reduction(max:max_displacement)
+    for (int s = 0; s < samples; s++) {
+        unsigned int i = (unsigned int)(s * stride);
+        Point exact;
+        shift_point_until_convergence(&dataset[i], &exact, dataset, dataset_size, NULL, bandwidth, kernel_func);
+
+        double displacement = euclidean_distance(&exact, &shifted_dataset[i]);
+        sum_displacement += displacement;
+        if (displacement > max_displacement) max_displacement = displacement;
+        if (displacement <= CLUSTER_EPSILON) agreeing++;
+    }
+
+    printf("basin accuracy vs exact run (%u points): mean displacement %f, max %f, %.2f%% within CLUSTER_EPSILON\n",
+           samples, sum_displacement / samples, max_displacement, 100.0 * agreeing / samples);
+    record_stat("basin_verify_samples", samples);
+    record_stat("basin_mean_displacement", sum_displacement / samples);
+    record_stat("basin_max_displacement", max_displacement);
+    record_stat("basin_agreeing_fraction", (double)agreeing / samples);
+}
@@ -0,0 +1,217 @@
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <stdint.h>
+#include <math.h>
+#include <omp.h>
+#include "include/utils.h"
+#include "include/point.h"
+#include "include/mean_shift.h"
+#include "include/clustering.h"
+
+// Assign clusters to shifted points
+void assign_clusters(Point *shifted_point, Point cluster_modes[],
+                     unsigned int *cluster_count)
+{
+    unsigned int c = 0;
+    for (; c < *cluster_count; c++)
+    {
+        T distance_from_cluster = euclidean_distance(shifted_point, &cluster_modes[c]);
+
+        if (distance_from_cluster <= CLUSTER_EPSILON)
+        {
+            copy_point(&cluster_modes[c], shifted_point); // assign cluster mode to shifted point
+            break;
+        }
+    }
+    // Whenever [shifted_point] doesn't belong to any cluster:
+    // --> create cluster with mode in [shifted_point]
+    if (c == *cluster_count)
+    {
+        copy_point(shifted_point, &cluster_modes[c]); // assign cluster mode to shifted point
+        (*cluster_count)++;
+    }
+}
+
+// Spatial hash of the modes: open addressing on the cell coordinates, every slot holds
+// the chain of modes (linked through [next]) falling in that cell
+typedef struct {
+    int cell[DIM];
+    int head;           // last mode added to the cell, -1 if the slot is empty
+} ModeCell;
+
+typedef struct {
+    ModeCell *slots;
+    size_t capacity;    // power of 2
+    size_t used;
+    int *next;          // next mode in the same cell, -1 at the end of the chain
+    const Point *modes;
+} ModeHash;
+
+static inline void cell_of(const Point *p, int cell[DIM])
+{
+    for (int d = 0; d < DIM; d++) {
+        cell[d] = (int)floor(p->coords[d] / CLUSTER_EPSILON);
+    }
+}
+
+static inline size_t hash_cell(const int cell[DIM])
+{
+    uint64_t hash = 1469598103934665603ULL;
+    for (int d = 0; d < DIM; d++) {
+        hash ^= (uint32_t)cell[d];
+        hash *= 1099511628211ULL;
+    }
+    return (size_t)(hash ^ (hash >> 29));
+}
+
+// Slot of [cell], or the empty slot where it would go
+static size_t find_slot(const ModeHash *hash, const int cell[DIM])
+{
+    size_t slot = hash_cell(cell) & (hash->capacity - 1);
+    while (hash->slots[slot].head >= 0 &&
+           memcmp(hash->slots[slot].cell, cell, sizeof(int) * DIM) != 0) {
+        slot = (slot + 1) & (hash->capacity - 1);
+    }
+    return slot;
+}
+
+static int init_mode_hash(ModeHash *hash, const Point modes[], unsigned int max_modes)
+{
+    hash->capacity = 1024;
+    hash->used = 0;
+    hash->modes = modes;
+    hash->slots = (ModeCell *)malloc(hash->capacity * sizeof(ModeCell));
+    hash->next = (int *)malloc(max_modes * sizeof(int));
+    if (!hash->slots || !hash->next) return -1;
+    for (size_t s = 0; s < hash->capacity; s++) hash->slots[s].head = -1;
+    return 0;
+}
+
+static void free_mode_hash(ModeHash *hash)
+{
+    free(hash->slots);
+    free(hash->next);
+}
+
+// Doubles the table (sequential phase only)
+static int grow_mode_hash(ModeHash *hash)
+{
+    ModeCell *old_slots = hash->slots;
+    size_t old_capacity = hash->capacity;
+    hash->capacity *= 2;
+    hash->slots = (ModeCell *)malloc(hash->capacity * sizeof(ModeCell));
+    if (!hash->slots) {
+        hash->slots = old_slots;
+        hash->capacity = old_capacity;
+        return -1;
+    }
+    for (size_t s = 0; s < hash->capacity; s++) hash->slots[s].head = -1;
+    for (size_t s = 0; s < old_capacity; s++) {
+        if (old_slots[s].head < 0) continue;
+        hash->slots[find_slot(hash, old_slots[s].cell)] = old_slots[s];
+    }
+    free(old_slots);
+    return 0;
+}
+
+// Adds mode [m] (already stored in hash->modes) to its cell
+static int insert_mode(ModeHash *hash, int m)
+{
+    if ((hash->used + 1) * 2 > hash->capacity && grow_mode_hash(hash) != 0) return -1;
+    int cell[DIM];
+    cell_of(&hash->modes[m], cell);
+    size_t slot = find_slot(hash, cell);
+    if (hash->slots[slot].head < 0) {
+        memcpy(hash->slots[slot].cell, cell, sizeof(int) * DIM);
+        hash->used++;
+    }
+    hash->next[m] = hash->slots[slot].head;
+    hash->slots[slot].head = m;
+    return 0;
+}
+
+// Lowest-index mode within CLUSTER_EPSILON of [p], -1 if none. Modes are numbered in
+// creation order, so this is the mode the sequential scan would stop at.
+static int query_modes(const ModeHash *hash, const Point *p)
+{
+    int center[DIM];
+    cell_of(p, center);
+
+    int neighbours = 1;
+    for (int d = 0; d < DIM; d++) neighbours *= 3;
+
+    int best = -1;
+    for (int n = 0; n < neighbours; n++) {
+        int cell[DIM];
+        int code = n;
+        for (int d = 0; d < DIM; d++) {
+            cell[d] = center[d] + (code % 3) - 1;
+            code /= 3;
+        }
+        size_t slot = find_slot(hash, cell);
+        for (int m = hash->slots[slot].head; m >= 0; m = hash->next[m]) {
+            if ((best < 0 || m < best) &&
+                euclidean_distance(p, &hash->modes[m]) <= CLUSTER_EPSILON) {
+                best = m;
+            }
+        }
+    }
+    return best;
+}
+
+int assign_clusters_parallel(unsigned int dataset_size, Point shifted_dataset[],
+                             Point cluster_modes[], unsigned int *cluster_count)
+{
+    ModeHash hash = {0};
+    int *mode_of = (int *)malloc(dataset_size * sizeof(int));
+    if (!mode_of || init_mode_hash(&hash, cluster_modes, dataset_size) != 0) {
+        fprintf(stderr, "Error: Memory allocation failed in assign_clusters_parallel\n");
+        free(mode_of);
+        free_mode_hash(&hash);
+        return -1;
+    }
+
+    unsigned int count = 0;
+    int status = 0;
+    for (unsigned int block = 0; block < dataset_size && status == 0; block += CLUSTERING_BLOCK_SIZE) {
+        unsigned int block_end = block + CLUSTERING_BLOCK_SIZE < dataset_size ? block + CLUSTERING_BLOCK_SIZE : dataset_size;
+
+        // 1. Parallel: modes created before the block. If one is within CLUSTER_EPSILON, the
+        // lowest such index is final, since modes created inside the block have higher indices.
+        #pragma omp parallel for schedule(static)
+        for (unsigned int i = block; i < block_end; i++) {
+            mode_of[i] = query_modes(&hash, &shifted_dataset[i]);
+        }
+
+        // 2. Sequential, in dataset order: the uncovered points see the modes created so far
+        // in the block and either join one of them or become a new mode
+        for (unsigned int i = block; i < block_end; i++) {
+            if (mode_of[i] >= 0) continue;
+            int m = query_modes(&hash, &shifted_dataset[i]);
+            if (m < 0) {
+                m = count++;
+                copy_point(&shifted_dataset[i], &cluster_modes[m]);
+                if (insert_mode(&hash, m) != 0) {
+                    fprintf(stderr, "Error: Memory allocation failed in assign_clusters_parallel\n");
+                    status = -1;
+                    break;
+                }
+            }
+            mode_of[i] = m;
+        }
+    }
+
+    // 3. Parallel: every point takes the mode of its cluster
+    if (status == 0) {
+        #pragma omp parallel for schedule(static)
+        for (unsigned int i = 0; i < dataset_size; i++) {
+            copy_point(&cluster_modes[mode_of[i]], &shifted_dataset[i]);
+        }
+    }
+    *cluster_count = count;
+
+    free(mode_of);
+    free_mode_hash(&hash);
+    return status;
+}
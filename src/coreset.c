@@ -0,0 +1,296 @@
+#include <stdio.h>
+#include <stdlib.h>
+#include <stdint.h>
+#include <math.h>
+#include "include/utils.h"
+#include "include/point.h"
+#include "include/mean_shift.h"
+#include "include/dedupe.h"
+#include "include/dataset_io.h"
+#include "include/coreset.h"
+#include "metrics/run_record.h"
+
+int coreset_method = CORESET_NONE;
+unsigned int coreset_size = 0;
+T coreset_tolerance = CORESET_DEFAULT_TOLERANCE;
+unsigned long long coreset_seed = 1;
+int coreset_verify = 0;
+
+// Cells are enlarged by this factor until a grid fits in coreset_size points
+#define CORESET_GRID_GROWTH 1.25
+#define CORESET_GRID_MAX_STEPS 64
+
+const char *coreset_method_name(int method)
+{
+    switch (method) {
+    case CORESET_SAMPLE: return "sample";
+    case CORESET_GRID: return "grid";
+    default: return "none";
+    }
+}
+
+// xorshift64*: the sample only depends on the seed, not on the platform
+static unsigned long long next_random(unsigned long long *state)
+{
+    *state ^= *state >> 12;
+    *state ^= *state << 25;
+    *state ^= *state >> 27;
+    return *state * 2685821657736338717ULL;
+}
+
+static int compare_indices(const void *a, const void *b)
+{
+    unsigned int x = *(const unsigned int *)a, y = *(const unsigned int *)b;
+    return (x > y) - (x < y);
+}
+
+static int sample_support(const Point dataset[], unsigned int dataset_size, Coreset *coreset)
+{
+    unsigned int size = coreset_size > 0 ? coreset_size : dataset_size / CORESET_SAMPLE_RATIO;
+    if (size == 0) size = 1;
+    if (size > dataset_size) size = dataset_size;
+
+    unsigned int *order = (unsigned int *)malloc(dataset_size * sizeof(unsigned int));
+    coreset->points = (Point *)malloc(size * sizeof(Point));
+    coreset->weights = (T *)malloc(size * sizeof(T));
+    if (!order || !coreset->points || !coreset->weights) {
+        free(order);
+        return -1;
+    }
+
+    // Partial Fisher-Yates shuffle: the first [size] indices are a uniform sample without replacement
+    unsigned long long state = coreset_seed ? coreset_seed : 1; // xorshift needs a non-zero state
+    for (unsigned int i = 0; i < dataset_size; i++) order[i] = i;
+    for (unsigned int i = 0; i < size; i++) {
+        unsigned int j = i + (unsigned int)(next_random(&state) % (dataset_size - i));
+        unsigned int swap = order[i];
+        order[i] = order[j];
+        order[j] = swap;
+    }
+    // in dataset order: the support is read in the same order as the points it comes from
+    qsort(order, size, sizeof(unsigned int), compare_indices);
+
+    T weight = (T)dataset_size / size;
+    for (unsigned int s = 0; s < size; s++) {
+        copy_point(&dataset[order[s]], &coreset->points[s]);
+        coreset->weights[s] = weight;
+    }
+    coreset->size = size;
+    free(order);
+    return 0;
+}
+
+// Occupied cells of side [cell]: the cell coordinates of every point are deduplicated
+static int grid_cells(const Point dataset[], unsigned int dataset_size, T cell, Point cells[], UniqueColors *unique)
+{
+    #pragma omp parallel for schedule(static)
+    for (int i = 0; i < (int)dataset_size; i++) {
+        for (int d = 0; d < DIM; d++) {
+            // + 0 turns -0 into 0: the cells are compared bitwise
+            cells[i].coords[d] = floor(dataset[i].coords[d] / cell) + (T)0;
+        }
+    }
+    return dedupe_dataset(cells, dataset_size, unique);
+}
+
+static int grid_support(const Point dataset[], unsigned int dataset_size, T bandwidth, Coreset *coreset)
+{
+    Point *cells = (Point *)malloc(dataset_size * sizeof(Point));
+    if (!cells) return -1;
+
+    UniqueColors unique;
+    T cell = coreset_tolerance * bandwidth;
+    if (grid_cells(dataset, dataset_size, cell, cells, &unique) != 0) {
+        free(cells);
+        return -1;
+    }
+    for (int step = 0; coreset_size > 0 && unique.size > coreset_size && step < CORESET_GRID_MAX_STEPS; step++) {
+        free_unique_colors(&unique);
+        cell *= CORESET_GRID_GROWTH;
+        if (grid_cells(dataset, dataset_size, cell, cells, &unique) != 0) {
+            free(cells);
+            return -1;
+        }
+    }
+    free(cells);
+
+    // Centroid of every cell (summed in double: a cell can hold most of the image)
+    double *sums = (double *)calloc((size_t)unique.size * DIM, sizeof(double));
+    coreset->points = (Point *)malloc(unique.size * sizeof(Point));
+    coreset->weights = (T *)malloc(unique.size * sizeof(T));
+    if (!sums || !coreset->points || !coreset->weights) {
+        free(sums);
+        free_unique_colors(&unique);
+        return -1;
+    }
+    for (unsigned int i = 0; i < dataset_size; i++) {
+        double *sum = &sums[(size_t)unique.inverse[i] * DIM];
+        for (int d = 0; d < DIM; d++) sum[d] += dataset[i].coords[d];
+    }
+    for (unsigned int u = 0; u < unique.size; u++) {
+        for (int d = 0; d < DIM; d++) {
+            coreset->points[u].coords[d] = (T)(sums[(size_t)u * DIM + d] / unique.counts[u]);
+        }
+        coreset->weights[u] = unique.counts[u];
+    }
+    coreset->size = unique.size;
+    coreset->cell = cell;
+    free(sums);
+    free_unique_colors(&unique);
+    return 0;
+}
+
+int build_coreset(const Point dataset[], unsigned int dataset_size, T bandwidth, Coreset *coreset)
+{
+    coreset->points = NULL;
+    coreset->weights = NULL;
+    coreset->size = 0;
+    coreset->cell = 0;
+    int status = 0;
+    if (coreset_method == CORESET_SAMPLE) {
+        status = sample_support(dataset, dataset_size, coreset);
+    } else if (coreset_method == CORESET_GRID) {
+        status = grid_support(dataset, dataset_size, bandwidth, coreset);
+    }
+    if (status != 0) {
+        fprintf(stderr, "Error: Memory allocation failed in build_coreset\n");
+        free_coreset(coreset);
+    }
+    return status;
+}
+
+void free_coreset(Coreset *coreset)
+{
+    free(coreset->points);
+    free(coreset->weights);
+    coreset->points = NULL;
+    coreset->weights = NULL;
+    coreset->size = 0;
+}
+
+unsigned int count_empty_windows(unsigned int size, const Point shifted[],
+                                 unsigned int support_size, const Point support[],
+                                 T bandwidth, T (*kernel_func)(T, T))
+{
+    unsigned int empty = 0;
+    #pragma omp parallel for schedule(dynamic, 256) reduction(+:empty)
+    for (int i = 0; i < (int)size; i++) {
+        unsigned int s = 0;
+        while (s < support_size && kernel_func(euclidean_distance(&shifted[i], &support[s]), bandwidth) == 0) s++;
+        if (s == support_size) empty++;
+    }
+    return empty;
+}
+
+void report_empty_windows(unsigned int empty, unsigned int size)
+{
+    if (empty > 0) {
+        printf("coreset: %u points (%.2f%%) with an empty window stayed in place\n", empty, 100.0 * empty / size);
+    }
+    record_stat("coreset_empty_windows", empty);
+}
+
+static int compare_pairs(const void *a, const void *b)
+{
+    uint64_t x = *(const uint64_t *)a, y = *(const uint64_t *)b;
+    return (x > y) - (x < y);
+}
+
+// Fraction of the points in the cluster of [to] most of their cluster of [from] is in
+static double majority_agreement(unsigned int size, const uint32_t from[], const uint32_t to[], uint64_t pairs[])
+{
+    for (unsigned int i = 0; i < size; i++) {
+        pairs[i] = ((uint64_t)from[i] << 32) | to[i];
+    }
+    qsort(pairs, size, sizeof(uint64_t), compare_pairs);
+
+    unsigned long long agreeing = 0;
+    unsigned int i = 0;
+    while (i < size) {
+        uint64_t cluster = pairs[i] >> 32;
+        unsigned int largest = 0;
+        while (i < size && (pairs[i] >> 32) == cluster) {
+            unsigned int j = i;
+            while (j < size && pairs[j] == pairs[i]) j++;
+            if (j - i > largest) largest = j - i;
+            i = j;
+        }
+        agreeing += largest;
+    }
+    return (double)agreeing / size;
+}
+
+int report_coreset_accuracy(unsigned int size, const Point exact[], const Point approximate[],
+                            double exact_seconds, double approximate_seconds)
+{
+    if (size == 0) return 0;
+    uint32_t *exact_ids = (uint32_t *)malloc(size * sizeof(uint32_t));
+    uint32_t *approximate_ids = (uint32_t *)malloc(size * sizeof(uint32_t));
+    Point *exact_modes = (Point *)malloc(size * sizeof(Point));
+    Point *approximate_modes = (Point *)malloc(size * sizeof(Point));
+    uint64_t *pairs = (uint64_t *)malloc(size * sizeof(uint64_t));
+    long exact_count = -1, approximate_count = -1;
+    if (exact_ids && approximate_ids && exact_modes && approximate_modes && pairs) {
+        // The shifted points are copies of their mode: the palettes are the modes, the ids the labels
+        exact_count = build_palette(size, exact, exact_ids, exact_modes);
+        approximate_count = build_palette(size, approximate, approximate_ids, approximate_modes);
+    }
+    if (exact_count < 0 || approximate_count < 0) {
+        fprintf(stderr, "Error: Memory allocation failed in report_coreset_accuracy\n");
+        free(exact_ids);
+        free(approximate_ids);
+        free(exact_modes);
+        free(approximate_modes);
+        free(pairs);
+        return -1;
+    }
+
+    // Both ways, so that splitting or merging clusters both lower the agreement
+    double agreement = majority_agreement(size, approximate_ids, exact_ids, pairs);
+    double reverse_agreement = majority_agreement(size, exact_ids, approximate_ids, pairs);
+    if (reverse_agreement < agreement) agreement = reverse_agreement;
+
+    // Distance from every exact mode to the nearest approximate one
+    unsigned int matched_modes = 0;
+    double sum_mode_error = 0.0;
+    double max_mode_error = 0.0;
+    for (long e = 0; e < exact_count; e++) {
+        double nearest = INFINITY;
+        for (long a = 0; a < approximate_count; a++) {
+            double distance = euclidean_distance(&exact_modes[e], &approximate_modes[a]);
+            if (distance < nearest) nearest = distance;
+        }
+        sum_mode_error += nearest;
+        if (nearest > max_mode_error) max_mode_error = nearest;
+        if (nearest <= CLUSTER_EPSILON) matched_modes++;
+    }
+
+    double sum_displacement = 0.0;
+    #pragma omp parallel for schedule(static) reduction(+:sum_displacement)
+    for (int i = 0; i < (int)size; i++) {
+        sum_displacement += euclidean_distance(&exact[i], &approximate[i]);
+    }
+
+    double speedup = approximate_seconds > 0 ? exact_seconds / approximate_seconds : 0.0;
+    printf("coreset vs exact run: speed-up %.2fx (%f s vs %f s), label agreement %.2f%%\n",
+           speedup, approximate_seconds, exact_seconds, 100.0 * agreement);
+    printf("coreset modes: %ld exact, %ld approximate, %u exact modes within CLUSTER_EPSILON "
+           "(mean error %f, max %f), mean point displacement %f\n",
+           exact_count, approximate_count, matched_modes, sum_mode_error / exact_count, max_mode_error,
+           sum_displacement / size);
+    record_stat("coreset_exact_seconds", exact_seconds);
+    record_stat("coreset_speedup", speedup);
+    record_stat("coreset_label_agreement", agreement);
+    record_stat("coreset_exact_clusters", exact_count);
+    record_stat("coreset_matched_modes_fraction", (double)matched_modes / exact_count);
+    record_stat("coreset_mean_mode_error", sum_mode_error / exact_count);
+    record_stat("coreset_max_mode_error", max_mode_error);
+    record_stat("coreset_mean_displacement", sum_displacement / size);
+
+    free(exact_ids);
+    free(approximate_ids);
+    free(exact_modes);
+    free(approximate_modes);
+    free(pairs);
+    return 0;
+}
@@ -0,0 +1,550 @@
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include "include/utils.h"
+#include "include/point.h"
+#include "include/dataset_io.h"
+#include <omp.h>
+
+#ifndef _WIN32
+#include <fcntl.h>
+#include <sys/mman.h>
+#include <sys/stat.h>
+#include <unistd.h>
+#endif
+
+_Static_assert(sizeof(DatasetHeader) == DATASET_HEADER_SIZE, "DatasetHeader must be 64 bytes");
+_Static_assert(sizeof(LabelMapHeader) == DATASET_HEADER_SIZE, "LabelMapHeader must be 64 bytes");
+
+static unsigned int dtype_size(uint32_t dtype)
+{
+    switch (dtype) {
+        case DATASET_DTYPE_FLOAT32: return 4;
+        case DATASET_DTYPE_FLOAT64: return 8;
+        default: return 0;
+    }
+}
+
+// dtype tag matching the compile-time precision T
+static uint32_t native_dtype(void)
+{
+    return sizeof(T) == 4 ? DATASET_DTYPE_FLOAT32 : DATASET_DTYPE_FLOAT64;
+}
+
+int is_binary_dataset(const char *path)
+{
+    char magic[4];
+    FILE *f = fopen(path, "rb");
+    if (!f) return 0;
+    size_t read = fread(magic, 1, sizeof(magic), f);
+    fclose(f);
+    return read == sizeof(magic) && memcmp(magic, DATASET_MAGIC, sizeof(magic)) == 0;
+}
+
+static int has_extension(const char *path, const char *extension)
+{
+    size_t len = strlen(path);
+    size_t ext_len = strlen(extension);
+    return len >= ext_len && strcmp(path + len - ext_len, extension) == 0;
+}
+
+int has_binary_extension(const char *path)
+{
+    return has_extension(path, DATASET_EXTENSION);
+}
+
+int has_label_map_extension(const char *path)
+{
+    return has_extension(path, LABELMAP_EXTENSION);
+}
+
+// Maps the whole file read-only (copy-on-write), falls back to reading it on Windows
+static void *map_file(const char *path, size_t *size)
+{
+#ifndef _WIN32
+    int fd = open(path, O_RDONLY);
+    if (fd < 0) return NULL;
+    struct stat st;
+    if (fstat(fd, &st) != 0 || st.st_size == 0) {
+        close(fd);
+        return NULL;
+    }
+    void *addr = mmap(NULL, st.st_size, PROT_READ | PROT_WRITE, MAP_PRIVATE, fd, 0);
+    close(fd); // the mapping keeps its own reference
+    if (addr == MAP_FAILED) return NULL;
+    madvise(addr, st.st_size, MADV_SEQUENTIAL);
+    *size = st.st_size;
+    return addr;
+#else
+    FILE *f = fopen(path, "rb");
+    if (!f) return NULL;
+    fseek(f, 0, SEEK_END);
+    long len = ftell(f);
+    fseek(f, 0, SEEK_SET);
+    void *buffer = len > 0 ? malloc(len) : NULL;
+    if (!buffer || fread(buffer, 1, len, f) != (size_t)len) {
+        free(buffer);
+        fclose(f);
+        return NULL;
+    }
+    fclose(f);
+    *size = len;
+    return buffer;
+#endif
+}
+
+static void unmap_file(void *addr, size_t size)
+{
+#ifndef _WIN32
+    munmap(addr, size);
+#else
+    (void)size;
+    free(addr);
+#endif
+}
+
+int map_binary_dataset(const char *path, Dataset *ds)
+{
+    memset(ds, 0, sizeof(*ds));
+
+    size_t size = 0;
+    unsigned char *base = (unsigned char *)map_file(path, &size);
+    if (!base) {
+        fprintf(stderr, "Error: cannot map binary dataset %s\n", path);
+        return -1;
+    }
+
+    DatasetHeader header;
+    if (size < sizeof(header)) {
+        fprintf(stderr, "Error: %s is too small to be a binary dataset\n", path);
+        unmap_file(base, size);
+        return -1;
+    }
+    memcpy(&header, base, sizeof(header));
+
+    size_t n = (size_t)header.width * header.height;
+    unsigned int value_size = dtype_size(header.dtype);
+    if (memcmp(header.magic, DATASET_MAGIC, 4) != 0 || header.version != DATASET_VERSION) {
+        fprintf(stderr, "Error: %s is not a version %d binary dataset\n", path, DATASET_VERSION);
+        unmap_file(base, size);
+        return -1;
+    }
+    if (header.dim != DIM || value_size == 0) {
+        fprintf(stderr, "Error: %s has dim=%u dtype=%u, expected dim=%d\n", path, header.dim, header.dtype, DIM);
+        unmap_file(base, size);
+        return -1;
+    }
+    if (header.data_offset + n * DIM * value_size > size ||
+        ((header.flags & DATASET_HAS_LABELS) && header.labels_offset + n * sizeof(int32_t) > size)) {
+        fprintf(stderr, "Error: %s is truncated\n", path);
+        unmap_file(base, size);
+        return -1;
+    }
+
+    ds->width = header.width;
+    ds->height = header.height;
+    ds->mapping = base;
+    ds->mapping_size = size;
+    ds->source_size = size;
+    ds->rows = n;
+
+    if (header.dtype == native_dtype() && header.data_offset % sizeof(T) == 0) {
+        // zero-copy: the payload already has the layout of Point[n]
+        ds->points = (Point *)(base + header.data_offset);
+        ds->owns_points = 0;
+    } else {
+        ds->points = (Point *)malloc(n * sizeof(Point));
+        if (!ds->points) {
+            fprintf(stderr, "Error: Memory allocation failed in map_binary_dataset\n");
+            unmap_file(base, size);
+            return -1;
+        }
+        ds->owns_points = 1;
+        const unsigned char *values = base + header.data_offset;
+        #pragma omp parallel for
+        for (size_t i = 0; i < n; i++) {
+            for (unsigned int d = 0; d < DIM; d++) {
+                size_t k = i * DIM + d;
+                if (header.dtype == DATASET_DTYPE_FLOAT32) {
+                    float v;
+                    memcpy(&v, values + k * sizeof(float), sizeof(float));
+                    ds->points[i].coords[d] = (T)v;
+                } else {
+                    double v;
+                    memcpy(&v, values + k * sizeof(double), sizeof(double));
+                    ds->points[i].coords[d] = (T)v;
+                }
+            }
+        }
+    }
+
+    if (header.flags & DATASET_HAS_LABELS) {
+        ds->labels = (int *)(base + header.labels_offset);
+    }
+    return 0;
+}
+
+// ---------------------------- CSV ingest -------------------------------
+
+static const double pow10_table[] = {
+    1e0, 1e1, 1e2, 1e3, 1e4, 1e5, 1e6, 1e7, 1e8, 1e9, 1e10, 1e11,
+    1e12, 1e13, 1e14, 1e15, 1e16, 1e17, 1e18, 1e19, 1e20, 1e21, 1e22};
+
+static double pow10_int(int e)
+{
+    double scale = 1.0;
+    int neg = e < 0;
+    if (neg) e = -e;
+    while (e > 22) {
+        scale *= 1e22;
+        e -= 22;
+    }
+    scale *= pow10_table[e];
+    return neg ? 1.0 / scale : scale;
+}
+
+// Non-allocating decimal parser: [sign] digits [. digits] [e|E [sign] digits].
+// Returns the position after the number, or [p] itself if no digits were found.
+static const char *parse_number(const char *p, const char *end, double *out)
+{
+    const char *start = p;
+    int negative = 0;
+    if (p < end && (*p == '-' || *p == '+')) {
+        negative = *p == '-';
+        p++;
+    }
+
+    uint64_t mantissa = 0;
+    int exponent = 0;
+    int digits = 0;
+    for (; p < end && *p >= '0' && *p <= '9'; p++, digits++) {
+        if (mantissa < 1000000000000000000ULL) mantissa = mantissa * 10 + (*p - '0');
+        else exponent++; // extra digits beyond uint64 precision
+    }
+    if (p < end && *p == '.') {
+        p++;
+        for (; p < end && *p >= '0' && *p <= '9'; p++, digits++) {
+            if (mantissa < 1000000000000000000ULL) {
+                mantissa = mantissa * 10 + (*p - '0');
+                exponent--;
+            }
+        }
+    }
+    if (digits == 0) return start;
+
+    if (p < end && (*p == 'e' || *p == 'E')) {
+        const char *q = p + 1;
+        int exp_negative = 0;
+        if (q < end && (*q == '-' || *q == '+')) {
+            exp_negative = *q == '-';
+            q++;
+        }
+        if (q < end && *q >= '0' && *q <= '9') {
+            int e = 0;
+            for (; q < end && *q >= '0' && *q <= '9'; q++)
+                if (e < 10000) e = e * 10 + (*q - '0');
+            exponent += exp_negative ? -e : e;
+            p = q;
+        }
+    }
+
+    double value = (double)mantissa;
+    if (exponent != 0) value = exponent < 0 ? value / pow10_int(-exponent) : value * pow10_int(exponent);
+    *out = negative ? -value : value;
+    return p;
+}
+
+static const char *next_line(const char *p, const char *end)
+{
+    const char *nl = (const char *)memchr(p, '\n', end - p);
+    return nl ? nl + 1 : end;
+}
+
+static int is_blank_line(const char *p, const char *line_end)
+{
+    for (; p < line_end; p++)
+        if (*p != ' ' && *p != '\t' && *p != '\r' && *p != '\n') return 0;
+    return 1;
+}
+
+// Counts the non-blank lines in [p, end)
+static unsigned int count_rows(const char *p, const char *end)
+{
+    unsigned int rows = 0;
+    while (p < end) {
+        const char *line_end = next_line(p, end);
+        if (!is_blank_line(p, line_end)) rows++;
+        p = line_end;
+    }
+    return rows;
+}
+
+// Parses one "v0,v1,...,v(DIM-1)" row into [point]. Returns 0 on success.
+static int parse_row(const char *p, const char *line_end, Point *point)
+{
+    for (unsigned int d = 0; d < DIM; d++) {
+        while (p < line_end && (*p == ' ' || *p == '\t' || (d > 0 && *p == ','))) p++;
+        double value;
+        const char *after = parse_number(p, line_end, &value);
+        if (after == p) return -1;
+        point->coords[d] = (T)value;
+        p = after;
+    }
+    return 0;
+}
+
+int load_csv_dataset(const char *path, Dataset *ds)
+{
+    memset(ds, 0, sizeof(*ds));
+
+    size_t size = 0;
+    const char *base = (const char *)map_file(path, &size);
+    if (!base) {
+        fprintf(stderr, "Error opening CSV file %s\n", path);
+        return -1;
+    }
+    const char *end = base + size;
+
+    // Header: "width,height," / "W,H," / "L,A,B"
+    const char *p = next_line(base, end);
+    double width = 0, height = 0;
+    const char *q = parse_number(p, end, &width);
+    if (q == p || q >= end || *q != ',' || parse_number(q + 1, end, &height) == q + 1 || width < 1 || height < 1) {
+        fprintf(stderr, "Error: %s does not start with a valid width,height header\n", path);
+        unmap_file((void *)base, size);
+        return -1;
+    }
+    p = next_line(next_line(p, end), end);
+
+    ds->width = (unsigned int)width;
+    ds->height = (unsigned int)height;
+    ds->source_size = size;
+    size_t n = (size_t)ds->width * ds->height;
+    ds->points = (Point *)malloc(n * sizeof(Point));
+    if (!ds->points) {
+        fprintf(stderr, "Error: Memory allocation failed in load_csv_dataset\n");
+        unmap_file((void *)base, size);
+        return -1;
+    }
+    ds->owns_points = 1;
+
+    // Split the body into byte ranges that start right after a newline
+    int num_chunks = omp_get_max_threads() * 4;
+    size_t body = end - p;
+    if ((size_t)num_chunks > body / 64 + 1) num_chunks = body / 64 + 1;
+    const char **chunk_start = (const char **)malloc((num_chunks + 1) * sizeof(const char *));
+    unsigned int *chunk_rows = (unsigned int *)malloc((num_chunks + 1) * sizeof(unsigned int));
+    chunk_start[0] = p;
+    for (int c = 1; c < num_chunks; c++) {
+        const char *guess = p + body * c / num_chunks;
+        if (guess < chunk_start[c - 1]) guess = chunk_start[c - 1];
+        chunk_start[c] = guess == p ? p : next_line(guess - 1, end);
+    }
+    chunk_start[num_chunks] = end;
+
+    // Pass 1: rows per range, then exclusive prefix sum to get each range's first row
+    #pragma omp parallel for schedule(static)
+    for (int c = 0; c < num_chunks; c++) {
+        chunk_rows[c] = count_rows(chunk_start[c], chunk_start[c + 1]);
+    }
+    unsigned int total_rows = 0;
+    for (int c = 0; c < num_chunks; c++) {
+        unsigned int rows = chunk_rows[c];
+        chunk_rows[c] = total_rows;
+        total_rows += rows;
+    }
+
+    // Pass 2: parse every range in parallel, writing straight into the dataset
+    int errors = 0;
+    #pragma omp parallel for schedule(dynamic) reduction(+:errors)
+    for (int c = 0; c < num_chunks; c++) {
+        size_t row = chunk_rows[c];
+        const char *line = chunk_start[c];
+        while (line < chunk_start[c + 1] && row < n) {
+            const char *line_end = next_line(line, chunk_start[c + 1]);
+            if (!is_blank_line(line, line_end)) {
+                if (parse_row(line, line_end, &ds->points[row]) != 0) {
+                    init_point(&ds->points[row]);
+                    errors++;
+                }
+                row++;
+            }
+            line = line_end;
+        }
+    }
+
+    free(chunk_start);
+    free(chunk_rows);
+    unmap_file((void *)base, size);
+
+    ds->rows = total_rows < n ? total_rows : n;
+    if (errors > 0) {
+        fprintf(stderr, "Warning: %d malformed rows in %s were set to 0\n", errors, path);
+    }
+    if (total_rows < n) {
+        fprintf(stderr, "Warning: %s has %u rows, expected %zu (%ux%u)\n", path, total_rows, n, ds->width, ds->height);
+        for (size_t i = total_rows; i < n; i++) init_point(&ds->points[i]);
+    }
+    return 0;
+}
+
+void release_dataset(Dataset *ds)
+{
+    if (ds->owns_points) free(ds->points);
+    if (ds->mapping) unmap_file(ds->mapping, ds->mapping_size);
+    memset(ds, 0, sizeof(*ds));
+}
+
+int write_binary_dataset(const char *path, unsigned int width, unsigned int height,
+                         const Point points[], const int labels[])
+{
+    size_t n = (size_t)width * height;
+    size_t data_size = n * sizeof(Point);
+
+    DatasetHeader header;
+    memset(&header, 0, sizeof(header));
+    memcpy(header.magic, DATASET_MAGIC, 4);
+    header.version = DATASET_VERSION;
+    header.width = width;
+    header.height = height;
+    header.dim = DIM;
+    header.dtype = native_dtype();
+    header.header_size = DATASET_HEADER_SIZE;
+    header.data_offset = DATASET_HEADER_SIZE;
+    if (labels) {
+        header.flags |= DATASET_HAS_LABELS;
+        header.labels_offset = DATASET_HEADER_SIZE + data_size;
+    }
+
+    FILE *f = fopen(path, "wb");
+    if (!f) {
+        fprintf(stderr, "Error opening %s\n", path);
+        return -1;
+    }
+    int ok = fwrite(&header, sizeof(header), 1, f) == 1 &&
+             fwrite(points, 1, data_size, f) == data_size;
+    if (ok && labels) {
+        ok = fwrite(labels, sizeof(int), n, f) == n;
+    }
+    if (fclose(f) != 0) ok = 0;
+    if (!ok) {
+        fprintf(stderr, "Error writing %s\n", path);
+        return -1;
+    }
+    return 0;
+}
+
+// ---------------------------- label maps -------------------------------
+
+static size_t hash_point(const Point *p)
+{
+    const unsigned char *bytes = (const unsigned char *)p->coords;
+    uint64_t hash = 1469598103934665603ULL;
+    for (size_t b = 0; b < sizeof(p->coords); b++) {
+        hash ^= bytes[b];
+        hash *= 1099511628211ULL;
+    }
+    return (size_t)(hash ^ (hash >> 29));
+}
+
+long build_palette(unsigned int point_count, const Point points[], uint32_t ids[], Point palette[])
+{
+    size_t capacity = 1024;
+    while (capacity < (size_t)point_count * 2) capacity *= 2;
+    int32_t *slots = (int32_t *)malloc(capacity * sizeof(int32_t)); // palette index, -1 if empty
+    if (!slots) return -1;
+    memset(slots, 0xff, capacity * sizeof(int32_t));
+
+    long palette_size = 0;
+    for (unsigned int i = 0; i < point_count; i++) {
+        size_t slot = hash_point(&points[i]) & (capacity - 1);
+        while (slots[slot] >= 0 &&
+               memcmp(palette[slots[slot]].coords, points[i].coords, sizeof(points[i].coords)) != 0) {
+            slot = (slot + 1) & (capacity - 1);
+        }
+        if (slots[slot] < 0) {
+            copy_point(&points[i], &palette[palette_size]);
+            slots[slot] = (int32_t)palette_size++;
+        }
+        ids[i] = (uint32_t)slots[slot];
+    }
+    free(slots);
+    return palette_size;
+}
+
+int write_label_map(const char *path, unsigned int width, unsigned int height,
+                    unsigned int point_count, const Point points[], const int index[])
+{
+    size_t n = (size_t)width * height;
+    uint32_t *ids = (uint32_t *)malloc(point_count * sizeof(uint32_t));
+    Point *palette = (Point *)malloc(point_count * sizeof(Point));
+    if (!ids || !palette) {
+        fprintf(stderr, "Error: Memory allocation failed in write_label_map\n");
+        free(ids);
+        free(palette);
+        return -1;
+    }
+    long palette_size = build_palette(point_count, points, ids, palette);
+    if (palette_size < 0) {
+        fprintf(stderr, "Error: Memory allocation failed in write_label_map\n");
+        free(ids);
+        free(palette);
+        return -1;
+    }
+
+    LabelMapHeader header;
+    memset(&header, 0, sizeof(header));
+    memcpy(header.magic, LABELMAP_MAGIC, 4);
+    header.version = LABELMAP_VERSION;
+    header.width = width;
+    header.height = height;
+    header.dim = DIM;
+    header.dtype = native_dtype();
+    header.label_size = palette_size <= 65536 ? 2 : 4;
+    header.palette_size = (uint32_t)palette_size;
+    header.header_size = DATASET_HEADER_SIZE;
+    header.palette_offset = DATASET_HEADER_SIZE;
+    header.labels_offset = DATASET_HEADER_SIZE + palette_size * sizeof(Point);
+
+    // Header, palette and labels in one buffer, written at once
+    size_t file_size = header.labels_offset + n * header.label_size;
+    unsigned char *buffer = (unsigned char *)malloc(file_size);
+    if (!buffer) {
+        fprintf(stderr, "Error: Memory allocation failed in write_label_map\n");
+        free(ids);
+        free(palette);
+        return -1;
+    }
+    memcpy(buffer, &header, sizeof(header));
+    memcpy(buffer + header.palette_offset, palette, palette_size * sizeof(Point));
+    if (header.label_size == 2) {
+        uint16_t *labels = (uint16_t *)(buffer + header.labels_offset);
+        #pragma omp parallel for schedule(static)
+        for (size_t i = 0; i < n; i++) {
+            labels[i] = (uint16_t)ids[index ? (size_t)index[i] : i];
+        }
+    } else {
+        uint32_t *labels = (uint32_t *)(buffer + header.labels_offset);
+        #pragma omp parallel for schedule(static)
+        for (size_t i = 0; i < n; i++) {
+            labels[i] = ids[index ? (size_t)index[i] : i];
+        }
+    }
+    free(ids);
+    free(palette);
+
+    FILE *f = fopen(path, "wb");
+    if (!f) {
+        fprintf(stderr, "Error opening %s\n", path);
+        free(buffer);
+        return -1;
+    }
+    int ok = fwrite(buffer, 1, file_size, f) == file_size;
+    if (fclose(f) != 0) ok = 0;
+    free(buffer);
+    if (!ok) {
+        fprintf(stderr, "Error writing %s\n", path);
+        return -1;
+    }
+    return (int)palette_size;
+}
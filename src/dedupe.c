@@ -0,0 +1,82 @@
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <stdint.h>
+#include "include/utils.h"
+#include "include/point.h"
+#include "include/dedupe.h"
+
+int dedupe_enabled = 0;
+
+// FNV-1a over the bytes of the coordinates
+static uint64_t hash_point(const Point *p)
+{
+    const unsigned char *bytes = (const unsigned char *)p->coords;
+    uint64_t hash = 1469598103934665603ULL;
+    for (size_t k = 0; k < sizeof(p->coords); k++) {
+        hash ^= bytes[k];
+        hash *= 1099511628211ULL;
+    }
+    return hash;
+}
+
+int dedupe_dataset(const Point dataset[], unsigned int dataset_size, UniqueColors *unique)
+{
+    memset(unique, 0, sizeof(*unique));
+
+    // Open addressing, at most half full
+    size_t capacity = 16;
+    while (capacity < (size_t)dataset_size * 2) capacity <<= 1;
+    unsigned int *slots = (unsigned int *)calloc(capacity, sizeof(unsigned int)); // unique index + 1, 0 = empty
+
+    unique->points = (Point *)malloc(dataset_size * sizeof(Point));
+    unique->counts = (T *)malloc(dataset_size * sizeof(T));
+    unique->inverse = (unsigned int *)malloc(dataset_size * sizeof(unsigned int));
+    if (!slots || !unique->points || !unique->counts || !unique->inverse) {
+        fprintf(stderr, "Error: Memory allocation failed in dedupe_dataset\n");
+        free(slots);
+        free_unique_colors(unique);
+        return -1;
+    }
+
+    for (unsigned int i = 0; i < dataset_size; i++) {
+        size_t slot = hash_point(&dataset[i]) & (capacity - 1);
+        for (;;) {
+            unsigned int entry = slots[slot];
+            if (entry == 0) {
+                // first time this colour is seen
+                entry = ++unique->size;
+                slots[slot] = entry;
+                copy_point(&dataset[i], &unique->points[entry - 1]);
+            } else if (memcmp(unique->points[entry - 1].coords, dataset[i].coords, sizeof(dataset[i].coords)) != 0) {
+                slot = (slot + 1) & (capacity - 1);
+                continue;
+            }
+            unique->inverse[i] = entry - 1;
+            break;
+        }
+    }
+
+    // Count in integers (a float stops incrementing at 2^24), reusing the slots as counters
+    memset(slots, 0, unique->size * sizeof(unsigned int));
+    for (unsigned int i = 0; i < dataset_size; i++) {
+        slots[unique->inverse[i]]++;
+    }
+    for (unsigned int u = 0; u < unique->size; u++) {
+        unique->counts[u] = (T)slots[u];
+    }
+
+    free(slots);
+    return 0;
+}
+
+void free_unique_colors(UniqueColors *unique)
+{
+    free(unique->points);
+    free(unique->counts);
+    free(unique->inverse);
+    unique->points = NULL;
+    unique->counts = NULL;
+    unique->inverse = NULL;
+    unique->size = 0;
+}
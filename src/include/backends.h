@@ -0,0 +1,46 @@
+#ifndef __BACKENDS_H__
+#define __BACKENDS_H__
+
+#include "point.h"
+#include "utils.h"
+
+// Points of the input timed by --backend auto (evenly spaced over the dataset)
+#define AUTOTUNE_SAMPLE_SIZE 2048
+
+// Decisions of --backend auto, one line per machine/problem key (relative to the project root)
+#define BACKEND_CACHE_PATH "./data/backend_cache.txt"
+
+// Set from the command line (--backend-cache)
+extern const char *backend_cache_path;
+
+#ifdef __cplusplus
+extern "C" {
+#endif
+
+// Selects the backend run by mean_shift() and mean_shift_weighted(): one of the backends linked
+// in this executable ("basic", "matrix", "matrix_blas", "acc") or "auto", which calibrates them on
+// a sample of the first dataset (or reads the cached decision) before running.
+// Returns 0 on success, -1 (after listing the available backends) if [name] is not available.
+int select_backend(const char *name);
+
+// Name of the selected backend ("auto" until the calibration has run)
+const char *selected_backend_name(void);
+
+// Comma-separated names of the backends linked in this build, "auto" last
+const char *available_backends(void);
+
+// Same as mean_shift_weighted() with the backend [name] (one of available_backends()) instead
+// of the selected one. The selection is left untouched, so several threads can run it at once;
+// "auto" calibrates without printing or touching stdout (one calibration at a time).
+// Returns 0 on success, -1 if [name] is not available.
+int mean_shift_weighted_backend(const char *name, unsigned int dataset_size, const Point dataset[],
+                                unsigned int support_size, const Point support[], const T support_weights[],
+                                Point shifted_dataset[], T bandwidth,
+                                T (*kernel_func)(T, T), Point cluster_modes[],
+                                unsigned int *cluster_count);
+
+#ifdef __cplusplus
+}
+#endif
+
+#endif // __BACKENDS_H__
@@ -0,0 +1,53 @@
+#ifndef __BASIN_H__
+#define __BASIN_H__
+
+#include "point.h"
+#include "utils.h"
+#include "spatial_index.h"
+#include "soa.h"
+
+// Positions of a trajectory kept for path labelling (later positions are not recorded)
+#define BASIN_MAX_PATH 256
+
+// Set from the command line (--basin-radius, --basin-path-radius, --basin-verify).
+// basin_radius == 0 disables the basin-of-attraction mode.
+extern T basin_radius;              // a trajectory within this distance of a known mode adopts it
+extern T basin_path_radius;         // points this close to a trajectory get its mode, 0 = off
+extern unsigned int basin_verify_samples; // points re-run exactly to measure the accuracy, 0 = off
+
+// Modes found so far, shared by all the threads. Modes are only appended (inside a
+// critical section) and never moved, so readers scan modes[0 .. count) without locking.
+typedef struct {
+    Point *modes;
+    unsigned int count;
+    unsigned int capacity;
+    int *labels;                // mode of each dataset point, -1 while unknown
+} BasinTable;
+
+#ifdef __cplusplus
+extern "C" {
+#endif
+
+// Mean shift with basin-of-attraction early termination: a trajectory stops as soon as it
+// comes within basin_radius of a mode already in the table and adopts that mode.
+// Points are shifted over the weighted [support] (see mean_shift_weighted), through
+// [shift_index] when not NULL (finite-support kernels), on [shift_soa] (the SoA copy of the
+// support, with the hot path of [soa_kernel]) when not NULL, with shift_single_point otherwise.
+// Prints the modes found and how many points exited early.
+// Returns the number of shifts performed, or 0 on allocation failure.
+unsigned long long mean_shift_basins(unsigned int dataset_size, const Point dataset[],
+                                     unsigned int support_size, const Point support[], const T support_weights[],
+                                     Point shifted_dataset[], T bandwidth,
+                                     T (*kernel_func)(T, T), const SpatialIndex *shift_index,
+                                     const PointsSoA *shift_soa, SoaKernel soa_kernel);
+
+// Re-runs shift_point_until_convergence on basin_verify_samples evenly spaced points and
+// prints how far the basin results are from the exact modes
+void report_basin_accuracy(unsigned int dataset_size, const Point dataset[],
+                           const Point shifted_dataset[], T bandwidth, T (*kernel_func)(T, T));
+
+#ifdef __cplusplus
+}
+#endif
+
+#endif // __BASIN_H__
@@ -0,0 +1,31 @@
+#ifndef __CLUSTERING_H__
+#define __CLUSTERING_H__
+
+#include "point.h"
+#include "utils.h"
+
+// Points assigned per round of the parallel clustering: the points of a block are
+// checked against the existing modes in parallel, the few left uncovered in order
+#define CLUSTERING_BLOCK_SIZE 4096
+
+#ifdef __cplusplus
+extern "C" {
+#endif
+
+// Leader rule: [shifted_point] takes the first mode within CLUSTER_EPSILON,
+// or becomes a new mode if there is none
+void assign_clusters(Point *shifted_point, Point cluster_modes[],
+                     unsigned int *cluster_count);
+
+// Same result as calling assign_clusters on every point in order, with the modes kept in a
+// spatial hash (cells CLUSTER_EPSILON wide) and most of the queries run in parallel.
+// [cluster_modes] must have room for [dataset_size] modes: there is no other limit.
+// Returns 0 on success, -1 on allocation failure.
+int assign_clusters_parallel(unsigned int dataset_size, Point shifted_dataset[],
+                             Point cluster_modes[], unsigned int *cluster_count);
+
+#ifdef __cplusplus
+}
+#endif
+
+#endif // __CLUSTERING_H__
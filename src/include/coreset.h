@@ -0,0 +1,72 @@
+#ifndef __CORESET_H__
+#define __CORESET_H__
+
+#include "point.h"
+#include "utils.h"
+
+// Support of the approximate mean shift (--coreset)
+#define CORESET_NONE 0
+#define CORESET_SAMPLE 1    // random sample of the points, each weighing dataset_size / sample_size
+#define CORESET_GRID 2      // centroids of the occupied cells of a LAB grid, weighing their point count
+
+// --coreset sample without --coreset-size: one point in CORESET_SAMPLE_RATIO
+#define CORESET_SAMPLE_RATIO 10
+// --coreset grid without --coreset-tolerance: cells of a quarter of the bandwidth
+#define CORESET_DEFAULT_TOLERANCE 0.25
+
+// Set from the command line (--coreset, --coreset-size, --coreset-tolerance, --coreset-seed, --coreset-verify)
+extern int coreset_method;
+extern unsigned int coreset_size;       // target support size, 0 = default of the method
+extern T coreset_tolerance;             // grid cell side, as a fraction of the bandwidth
+extern unsigned long long coreset_seed; // seed of the sample
+extern int coreset_verify;              // run the exact mean shift too and compare
+
+// Weighted support standing in for the dataset in the density estimate
+typedef struct {
+    Point *points;
+    T *weights;
+    unsigned int size;
+    T cell;                 // grid cell side, 0 for a sample
+} Coreset;
+
+#ifdef __cplusplus
+extern "C" {
+#endif
+
+// "none", "sample" or "grid"
+const char *coreset_method_name(int method);
+
+// Builds the support of coreset_method for [dataset]:
+//  - sample: coreset_size points (dataset_size / CORESET_SAMPLE_RATIO by default) drawn without replacement
+//  - grid: one point per occupied cell of side coreset_tolerance * bandwidth, at the centroid of its
+//    points. With coreset_size the cells are enlarged until there are at most that many.
+// Every weight keeps the mass of the points it stands for, so the support sums to dataset_size.
+// Returns 0 on success, -1 on allocation failure.
+int build_coreset(const Point dataset[], unsigned int dataset_size, T bandwidth, Coreset *coreset);
+
+void free_coreset(Coreset *coreset);
+
+// With a sparse support (--coreset) and a finite-support kernel a point can have an empty window:
+// it stays where it is, silently in the shift loops, and every variant whose support is not the
+// dataset itself reports how many points that happened to once, before the cluster assignment.
+
+// Points of [shifted] (converged) to which no point of [support] gives a weight
+unsigned int count_empty_windows(unsigned int size, const Point shifted[],
+                                 unsigned int support_size, const Point support[],
+                                 T bandwidth, T (*kernel_func)(T, T));
+
+// Prints and records (coreset_empty_windows) [empty] out of [size] points
+void report_empty_windows(unsigned int empty, unsigned int size);
+
+// Compares the approximate run (shifted over the coreset) with the exact one and prints the
+// speed-up, the label agreement (clusters matched by majority both ways), how many exact modes
+// have an approximate mode within CLUSTER_EPSILON and the mean point displacement.
+// Returns 0 on success, -1 on allocation failure.
+int report_coreset_accuracy(unsigned int size, const Point exact[], const Point approximate[],
+                            double exact_seconds, double approximate_seconds);
+
+#ifdef __cplusplus
+}
+#endif
+
+#endif // __CORESET_H__
@@ -0,0 +1,121 @@
+#ifndef __DATASET_IO_H__
+#define __DATASET_IO_H__
+
+#include <stddef.h>
+#include <stdint.h>
+#include "utils.h"
+
+// Binary dataset container (.bin):
+//   [64 bytes header][width*height*dim values of dtype][optional width*height int32 labels]
+// All fields are little-endian. Values are stored row-major, one pixel after the other,
+// so a float32 payload with dim == DIM has exactly the memory layout of a Point array.
+#define DATASET_MAGIC "MSDS"
+#define DATASET_VERSION 1
+#define DATASET_HEADER_SIZE 64
+
+#define DATASET_DTYPE_FLOAT32 1
+#define DATASET_DTYPE_FLOAT64 2
+
+#define DATASET_HAS_LABELS 0x1
+
+#define DATASET_EXTENSION ".bin"
+
+// Label map container (.lbl), for the segmentation outputs:
+//   [64 bytes header][palette_size*dim values of dtype][width*height labels of label_size bytes]
+// Every pixel stores the index of its colour in the palette (uint16 when the palette has at
+// most 65536 colours, uint32 otherwise).
+#define LABELMAP_MAGIC "MSLM"
+#define LABELMAP_VERSION 1
+#define LABELMAP_EXTENSION ".lbl"
+
+typedef struct {
+    char magic[4];          // "MSDS"
+    uint32_t version;       // DATASET_VERSION
+    uint32_t width;
+    uint32_t height;
+    uint32_t dim;           // coordinates per point (3 for LAB)
+    uint32_t dtype;         // DATASET_DTYPE_*
+    uint32_t flags;         // DATASET_HAS_LABELS
+    uint32_t header_size;   // DATASET_HEADER_SIZE
+    uint64_t data_offset;   // byte offset of the point values
+    uint64_t labels_offset; // byte offset of the int32 label plane, 0 if absent
+    uint8_t reserved[16];
+} DatasetHeader;
+
+typedef struct {
+    char magic[4];          // "MSLM"
+    uint32_t version;       // LABELMAP_VERSION
+    uint32_t width;
+    uint32_t height;
+    uint32_t dim;           // coordinates per palette colour
+    uint32_t dtype;         // DATASET_DTYPE_* of the palette
+    uint32_t label_size;    // bytes per label: 2 or 4
+    uint32_t palette_size;  // colours in the palette
+    uint32_t flags;         // none defined yet, 0
+    uint32_t header_size;   // DATASET_HEADER_SIZE
+    uint64_t palette_offset;
+    uint64_t labels_offset;
+    uint8_t reserved[8];
+} LabelMapHeader;
+
+typedef struct {
+    Point *points;          // width*height points (inside the mapping when zero-copy)
+    int *labels;            // optional label plane, NULL if absent
+    unsigned int width;
+    unsigned int height;
+    void *mapping;          // base address of the mapped file, NULL if not mapped
+    size_t mapping_size;
+    int owns_points;        // points were allocated (CSV input or dtype != T)
+    size_t source_size;     // size in bytes of the input file
+    unsigned int rows;      // number of points actually read from the file
+} Dataset;
+
+#ifdef __cplusplus
+extern "C" {
+#endif
+
+// Returns 1 if the file at [path] starts with the binary dataset magic
+int is_binary_dataset(const char *path);
+
+// Returns 1 if [path] has the binary dataset extension (used to pick the output format)
+int has_binary_extension(const char *path);
+
+// Returns 1 if [path] has the label map extension
+int has_label_map_extension(const char *path);
+
+// Maps a binary dataset in memory. When the stored dtype matches T the points
+// are used in place (zero-copy), otherwise they are converted into a new buffer.
+// Returns 0 on success, -1 on error.
+int map_binary_dataset(const char *path, Dataset *ds);
+
+// Loads a text CSV dataset ("width,height" / "W,H" / "L,A,B" header, then one row per pixel).
+// The file is memory-mapped, split into byte ranges on line boundaries and parsed in parallel
+// straight into a newly allocated points buffer. Returns 0 on success, -1 on error.
+int load_csv_dataset(const char *path, Dataset *ds);
+
+// Unmaps / frees whatever map_binary_dataset acquired
+void release_dataset(Dataset *ds);
+
+// Writes [points] (and [labels], if not NULL) as a binary dataset with a single bulk write.
+// Returns 0 on success, -1 on error.
+int write_binary_dataset(const char *path, unsigned int width, unsigned int height,
+                         const Point points[], const int labels[]);
+
+// Writes a width*height image where pixel i has the colour points[index[i]] (points[i] if [index]
+// is NULL) as a label map: the distinct colours of the [point_count] [points] form the palette
+// (in order of first appearance) and every pixel stores its palette index. Header, palette and
+// labels go out in a single write. Returns the palette size, or -1 on error.
+int write_label_map(const char *path, unsigned int width, unsigned int height,
+                    unsigned int point_count, const Point points[], const int index[]);
+
+// Palette index of every point: the same coordinates (bit for bit) get the same index, new
+// colours are appended to [palette] (room for [point_count] colours). The shifted points are
+// copies of their mode, so the palette is the list of modes, in the order of the clustering.
+// Returns the palette size, or -1 on allocation failure.
+long build_palette(unsigned int point_count, const Point points[], uint32_t ids[], Point palette[]);
+
+#ifdef __cplusplus
+}
+#endif
+
+#endif // __DATASET_IO_H__
@@ -0,0 +1,34 @@
+#ifndef __DEDUPE_H__
+#define __DEDUPE_H__
+
+#include "point.h"
+#include "utils.h"
+
+// Set from the command line (--dedupe on): shift only the unique colours
+extern int dedupe_enabled;
+
+// Unique colours of a dataset. The density seen by shift_single_point only depends on
+// the multiset of colours, so a mean shift of [points] weighted by [counts] is exact.
+typedef struct {
+    Point *points;          // unique colours, in order of first appearance
+    T *counts;              // multiplicity of each unique colour
+    unsigned int *inverse;  // index in [points] of each dataset point
+    unsigned int size;      // number of unique colours
+} UniqueColors;
+
+#ifdef __cplusplus
+extern "C" {
+#endif
+
+// Collapses identical points of [dataset] (bitwise equal coordinates) with a hash table.
+// Keeping the order of first appearance makes the leader clustering of the unique colours
+// identical to the one of the full dataset. Returns 0 on success, -1 on allocation failure.
+int dedupe_dataset(const Point dataset[], unsigned int dataset_size, UniqueColors *unique);
+
+void free_unique_colors(UniqueColors *unique);
+
+#ifdef __cplusplus
+}
+#endif
+
+#endif // __DEDUPE_H__
@@ -3,16 +3,12 @@
 
 #include "point.h"
 #include "utils.h"
+#include "clustering.h"
 #include <stdio.h>
 #include <stdlib.h>
 
 #ifdef TIMING_BREAKDOWN
     #include "../metrics/timing.h"
-    TIMER_SUM_DEF(kernel)
-    TIMER_SUM_DEF(distance_shift)
-    TIMER_SUM_DEF(coords_update)
-    TIMER_SUM_DEF(distance_kernel)
-    TIMER_SUM_DEF(distance_cluster)
 #endif
 
 #ifndef BANDWIDTH
@@ -27,8 +23,6 @@
 #define CLUSTER_EPSILON (BANDWIDTH * 1.2)
 #endif
 
-#define MAX_CLUSTERS 1000 // maximum number of clusters
-
 #ifdef __cplusplus
 extern "C" {
 #endif
@@ -38,42 +32,76 @@ extern "C" {
 #pragma acc routine seq
 void shift_single_point_acc(const Point *point, Point *next_point,
                               const Point dataset[], unsigned int dataset_size,
-                              T bandwidth);
+                              const T weights[], T bandwidth);
 
+// [weights] (NULL = all 1) multiplies the kernel of each dataset point
 void shift_single_point(const Point *point, Point *next_point,
                               const Point dataset[], unsigned int dataset_size,
-                              T bandwidth, T (*kernel_func)(T, T));
+                              const T weights[], T bandwidth, T (*kernel_func)(T, T));
 #pragma acc routine seq
 void shift_single_point_acc(const Point *point, Point *next_point, const Point dataset[], 
-                            unsigned int dataset_size, T bandwidth);
-
-// Assign clusters to shifted points
-void assign_clusters(Point *shifted_point, Point cluster_modes[],
-                           unsigned int *cluster_count);
+                            unsigned int dataset_size, const T weights[], T bandwidth);
 
-// Perform the mean shift clustering
+// Perform the mean shift clustering with the backend chosen by select_backend (backends.c).
+// [cluster_modes] must have room for [dataset_size] modes.
 void mean_shift(unsigned int dataset_size, const Point dataset[],
                       Point shifted_dataset[], T bandwidth,
                       T (*kernel_func)(T, T), Point cluster_modes[],
                       unsigned int *cluster_count);
 
+// Mean shift of [dataset] over a weighted support: every point is shifted towards the density
+// of [support], where support[j] counts as support_weights[j] points (NULL = all 1).
+// mean_shift() is the case support == dataset without weights.
+void mean_shift_weighted(unsigned int dataset_size, const Point dataset[],
+                      unsigned int support_size, const Point support[], const T support_weights[],
+                      Point shifted_dataset[], T bandwidth,
+                      T (*kernel_func)(T, T), Point cluster_modes[],
+                      unsigned int *cluster_count);
+
 #pragma acc routine seq
 unsigned int shift_point_until_convergence_acc(const Point *input_point, Point *output_point,
                       const Point dataset[], unsigned int dataset_size,
-                      T bandwidth);
+                      const T weights[], T bandwidth);
 
 unsigned int shift_point_until_convergence(const Point *input_point, Point *output_point,
                       const Point dataset[], unsigned int dataset_size,
-                      T bandwidth, T (*kernel_func)(T, T));
+                      const T weights[], T bandwidth, T (*kernel_func)(T, T));
 #pragma acc routine seq
 unsigned int shift_point_until_convergence_acc(const Point *input_point, Point *output_point,
-                      const Point dataset[], unsigned int dataset_size, T bandwidth);
+                      const Point dataset[], unsigned int dataset_size, const T weights[], T bandwidth);
 
 
+// Backends behind mean_shift_weighted (same arguments), each linked only in the targets built
+// with its define. backends.c dispatches to the one selected with --backend.
+#ifdef BACKEND_BASIC
+void mean_shift_basic(unsigned int dataset_size, const Point dataset[],
+                      unsigned int support_size, const Point support[], const T support_weights[],
+                      Point shifted_dataset[], T bandwidth,
+                      T (*kernel_func)(T, T), Point cluster_modes[],
+                      unsigned int *cluster_count);
+#endif
+#ifdef BACKEND_MATRIX
 void mean_shift_matrix(unsigned int dataset_size, const Point dataset[],
+                       unsigned int support_size, const Point support[], const T support_weights[],
+                       Point shifted_dataset[], T bandwidth,
+                       T (*kernel_func)(T, T), Point cluster_modes[],
+                       unsigned int *cluster_count);
+#endif
+#ifdef BACKEND_MATRIX_BLAS
+// kernel_func is one of the *_kernel_sqrd functions
+void mean_shift_matrix_blas(unsigned int dataset_size, const Point dataset[],
+                            unsigned int support_size, const Point support[], const T support_weights[],
+                            Point shifted_dataset[], T bandwidth,
+                            T (*kernel_func)(T, T), Point cluster_modes[],
+                            unsigned int *cluster_count);
+#endif
+#ifdef BACKEND_ACC
+void mean_shift_acc(unsigned int dataset_size, const Point dataset[],
+                    unsigned int support_size, const Point support[], const T support_weights[],
                     Point shifted_dataset[], T bandwidth,
                     T (*kernel_func)(T, T), Point cluster_modes[],
                     unsigned int *cluster_count);
+#endif
 
 
 #ifdef __cplusplus
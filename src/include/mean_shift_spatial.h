@@ -0,0 +1,40 @@
+#ifndef __MEAN_SHIFT_SPATIAL_H__
+#define __MEAN_SHIFT_SPATIAL_H__
+
+#include "point.h"
+#include "utils.h"
+
+// Joint spatial-range mean shift: every pixel is the 5D feature (x, y, L, A, B) and the kernel is
+// the product of a spatial kernel (bandwidth hs, in pixels) and a range kernel (bandwidth hr,
+// in colour units). Only the pixels in the window around the current spatial position can
+// weigh, so an iteration scans O(window^2) pixels of the image instead of all of them.
+
+// Safety cap on the iterations of a trajectory
+#define SPATIAL_MAX_ITER 100
+
+// Window radius of the gaussian kernel, in spatial bandwidths (the kernel is truncated there);
+// the uniform and epanechnikov kernels are 0 beyond one bandwidth
+#define SPATIAL_GAUSSIAN_WINDOW 3
+
+// Set from the command line (--spatial-bandwidth hs, --range-bandwidth hr).
+// spatial_bandwidth == 0 disables the spatial-range mode; range_bandwidth == 0 takes --bandwidth.
+extern T spatial_bandwidth;
+extern T range_bandwidth;
+
+#ifdef __cplusplus
+extern "C" {
+#endif
+
+// Shifts every pixel of the width x height image [dataset] to its 5D mode: [shifted_dataset]
+// gets the colour of the mode, clustered as in the other variants (assign_clusters_parallel).
+// [kernel_func] is one of gaussian_kernel, uniform_kernel or epanechnikov_kernel.
+// Returns 0 on success, -1 on error.
+int mean_shift_spatial(unsigned int width, unsigned int height, const Point dataset[],
+                       Point shifted_dataset[], T spatial_bw, T range_bw,
+                       T (*kernel_func)(T, T), Point cluster_modes[], unsigned int *cluster_count);
+
+#ifdef __cplusplus
+}
+#endif
+
+#endif // __MEAN_SHIFT_SPATIAL_H__
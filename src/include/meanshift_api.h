@@ -0,0 +1,65 @@
+#ifndef __MEANSHIFT_API_H__
+#define __MEANSHIFT_API_H__
+
+#include <stdint.h>
+
+// Stable C API of the shared library (libmeanshift), used by the Python package in python/.
+// Only the ms_* functions are exported: the buffers are plain float / int32 arrays, owned by
+// the caller, with the memory layout of NumPy C-contiguous arrays (point i = values[i * dim ..]).
+// Every call is independent (no global selection), so several threads can segment at once.
+
+// Incremented on incompatible changes of the functions below
+#define MS_API_VERSION 1
+
+#if defined(_WIN32) && defined(MEANSHIFT_BUILD_LIBRARY)
+#define MS_API __declspec(dllexport)
+#elif defined(MEANSHIFT_BUILD_LIBRARY)
+#define MS_API __attribute__((visibility("default")))
+#else
+#define MS_API
+#endif
+
+// Status codes of ms_segment
+#define MS_OK 0
+#define MS_ERROR_ARGUMENT 1     // null buffer, empty image, bandwidth <= 0, width * height != count
+#define MS_ERROR_KERNEL 2       // kernel not in gaussian, uniform, epanechnikov
+#define MS_ERROR_BACKEND 3      // backend not linked in the library (see ms_backends)
+#define MS_ERROR_MEMORY 4
+
+#ifdef __cplusplus
+extern "C" {
+#endif
+
+MS_API int ms_api_version(void);
+
+// Coordinates per point (3 for LAB): the point buffers are count x ms_point_dim() floats
+MS_API int ms_point_dim(void);
+
+// Comma-separated backends of the library, "auto" last
+MS_API const char *ms_backends(void);
+
+// Message of a status code
+MS_API const char *ms_status_message(int status);
+
+// Mean shift segmentation of the [count] points of [points] (count x dim floats).
+// [kernel] and [backend] are names as on the command line (NULL = the defaults of the build).
+// "auto" times the backends on a sample the first time a problem size is seen (calls with "auto"
+// wait for each other meanwhile) and caches the choice; the calibration prints nothing.
+// [threads] > 0 sets the OpenMP threads of this call only, 0 keeps the current setting.
+// [superpixels] > 0 first runs SLIC with that many superpixels and [compactness] on the
+// width x height image (count == width * height), and shifts the superpixels instead of the pixels.
+// Outputs, all allocated by the caller:
+//   [shifted]     count x dim floats, the mode of every point
+//   [labels]      count int32, index of the mode of every point in [modes]
+//   [modes]       room for count x dim floats, the first *[mode_count] are the modes
+// Returns MS_OK or one of the MS_ERROR_* codes.
+MS_API int ms_segment(const float *points, unsigned int count, unsigned int width, unsigned int height,
+                      double bandwidth, const char *kernel, const char *backend, int threads,
+                      unsigned int superpixels, double compactness,
+                      float *shifted, int32_t *labels, float *modes, unsigned int *mode_count);
+
+#ifdef __cplusplus
+}
+#endif
+
+#endif // __MEANSHIFT_API_H__
@@ -0,0 +1,57 @@
+#ifndef __SOA_H__
+#define __SOA_H__
+
+#include "point.h"
+#include "utils.h"
+
+// Alignment of every coordinate array (one cache line, the widest AVX-512 load)
+#define SOA_ALIGNMENT 64
+
+// Structure-of-arrays copy of a Point array: one contiguous, SOA_ALIGNMENT-aligned array per
+// coordinate (L, A, B for LAB), so the hot loop loads DIM unit-stride vectors per SIMD step.
+typedef struct {
+    T *coords[DIM];             // coords[d][i] = points[i].coords[d]
+    T *weights;                 // weight of every point, NULL if unweighted
+    unsigned int size;
+    void *block;                // single allocation behind the arrays
+} PointsSoA;
+
+// Kernels with a specialized (inlined, squared-distance) hot path
+typedef enum {
+    SOA_KERNEL_GAUSSIAN,
+    SOA_KERNEL_UNIFORM,
+    SOA_KERNEL_EPANECHNIKOV,
+    SOA_KERNEL_NONE             // custom kernel: use the Point path
+} SoaKernel;
+
+// Set from the command line (--soa on|off): shift on the SoA copy of the support in the
+// OpenMP variant whenever the kernel has a specialized path
+extern int soa_enabled;
+
+#ifdef __cplusplus
+extern "C" {
+#endif
+
+// Specialized hot path of [kernel_func] (one of the *_kernel functions), SOA_KERNEL_NONE if none
+SoaKernel soa_kernel_of(T (*kernel_func)(T, T));
+
+// Converts [points] (and [weights], may be NULL) to the SoA layout.
+// Returns 0 on success, -1 on allocation failure.
+int points_to_soa(const Point points[], const T weights[], unsigned int size, PointsSoA *soa);
+
+void free_soa(PointsSoA *soa);
+
+// Same as shift_single_point on the SoA support, with squared distances and the kernel inlined:
+// the neighbours are processed several at a time, one per SIMD lane.
+void shift_single_point_soa(const Point *point, Point *next_point, const PointsSoA *support,
+                            T bandwidth, SoaKernel kernel);
+
+// Same as shift_point_until_convergence, with shift_single_point_soa
+unsigned int shift_point_until_convergence_soa(const Point *input_point, Point *output_point,
+                                               const PointsSoA *support, T bandwidth, SoaKernel kernel);
+
+#ifdef __cplusplus
+}
+#endif
+
+#endif // __SOA_H__
@@ -0,0 +1,61 @@
+#ifndef __SPATIAL_INDEX_H__
+#define __SPATIAL_INDEX_H__
+
+#include "point.h"
+#include "utils.h"
+
+// Upper bound on the number of grid cells: with very small bandwidths the cell size
+// is enlarged so that the grid stays proportional to the dataset
+#define SPATIAL_INDEX_MAX_CELLS_PER_POINT 4
+#define SPATIAL_INDEX_MIN_CELLS (1 << 16)
+
+// Uniform grid over the feature space, with cells at least [bandwidth] wide, so that
+// every point within [bandwidth] of a query lies in the 3^DIM cells around it.
+// Points are stored sorted by cell (row-major, last dimension fastest), so each
+// row of 3 neighbouring cells is one contiguous range.
+typedef struct {
+    T cell_size;
+    T origin[DIM];              // lower corner of the grid
+    int dims[DIM];              // cells per dimension
+    unsigned int num_cells;
+    unsigned int *cell_start;   // [num_cells + 1] offsets into points
+    Point *points;              // dataset sorted by cell
+    unsigned int *ids;          // dataset index of each entry of points
+    T *weights;                 // weight of each entry of points, NULL if unweighted
+    unsigned int size;
+} SpatialIndex;
+
+// Set from the command line (--index grid): use the grid in the OpenMP variant
+// whenever the kernel has finite support
+extern int spatial_index_enabled;
+
+#ifdef __cplusplus
+extern "C" {
+#endif
+
+// Returns 1 if the kernel is 0 beyond the bandwidth (uniform, epanechnikov)
+int is_finite_support_kernel(T (*kernel_func)(T, T));
+
+// Builds the grid in parallel. [weights] (may be NULL) are stored along with the points.
+// Returns 0 on success, -1 on allocation failure.
+int build_spatial_index(SpatialIndex *index, const Point dataset[], unsigned int dataset_size,
+                        const T weights[], T bandwidth);
+
+void free_spatial_index(SpatialIndex *index);
+
+// Same as shift_single_point, but only visits the cells around [point].
+// Returns the number of candidate points visited.
+unsigned int shift_single_point_indexed(const Point *point, Point *next_point,
+                                        const SpatialIndex *index,
+                                        T bandwidth, T (*kernel_func)(T, T));
+
+// Calls [visit] with the dataset index of every point within [radius] of [point].
+// [radius] must not exceed the cell size. Returns the number of points visited.
+unsigned int spatial_index_radius_query(const SpatialIndex *index, const Point *point, T radius,
+                                        void (*visit)(unsigned int id, void *user), void *user);
+
+#ifdef __cplusplus
+}
+#endif
+
+#endif // __SPATIAL_INDEX_H__
@@ -0,0 +1,49 @@
+#ifndef __TILING_H__
+#define __TILING_H__
+
+#include <stddef.h>
+#include "utils.h"
+
+// Fallbacks when the cache sizes can't be queried
+#define DEFAULT_L2_CACHE_SIZE (1024 * 1024)
+#define DEFAULT_L3_CACHE_SIZE (32 * 1024 * 1024)
+
+// Fraction of the available RAM used when no memory budget is given
+#define DEFAULT_MEMORY_FRACTION 0.5
+
+// Block sizes of the weight-matrix tiles used by the matrix variants
+typedef struct {
+    unsigned int rows;  // points shifted together (rows of the weight matrix)
+    unsigned int cols;  // dataset points visited together (columns of the weight matrix)
+} TileSize;
+
+// Set from the command line (--tile-rows, --tile-cols, --mem-budget), 0 = automatic
+extern unsigned int matrix_tile_rows;
+extern unsigned int matrix_tile_cols;
+extern double matrix_memory_budget_mb;
+
+#ifdef __cplusplus
+extern "C" {
+#endif
+
+// Size in bytes of the given cache level (2 or 3), or a default if unknown
+size_t cache_size_bytes(int level);
+
+// Available physical memory in bytes, 0 if unknown
+size_t available_memory_bytes(void);
+
+// Memory budget in bytes for the tiles (--mem-budget or a fraction of the available RAM)
+size_t memory_budget_bytes(void);
+
+// Tile for the OpenMP matrix variant: every thread owns a rows x cols tile sized to stay in L2
+TileSize choose_tile_size_per_thread(unsigned int dataset_size, int num_threads);
+
+// Tile for the OpenBLAS variant: one shared tile, as wide as the dataset if the budget allows,
+// with enough rows to fill the L3 cache
+TileSize choose_tile_size_shared(unsigned int dataset_size);
+
+#ifdef __cplusplus
+}
+#endif
+
+#endif // __TILING_H__
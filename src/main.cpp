@@ -7,9 +7,21 @@
 #include "include/point.h"
 #include "include/mean_shift.h"
 #include "include/utils.h"
-
-#ifdef PREPROCESSING
+#include "include/dataset_io.h"
+#include "include/spatial_index.h"
+#include "include/tiling.h"
+#include "include/dedupe.h"
+#include "include/backends.h"
+#include "include/soa.h"
+#include "include/mean_shift_spatial.h"
+#include "include/coreset.h"
+#include "metrics/run_record.h"
+#include "metrics/perf_counters.h"
+#include <omp.h>
 #include "preprocessing/preprocessing.h"
+
+#ifdef BASINS
+#include "include/basin.h"
 #endif
 
 #ifdef TOTAL_TIMING
@@ -18,6 +30,147 @@
 
 using namespace std;
 
+// Writes the image where pixel i has the colour points[index[i]] (points[i] if [index] is NULL) to [path]:
+// as a label map (palette + one index per pixel) if the path ends in .lbl, as a binary dataset if it
+// ends in .bin, as CSV otherwise
+static int write_output(const char *path, unsigned int width, unsigned int height,
+                        unsigned int point_count, const Point points[], const int index[]) {
+    if (has_label_map_extension(path)) {
+        int palette_size = write_label_map(path, width, height, point_count, points, index);
+        if (palette_size < 0) return -1;
+        printf("label map: %d colours, %d-bit labels\n", palette_size, palette_size <= 65536 ? 16 : 32);
+        return 0;
+    }
+
+    Point* pixels = (Point*) points;
+    if (index) {
+        pixels = (Point*) malloc((size_t)width * height * sizeof(Point));
+        for (unsigned int i = 0; i < width * height; i++) {
+            copy_point(&points[index[i]], &pixels[i]);
+        }
+    }
+    int status = 0;
+    if (has_binary_extension(path)) {
+        status = write_binary_dataset(path, width, height, pixels, NULL);
+    } else {
+        FILE *fileout = fopen(path, "w");
+        if (!fileout) {
+            cerr << "Error opening " << path;
+            status = -1;
+        } else {
+            fprintf(fileout, "width,height,\n");
+            fprintf(fileout, "%d,%d,\n", width, height);
+            fprintf(fileout, "L,A,B\n");
+
+            for (unsigned int i = 0; i < width * height; i++) {
+                write_point_to_file(&pixels[i], fileout);
+            }
+            fclose(fileout);
+        }
+    }
+    if (index) free(pixels);
+    return status;
+}
+
+// Runs mean shift on [points]. With --dedupe only the unique colours are shifted, weighted by
+// their multiplicity, and every point then takes the mode of its colour. With --coreset the
+// density is estimated on a weighted coreset of [points] instead of on all of them.
+static void run_mean_shift(unsigned int size, const Point points[], Point shifted[], T bandwidth,
+                           T (*kernel_func)(T, T), Point cluster_modes[], unsigned int *cluster_count) {
+    Coreset coreset = {};
+    if (coreset_method != CORESET_NONE) {
+#ifdef TOTAL_TIMING
+        TOTAL_TIMER_START(coreset)
+#endif
+        if (build_coreset(points, size, bandwidth, &coreset) != 0) {
+            exit(-1);
+        }
+#ifdef TOTAL_TIMING
+        TOTAL_TIMER_STOP(coreset)
+#endif
+        printf("coreset (%s): %u support points out of %u (reduction %.2fx)",
+               coreset_method_name(coreset_method), coreset.size, size,
+               coreset.size > 0 ? (double)size / coreset.size : 1.0);
+        if (coreset_method == CORESET_GRID) {
+            printf(", cell %f (%.2f bandwidths)", coreset.cell, coreset.cell / bandwidth);
+        }
+        printf("\n");
+        record_stat("coreset_size", coreset.size);
+    }
+
+    if (!dedupe_enabled) {
+        if (coreset_method != CORESET_NONE) {
+            mean_shift_weighted(size, points, coreset.size, coreset.points, coreset.weights,
+                                shifted, bandwidth, kernel_func, cluster_modes, cluster_count);
+            free_coreset(&coreset);
+        } else {
+            mean_shift(size, points, shifted, bandwidth, kernel_func, cluster_modes, cluster_count);
+        }
+        return;
+    }
+
+    UniqueColors unique;
+#ifdef TOTAL_TIMING
+    TOTAL_TIMER_START(dedupe)
+#endif
+    if (dedupe_dataset(points, size, &unique) != 0) {
+        exit(-1);
+    }
+#ifdef TOTAL_TIMING
+    TOTAL_TIMER_STOP(dedupe)
+#endif
+    printf("dedupe: %u unique colours out of %u points (compression ratio %.2fx)\n",
+           unique.size, size, unique.size > 0 ? (double)size / unique.size : 1.0);
+    record_stat("unique_colours", unique.size);
+
+    // The coreset stands for all the points: only the shifted side is deduplicated
+    Point* shifted_unique = (Point*) malloc(unique.size * sizeof(Point));
+    if (coreset_method != CORESET_NONE) {
+        mean_shift_weighted(unique.size, unique.points, coreset.size, coreset.points, coreset.weights,
+                            shifted_unique, bandwidth, kernel_func, cluster_modes, cluster_count);
+        free_coreset(&coreset);
+    } else {
+        mean_shift_weighted(unique.size, unique.points, unique.size, unique.points, unique.counts,
+                            shifted_unique, bandwidth, kernel_func, cluster_modes, cluster_count);
+    }
+    for (unsigned int i = 0; i < size; i++) {
+        copy_point(&shifted_unique[unique.inverse[i]], &shifted[i]);
+    }
+    free(shifted_unique);
+    free_unique_colors(&unique);
+}
+
+// --coreset-verify on: runs the exact mean shift on the same points, outside of the run record
+// and of the counters, and compares it with the approximate run in [shifted]
+static void verify_coreset(unsigned int size, const Point points[], const Point shifted[], double approximate_seconds,
+                           T bandwidth, T (*kernel_func)(T, T)) {
+    Point* exact_shifted = (Point*) malloc(size * sizeof(Point));
+    Point* exact_modes = (Point*) malloc(size * sizeof(Point));
+    if (!exact_shifted || !exact_modes) {
+        cerr << "Error: Memory allocation failed for the exact run of --coreset-verify" << endl;
+        exit(-1);
+    }
+    unsigned int exact_count = 0;
+
+    std::cout << endl << "Exact run (--coreset-verify)" << endl;
+    int method = coreset_method;
+    coreset_method = CORESET_NONE;
+    pause_run_record(1);
+    pause_perf_counters(1);
+    double start = omp_get_wtime();
+    run_mean_shift(size, points, exact_shifted, bandwidth, kernel_func, exact_modes, &exact_count);
+    double exact_seconds = omp_get_wtime() - start;
+    pause_perf_counters(0);
+    pause_run_record(0);
+    coreset_method = method;
+
+    if (report_coreset_accuracy(size, exact_shifted, shifted, exact_seconds, approximate_seconds) != 0) {
+        exit(-1);
+    }
+    free(exact_shifted);
+    free(exact_modes);
+}
+
 int main(int argc, char *argv[]) {
 
     // Set the working directory to the project root
@@ -29,15 +182,19 @@ int main(int argc, char *argv[]) {
     const char *input_csv_path = CSV_IN;
     const char *output_csv_path = CSV_OUT;
 
+    // SLIC preprocessing is linked in every target, the slic_ms* targets enable it by default
     #ifdef PREPROCESSING
+    int slic_enabled = 1;
+    #else
+    int slic_enabled = 0;
+    #endif
     const char *output_slic_path = CSV_OUT_SLIC;
     unsigned int superpixels = 0;
     float m = 10.0;
-    #endif
 
     if (argc < 2) {
         std::cout << "No arguments provided. Using default values." << endl;
-        std::cout << "Usage: ./mean_shift [--input | -i input_csv] [--kernel | -k kernel_name] [--bandwidth | -b bandwidth]  [--output | -o output_csv]" << endl;
+        std::cout << "Usage: ./mean_shift [--input | -i input_csv] [--kernel | -k kernel_name] [--bandwidth | -b bandwidth]  [--output | -o output_csv|.bin|.lbl] [--output-slic path] [--backend basic|matrix|matrix_blas|acc|auto] [--slic on|off] [--slic-tolerance t] [--index none|grid] [--dedupe on|off] [--coreset none|sample|grid] [--coreset-size m] [--coreset-tolerance t] [--coreset-seed s] [--coreset-verify on|off] [--soa on|off] [--spatial-bandwidth hs] [--range-bandwidth hr] [--basin-radius r] [--metrics-out records.jsonl] [--perf-counters on|off]" << endl;
     }
 
     // Parse command-line arguments
@@ -80,33 +237,149 @@ int main(int argc, char *argv[]) {
     if (args.find("--output") != args.end()) {
         output_csv_path = args["--output"].c_str();
     }
-    #ifdef PREPROCESSING
+    if (args.find("--output-slic") != args.end()) {
+        output_slic_path = args["--output-slic"].c_str();
+    }
+    if (args.find("--tile-rows") != args.end()) {
+        matrix_tile_rows = stoi(args["--tile-rows"]);
+    }
+    if (args.find("--tile-cols") != args.end()) {
+        matrix_tile_cols = stoi(args["--tile-cols"]);
+    }
+    if (args.find("--mem-budget") != args.end()) {
+        matrix_memory_budget_mb = stof(args["--mem-budget"]);
+    }
+    if (args.find("--backend") != args.end()) {
+        if (select_backend(args["--backend"].c_str()) != 0) {
+            return 1;
+        }
+    }
+    if (args.find("--backend-cache") != args.end()) {
+        backend_cache_path = args["--backend-cache"].c_str();
+    }
+    if (args.find("--slic") != args.end()) {
+        if (args["--slic"] == "on") {
+            slic_enabled = 1;
+        } else if (args["--slic"] == "off") {
+            slic_enabled = 0;
+        } else {
+            cerr << "Invalid slic option. Available options: 'on', 'off'" << endl;
+            return 1;
+        }
+    }
+    if (args.find("--metrics-out") != args.end()) {
+        metrics_out_path = args["--metrics-out"].c_str();
+    }
+    if (args.find("--perf-counters") != args.end()) {
+        if (args["--perf-counters"] == "on") {
+            perf_counters_enabled = 1;
+        } else if (args["--perf-counters"] != "off") {
+            cerr << "Invalid perf-counters option. Available options: 'on', 'off'" << endl;
+            return 1;
+        }
+    }
+    if (args.find("--soa") != args.end()) {
+        if (args["--soa"] == "on") {
+            soa_enabled = 1;
+        } else if (args["--soa"] == "off") {
+            soa_enabled = 0;
+        } else {
+            cerr << "Invalid soa option. Available options: 'on', 'off'" << endl;
+            return 1;
+        }
+    }
+    if (args.find("--dedupe") != args.end()) {
+        if (args["--dedupe"] == "on") {
+            dedupe_enabled = 1;
+        } else if (args["--dedupe"] != "off") {
+            cerr << "Invalid dedupe option. Available options: 'on', 'off'" << endl;
+            return 1;
+        }
+    }
+    if (args.find("--coreset") != args.end()) {
+        if (args["--coreset"] == "sample") {
+            coreset_method = CORESET_SAMPLE;
+        } else if (args["--coreset"] == "grid") {
+            coreset_method = CORESET_GRID;
+        } else if (args["--coreset"] != "none") {
+            cerr << "Invalid coreset option. Available options: 'none', 'sample', 'grid'" << endl;
+            return 1;
+        }
+    }
+    if (args.find("--coreset-size") != args.end()) {
+        coreset_size = stoul(args["--coreset-size"]);
+    }
+    if (args.find("--coreset-tolerance") != args.end()) {
+        coreset_tolerance = stof(args["--coreset-tolerance"]);
+        if (coreset_tolerance <= 0) {
+            cerr << "The coreset tolerance must be positive" << endl;
+            return 1;
+        }
+    }
+    if (args.find("--coreset-seed") != args.end()) {
+        coreset_seed = stoull(args["--coreset-seed"]);
+    }
+    if (args.find("--coreset-verify") != args.end()) {
+        if (args["--coreset-verify"] == "on") {
+            coreset_verify = 1;
+        } else if (args["--coreset-verify"] != "off") {
+            cerr << "Invalid coreset-verify option. Available options: 'on', 'off'" << endl;
+            return 1;
+        }
+    }
+    if (args.find("--index") != args.end()) {
+        if (args["--index"] == "grid") {
+            spatial_index_enabled = 1;
+        } else if (args["--index"] != "none") {
+            cerr << "Invalid index. Available options: 'none', 'grid'" << endl;
+            return 1;
+        }
+    }
+    #ifdef BASINS
+    if (args.find("--basin-radius") != args.end()) {
+        basin_radius = stof(args["--basin-radius"]);
+    }
+    if (args.find("--basin-path-radius") != args.end()) {
+        basin_path_radius = stof(args["--basin-path-radius"]);
+    }
+    if (args.find("--basin-verify") != args.end()) {
+        basin_verify_samples = stoi(args["--basin-verify"]);
+    }
+    #endif
+    if (args.find("--spatial-bandwidth") != args.end()) {
+        spatial_bandwidth = stof(args["--spatial-bandwidth"]);
+    }
+    if (args.find("--range-bandwidth") != args.end()) {
+        range_bandwidth = stof(args["--range-bandwidth"]);
+    }
+    if (spatial_bandwidth > 0 && (slic_enabled || dedupe_enabled)) {
+        cerr << "The spatial-range mode (--spatial-bandwidth) works on the image pixels: use it with --slic off and --dedupe off" << endl;
+        return 1;
+    }
+    if (spatial_bandwidth > 0 && coreset_method != CORESET_NONE) {
+        cerr << "The spatial-range mode (--spatial-bandwidth) has no coreset support: use it with --coreset none" << endl;
+        return 1;
+    }
+    if (range_bandwidth <= 0) {
+        range_bandwidth = bandwidth;
+    }
     if (args.find("--superpixels") != args.end()) {
         superpixels = stoi(args["--superpixels"]);
-        if (superpixels > MAX_SUPERPIXELS){
-            std::cout << "### Maximum number of superpixels is set to "<< MAX_SUPERPIXELS << " ! ###" << endl;
-            superpixels = MAX_SUPERPIXELS;
-        }
     }
     if (args.find("--compactness") != args.end()) {
         m = stof(args["--compactness"]);
     }
-    #endif
+    if (args.find("--slic-tolerance") != args.end()) {
+        slic_tolerance = stof(args["--slic-tolerance"]);
+    }
 
-    // Map kernel names to functions
-    #ifdef MEAN_SHIFT_SQRD
-    unordered_map<string, T (*)(T, T)> kernel_map = {
-        {"gaussian", gaussian_kernel_sqrd},
-        {"uniform", uniform_kernel_sqrd},
-        {"epanechnikov", epanechnikov_kernel_sqrd}
-    };
-    #else
+    // Map kernel names to functions (backends working on squared distances switch to the
+    // *_kernel_sqrd version in backends.c)
     unordered_map<string, T (*)(T, T)> kernel_map = {
         {"gaussian", gaussian_kernel},
         {"uniform", uniform_kernel},
         {"epanechnikov", epanechnikov_kernel}
     };
-    #endif
 
     // Validate kernel name
     if (kernel_map.find(kernel) == kernel_map.end()) {
@@ -114,176 +387,222 @@ int main(int argc, char *argv[]) {
         return 1;
     }
 
-    // Open input file
-    ifstream filein(input_csv_path);
-    if (!filein) {
-        cerr << "Error opening CSV file\n";
+    // Opt-in hardware counters: opened by every OpenMP thread before the first phase
+    if (perf_counters_enabled) {
+        init_perf_counters();
+    }
+
+    Dataset input_dataset = {};
+#ifdef TOTAL_TIMING
+    TOTAL_TIMER_START(ingest)
+#endif
+    int load_status;
+    if (is_binary_dataset(input_csv_path)) {
+        // Binary container: map the LAB values straight into the dataset buffer
+        load_status = map_binary_dataset(input_csv_path, &input_dataset);
+    } else {
+        // Text CSV: parallel parse of the memory-mapped file
+        load_status = load_csv_dataset(input_csv_path, &input_dataset);
+    }
+    if (load_status != 0) {
         std::cout << "Current working directory: " << filesystem::current_path() << endl;
         std::cout << "Input_csv_path: " << input_csv_path << endl;
         return 1;
     }
+#ifdef TOTAL_TIMING
+    TOTAL_TIMER_STOP(ingest)
+    printf("ingest throughput: %.2f MB/s, %.0f rows/s\n",
+           input_dataset.source_size / (1024.0 * 1024.0) / duration_ingest,
+           input_dataset.rows / duration_ingest);
+#endif
+    unsigned int width = input_dataset.width;
+    unsigned int height = input_dataset.height;
+    Point* dataset = input_dataset.points;
 
-    string line;
-    // get width, height and pixel_count
-    getline(filein, line); // skip first line "width, height"
-    getline(filein, line); // get dimensions values
-    stringstream ss(line);
-    string width_str, height_str;
-    getline(ss, width_str, ',');
-    getline(ss, height_str, ',');
-
-    unsigned int width = stoi(width_str);
-    unsigned int height = stoi(height_str);
     unsigned int pixel_count = width * height;
     if (pixel_count > 100000000) {
         std::cout << "### Warning: The input image is very large (" << pixel_count << " pixels). The program may take a long time to complete or run out of memory. ###" << endl;
         std::cout << "### Consider reducing the resolution. ###" << endl;
     }
-    getline(filein, line); // skip the third line "L,A,B"
 
-    
-    Point* dataset = (Point*) malloc(pixel_count * sizeof(Point));
     Point* shifted_dataset = (Point*) malloc(pixel_count * sizeof(Point)); 
-    Point cluster_modes[1000]; 
     unsigned int clusters_count = 0; // number of clusters
-    #ifdef PREPROCESSING     
+    Point* superpixel_dataset = NULL;
+    Point* shifted_superpixels = NULL;
+    int* dataset_labels = NULL; // labels for each pixel in the dataset
+    if (slic_enabled) {
         if (superpixels == 0) {
             superpixels = pixel_count / 100; // default value for superpixels, once every 100 pixels
             if (superpixels < 10) superpixels = 10;
-            if (superpixels > MAX_SUPERPIXELS) superpixels = MAX_SUPERPIXELS;
             std::cout << "No superpixels specified. Using default value: " << superpixels << endl;
         }
+        if (superpixels > pixel_count) {
+            std::cout << "### At most one superpixel per pixel: using " << pixel_count << " superpixels ###" << endl;
+            superpixels = pixel_count;
+        }
 
-        Point* superpixel_dataset = (Point*) malloc(superpixels * sizeof(Point));
-        Point* shifted_superpixels = (Point*) malloc(superpixels * sizeof(Point));
-        int* dataset_labels = (int*) malloc(pixel_count * sizeof(int)); // labels for each pixel in the dataset
-    #endif 
-    
-    // read each row (pixel) and convert in doubles
-    unsigned int index = 0;
-    Point lab_point;
-    while (getline(filein, line) && index < pixel_count) {
-        stringstream ss(line);
-        string r, g, b;
-
-        getline(ss, r, ',');
-        getline(ss, g, ',');
-        getline(ss, b, ',');
-
-        // append each pixel in the dataset
-        lab_point.coords[0] = T(stoi(r));
-        lab_point.coords[1] = T(stoi(g));
-        lab_point.coords[2] = T(stoi(b));
-        
-        // Store LAB values in the dataset
-        copy_point(&lab_point, &dataset[index]);
-        index++;
-    }
-    filein.close();
-
-#ifdef PREPROCESSING
-    // ----------------------- SLIC PREPROCESSING ----------------------------
-    std::cout << endl << "==================== SLIC preprocessing ==================" << endl;
-    std::cout << "Dataset: [" << input_csv_path  << "]\t "<< width << "x" << height << " (" << pixel_count << " elements)" << endl << endl;
-    std::cout <<"Preprocessing (SLIC)"<< endl << "\t- Superpixels: " << superpixels << endl;
-    std::cout << "\t- Compactness: " << m << endl <<endl;
+        superpixel_dataset = (Point*) malloc(superpixels * sizeof(Point));
+        shifted_superpixels = (Point*) malloc(superpixels * sizeof(Point));
+        dataset_labels = (int*) malloc(pixel_count * sizeof(int));
+    }
+
+    // Room for one mode per mean-shift point: there is no limit on the number of clusters
+    unsigned int max_modes = pixel_count;
+    if (slic_enabled && superpixels > max_modes) max_modes = superpixels;
+    Point* cluster_modes = (Point*) malloc(max_modes * sizeof(Point));
+
+    if (slic_enabled) {
+        // ----------------------- SLIC PREPROCESSING ----------------------------
+        std::cout << endl << "==================== SLIC preprocessing ==================" << endl;
+        std::cout << "Dataset: [" << input_csv_path  << "]\t "<< width << "x" << height << " (" << pixel_count << " elements)" << endl << endl;
+        std::cout <<"Preprocessing (SLIC)"<< endl << "\t- Superpixels: " << superpixels << endl;
+        std::cout << "\t- Compactness: " << m << endl <<endl;
 
 #ifdef TOTAL_TIMING
-    TOTAL_TIMER_START(slic)
+        TOTAL_TIMER_START(slic)
 #endif
-    preprocess_dataset(pixel_count, dataset, dataset_labels, superpixel_dataset, width, height, superpixels, m);
+        // SLIC may place fewer centres than asked for: only those are shifted
+        superpixels = preprocess_dataset(pixel_count, dataset, dataset_labels, superpixel_dataset, width, height, superpixels, m);
 #ifdef TOTAL_TIMING
-    TOTAL_TIMER_STOP(slic)
+        TOTAL_TIMER_STOP(slic)
 #endif
 
-    FILE *fileout_slic = fopen(output_slic_path, "w");
-    if (!fileout_slic) {
-        cerr << "Error opening " << output_slic_path;
-        exit(-1);
+        if (write_output(output_slic_path, width, height, superpixels, superpixel_dataset, dataset_labels) != 0) {
+            exit(-1);
+        }
+        std::cout << ">>>> SLIC results saved in: [" << output_slic_path << "] <<<<" << endl;
+        // ----------------------- END PREPROCESSING ----------------------------
     }
-    fprintf(fileout_slic, "width,height,\n");
-    fprintf(fileout_slic, "%d,%d,\n", width, height);
-    fprintf(fileout_slic, "L,A,B\n");
-    
-    for (int i = 0; i < pixel_count; i++) {
-        int label = dataset_labels[i];
-        copy_point(&superpixel_dataset[label], &lab_point);
-        write_point_to_file(&lab_point, fileout_slic);
-    }
-    fclose(fileout_slic);
-    std::cout << ">>>> SLIC results saved in: [" << output_slic_path << "] <<<<" << endl;
-    // ----------------------- END PREPROCESSING ----------------------------
-#endif
     // ------------------------- MEAN-SHIFT ----------------------------
     std::cout << endl << "==================== Mean-Shift ==================" << endl;
     std::cout << "Dataset: [" << input_csv_path  << "]\t "<< width << "x" << height << " (" << pixel_count << " elements)" << endl << endl;
     std::cout << "Type precision: " << sizeof(T) * 8 << " bits - " << TYPENAME << endl;
     std::cout << "\t- Bandwidth: " << bandwidth << endl;
     std::cout << "\t- Kernel: " << kernel << endl;
+    std::cout << "\t- Backend: " << selected_backend_name() << endl;
+    // Path actually taken, not --soa: the basic backend records "on" when it shifts on the SoA copy
+    record_string("soa", "off");
 
-#ifdef PREPROCESSING
-
+    if (slic_enabled) {
 #ifdef TOTAL_TIMING
-    TOTAL_TIMER_START(mean_shift)
+        TOTAL_TIMER_START(mean_shift)
 #endif
-// ----- Mean-Shift on superpixels
-    mean_shift(superpixels, superpixel_dataset, shifted_superpixels, bandwidth, kernel_map[kernel], cluster_modes, &clusters_count);
+        // ----- Mean-Shift on superpixels
+        double mean_shift_start = omp_get_wtime();
+        run_mean_shift(superpixels, superpixel_dataset, shifted_superpixels, bandwidth, kernel_map[kernel], cluster_modes, &clusters_count);
+        double mean_shift_seconds = omp_get_wtime() - mean_shift_start;
 
 #ifdef TOTAL_TIMING
-    TOTAL_TIMER_STOP(mean_shift)
+        TOTAL_TIMER_STOP(mean_shift)
+#endif
+        if (coreset_method != CORESET_NONE && coreset_verify) {
+            verify_coreset(superpixels, superpixel_dataset, shifted_superpixels, mean_shift_seconds, bandwidth, kernel_map[kernel]);
+        }
+#ifdef BASINS
+        if (basin_radius > 0) {
+            report_basin_accuracy(superpixels, superpixel_dataset, shifted_superpixels, bandwidth, kernel_map[kernel]);
+        }
 #endif
 
-// ----- label to cluster assignment
+        // ----- label to cluster assignment
 #ifdef TOTAL_TIMING
-    TOTAL_TIMER_START(label_to_cluster_assignment)
+        TOTAL_TIMER_START(label_to_cluster_assignment)
 #endif
-    for(unsigned int i = 0; i < pixel_count; i++) {
-        int label = dataset_labels[i]; 
-        copy_point(&shifted_superpixels[label], &shifted_dataset[i]);
-    }
+        for(unsigned int i = 0; i < pixel_count; i++) {
+            int label = dataset_labels[i]; 
+            copy_point(&shifted_superpixels[label], &shifted_dataset[i]);
+        }
 #ifdef TOTAL_TIMING
-    TOTAL_TIMER_STOP(label_to_cluster_assignment)
+        TOTAL_TIMER_STOP(label_to_cluster_assignment)
 #endif
 
-#else
+    } else {
 
 #ifdef TOTAL_TIMING
-    TOTAL_TIMER_START(mean_shift)
+        TOTAL_TIMER_START(mean_shift)
 #endif
-    // standard Mean-Shift
-    mean_shift(pixel_count, dataset, shifted_dataset, bandwidth, kernel_map[kernel], cluster_modes, &clusters_count);
+        double mean_shift_seconds = 0.0;
+        if (spatial_bandwidth > 0) {
+            // joint spatial-range (x, y, L, A, B) Mean-Shift, windowed on the image
+            if (mean_shift_spatial(width, height, dataset, shifted_dataset, spatial_bandwidth, range_bandwidth,
+                                   kernel_map[kernel], cluster_modes, &clusters_count) != 0) {
+                exit(-1);
+            }
+        } else {
+            // standard Mean-Shift
+            double mean_shift_start = omp_get_wtime();
+            run_mean_shift(pixel_count, dataset, shifted_dataset, bandwidth, kernel_map[kernel], cluster_modes, &clusters_count);
+            mean_shift_seconds = omp_get_wtime() - mean_shift_start;
+        }
 
 #ifdef TOTAL_TIMING
-    TOTAL_TIMER_STOP(mean_shift)
+        TOTAL_TIMER_STOP(mean_shift)
 #endif
-
+        if (coreset_method != CORESET_NONE && coreset_verify) {
+            verify_coreset(pixel_count, dataset, shifted_dataset, mean_shift_seconds, bandwidth, kernel_map[kernel]);
+        }
+#ifdef BASINS
+        if (basin_radius > 0) {
+            report_basin_accuracy(pixel_count, dataset, shifted_dataset, bandwidth, kernel_map[kernel]);
+        }
 #endif
 
-    if (clusters_count > 1000) {
-        std::cout << "--- Warning: More than 1000 clusters found. Some clusters may be lost." << endl;
-    } else if (clusters_count == 1) {
+    }
+
+    // Run record (--metrics-out): the backend is known only after the run with --backend auto
+    record_string("executable", std::filesystem::path(argv[0]).filename().string().c_str());
+    record_string("backend", selected_backend_name());
+    record_number("threads", omp_get_max_threads());
+    record_string("dataset", input_csv_path);
+    record_number("width", width);
+    record_number("height", height);
+    record_number("n", pixel_count);
+    record_number("n_shifted", slic_enabled ? superpixels : pixel_count);
+    record_number("bandwidth", bandwidth);
+    record_string("kernel", kernel);
+    record_string("dtype", TYPENAME);
+    record_number("dim", DIM);
+    record_string("slic", slic_enabled ? "on" : "off");
+    if (slic_enabled) {
+        record_number("superpixels", superpixels);
+        record_number("compactness", m);
+    }
+    record_string("dedupe", dedupe_enabled ? "on" : "off");
+    record_string("coreset", coreset_method_name(coreset_method));
+    if (coreset_method != CORESET_NONE) {
+        record_number("coreset_seed", coreset_seed);
+        if (coreset_method == CORESET_GRID) {
+            record_number("coreset_tolerance", coreset_tolerance);
+        }
+    }
+    record_string("index", spatial_index_enabled ? "grid" : "none");
+    if (spatial_bandwidth > 0) {
+        record_number("spatial_bandwidth", spatial_bandwidth);
+        record_number("range_bandwidth", range_bandwidth);
+    }
+    record_string("perf_counters", perf_counters_enabled ? "on" : "off");
+    record_stat("clusters", clusters_count);
+
+    if (clusters_count == 1) {
         std::cout << "--- Warning: Only one cluster found. No segmentation possible." << endl<< "Try to select a smaller bandwidth." << endl;
     } else{
         std::cout << "--- Clusters found: " << clusters_count << endl;
     }
     
-    // write to csv file
-    FILE *fileout = fopen(output_csv_path, "w");
-    if (!fileout) {
-        cerr << "Error opening " << output_csv_path;
+    // write results (label map for .lbl outputs, binary container for .bin outputs, CSV otherwise)
+    if (write_output(output_csv_path, width, height, pixel_count, shifted_dataset, NULL) != 0) {
         exit(-1);
     }
-    fprintf(fileout, "width,height,\n");
-    fprintf(fileout, "%d,%d,\n", width, height);
-    fprintf(fileout, "L,A,B\n");
-
-    for (int i = 0; i < pixel_count; i++) {
-        copy_point(&shifted_dataset[i], &lab_point);
-        write_point_to_file(&lab_point, fileout);
-    }
-    fclose(fileout);
-
     std::cout << ">>>> Mean-Shift results saved in: [" << output_csv_path << "] <<<<" << endl;
+    report_perf_counters();
+    write_run_record();
     std::cout << "=============================================================" << endl;
+
+    release_dataset(&input_dataset);
+    free(shifted_dataset);
+    free(cluster_modes);
+    free(superpixel_dataset);
+    free(shifted_superpixels);
+    free(dataset_labels);
     return 0;
 }
@@ -1,42 +1,153 @@
 #include "include/point.h"
 #include "include/utils.h"
 #include "include/mean_shift.h"
+#include "include/coreset.h"
+#include "include/spatial_index.h"
+#include "include/basin.h"
+#include "include/soa.h"
+#include "metrics/run_record.h"
+#include "metrics/perf_counters.h"
 #include <stdio.h>
 #include <stdlib.h>
 #include <omp.h>
 
-void mean_shift(unsigned int dataset_size, const Point dataset[],
-                Point shifted_dataset[], T bandwidth,
-                T (*kernel_func)(T, T), Point cluster_modes[],
-                unsigned int *cluster_count)
+static unsigned int shift_point_until_convergence_indexed(const Point *input_point, Point *output_point,
+                                   const SpatialIndex *index, T bandwidth,
+                                   T (*kernel_func)(T, T), unsigned long long *candidates);
+
+void mean_shift_basic(unsigned int dataset_size, const Point dataset[],
+                      unsigned int support_size, const Point support[], const T support_weights[],
+                      Point shifted_dataset[], T bandwidth,
+                      T (*kernel_func)(T, T), Point cluster_modes[],
+                      unsigned int *cluster_count)
 {
     *cluster_count = 0;
-    
+
+    // Optional grid index: only valid when points beyond the bandwidth weigh 0
+    SpatialIndex index;
+    int use_index = 0;
+    if (spatial_index_enabled) {
+        if (is_finite_support_kernel(kernel_func)) {
+            double start_index = omp_get_wtime();
+            use_index = build_spatial_index(&index, support, support_size, support_weights, bandwidth) == 0;
+            printf("spatial_index build time: %f s\n", omp_get_wtime() - start_index);
+            record_timer("spatial_index_build", omp_get_wtime() - start_index);
+        } else {
+            printf("spatial_index disabled: kernel without finite support\n");
+        }
+    }
+    unsigned long long total_candidates = 0;
+    unsigned long long total_queries = 0;
+
+    // SoA copy of the support for the vectorized hot path (full scans, with or without basins)
+    PointsSoA support_soa;
+    SoaKernel soa_kernel = soa_kernel_of(kernel_func);
+    int use_soa = 0;
+    if (soa_enabled && !use_index && soa_kernel != SOA_KERNEL_NONE) {
+        double start_soa = omp_get_wtime();
+        use_soa = points_to_soa(support, support_weights, support_size, &support_soa) == 0;
+        record_timer("soa_conversion", omp_get_wtime() - start_soa);
+    }
+    record_string("soa", use_soa ? "on" : "off");
+
     // Phase 1: Independent point shifting   
-    #pragma omp parallel
-    {
-        #pragma omp master
+    perf_phase_begin("shift_points");
+    if (basin_radius > 0) {
+        // Opt-in: trajectories stop inside the basin of an already known mode
+        mean_shift_basins(dataset_size, dataset, support_size, support, support_weights,
+                          shifted_dataset, bandwidth, kernel_func, use_index ? &index : NULL,
+                          use_soa ? &support_soa : NULL, soa_kernel);
+    } else {
+        #pragma omp parallel
         {
-            printf("Running with %d threads\n", omp_get_num_threads());
-        }
+            #pragma omp master
+            {
+                printf("Running with %d threads\n", omp_get_num_threads());
+            }
+
+            if (use_index) {
+                #pragma omp for schedule(dynamic) reduction(+:total_candidates, total_queries)
+                for (int i = 0; i < dataset_size; i++) {
+                    unsigned long long candidates = 0;
+                    total_queries += shift_point_until_convergence_indexed(&dataset[i], &shifted_dataset[i],
+                                                &index, bandwidth, kernel_func, &candidates);
+                    total_candidates += candidates;
+                }
+            } else if (use_soa) {
+                #pragma omp for schedule(dynamic)
+                for (int i = 0; i < dataset_size; i++) {
+                    shift_point_until_convergence_soa(&dataset[i], &shifted_dataset[i], &support_soa,
+                                                      bandwidth, soa_kernel);
+                }
+            } else {
+                #pragma omp for schedule(dynamic)
+                for (int i = 0; i < dataset_size; i++) {
+                    shift_point_until_convergence(&dataset[i], &shifted_dataset[i], support, support_size,
+                                                support_weights, bandwidth, kernel_func);
+                }
+            }
+        } // End parallel region
+    }
+    perf_phase_end("shift_points");
+    if (use_soa) free_soa(&support_soa);
 
-        #pragma omp for schedule(dynamic)
-        for (int i = 0; i < dataset_size; i++) {
-            shift_point_until_convergence(&dataset[i], &shifted_dataset[i],
-                                        dataset, dataset_size, bandwidth, kernel_func);
+    if (use_index) {
+        if (total_queries > 0) {
+            double avg_candidates = (double)total_candidates / total_queries;
+            printf("spatial_index avg candidates per query: %.1f (%.2f%% of dataset, %llu queries)\n",
+                   avg_candidates, 100.0 * avg_candidates / support_size, total_queries);
+            record_stat("spatial_index_avg_candidates", avg_candidates);
+            record_stat("spatial_index_queries", (double)total_queries);
         }
-    } // End parallel region
+        free_spatial_index(&index);
+    }
+
+    // Points left in place by an empty window (sparse support only)
+    if (support != dataset) {
+        report_empty_windows(count_empty_windows(dataset_size, shifted_dataset, support_size, support,
+                                                 bandwidth, kernel_func), dataset_size);
+    }
+
+    // Phase 2: Cluster Assignment (parallel, same result as the sequential leader rule)
+    perf_phase_begin("cluster_assignment");
+    assign_clusters_parallel(dataset_size, shifted_dataset, cluster_modes, cluster_count);
+    perf_phase_end("cluster_assignment");
+}
+
+// Convergence loop for a single point, using the grid index for each shift.
+// [candidates] accumulates the points visited over all the iterations.
+static unsigned int shift_point_until_convergence_indexed(const Point *input_point, Point *output_point,
+                                   const SpatialIndex *index, T bandwidth,
+                                   T (*kernel_func)(T, T), unsigned long long *candidates)
+{
+    Point prev_point;
+    Point next_point;
+    unsigned int iter = 0;
+    int stop_moving = 0;
 
-    // Phase 2: sequential Cluster Assignment
-    for (int i = 0; i < dataset_size; i++) {
-        assign_clusters(&shifted_dataset[i], cluster_modes, cluster_count);
+    copy_point(input_point, &prev_point);
+
+    while (!stop_moving)
+    {
+        *candidates += shift_single_point_indexed(&prev_point, &next_point, index, bandwidth, kernel_func);
+
+        T shift_distance = euclidean_distance(&prev_point, &next_point);
+
+        if (shift_distance <= EPSILON)
+        {
+            stop_moving = 1;
+        }
+        copy_point(&next_point, &prev_point);
+        iter++;
     }
+    copy_point(&prev_point, output_point);
+    return iter;
 }
 
 // Convergence loop for a single point
 unsigned int shift_point_until_convergence(const Point *input_point, Point *output_point,
                                    const Point dataset[], unsigned int dataset_size,
-                                   T bandwidth, T (*kernel_func)(T, T))
+                                   const T weights[], T bandwidth, T (*kernel_func)(T, T))
 {
     Point prev_point;
     Point next_point;
@@ -47,7 +158,7 @@ unsigned int shift_point_until_convergence(const Point *input_point, Point *outp
 
     while (!stop_moving)
     {
-        shift_single_point(&prev_point, &next_point, dataset, dataset_size, bandwidth, kernel_func);
+        shift_single_point(&prev_point, &next_point, dataset, dataset_size, weights, bandwidth, kernel_func);
 
         T shift_distance = euclidean_distance(&prev_point, &next_point);
 
@@ -65,7 +176,7 @@ unsigned int shift_point_until_convergence(const Point *input_point, Point *outp
 // Single shift towards the densest area
 void shift_single_point(const Point *point, Point *next_point,
                         const Point dataset[], unsigned int dataset_size,
-                        T bandwidth, T (*kernel_func)(T, T))
+                        const T weights[], T bandwidth, T (*kernel_func)(T, T))
 {
     T total_weight = 0;
     Point point_i;
@@ -77,6 +188,7 @@ void shift_single_point(const Point *point, Point *next_point,
         copy_point(&dataset[i], &point_i);
         T distance = euclidean_distance(point, &point_i); 
         T weight = kernel_func(distance, bandwidth); 
+        if (weights) weight *= weights[i]; // multiplicity of dataset[i]
 
         for (int j = 0; j < DIM; j++)
         {
@@ -91,30 +203,8 @@ void shift_single_point(const Point *point, Point *next_point,
     {
         divide_point(next_point, total_weight); 
     } else {
-        fprintf(stderr, "Error: total_weight == 0, couldn't normalize.\n");
+        // empty window (only with a sparse support, e.g. --coreset): the point stays where it is
+        copy_point(point, next_point);
     }
 }
 
-// Assign clusters to shifted points
-void assign_clusters(Point *shifted_point, Point cluster_modes[],
-                     unsigned int *cluster_count)
-{
-    int c = 0;
-    for (; c < *cluster_count; c++)
-    {
-        T distance_from_cluster = euclidean_distance(shifted_point, &cluster_modes[c]);
-
-        if (distance_from_cluster <= CLUSTER_EPSILON)
-        {
-            copy_point(&cluster_modes[c], shifted_point); // assign cluster mode to shifted point
-            break;
-        }
-    }
-    // Whenever [shifted_point] doesn't belong to any cluster:
-    // --> create cluster with mode in [shifted_point]
-    if (c == *cluster_count)
-    {
-        copy_point(shifted_point, &cluster_modes[c]); // assign cluster mode to shifted point
-        (*cluster_count)++;
-    }
-}
\ No newline at end of file
@@ -0,0 +1,197 @@
+#include <stdio.h>
+#include <stdlib.h>
+#include <math.h>
+#include <omp.h>
+#include "include/point.h"
+#include "include/utils.h"
+#include "include/mean_shift.h"
+#include "include/soa.h"
+#include "include/mean_shift_spatial.h"
+#include "metrics/run_record.h"
+#include "metrics/perf_counters.h"
+
+T spatial_bandwidth = 0;
+T range_bandwidth = 0;
+
+// Convergence: shift of the 5D point, in bandwidths (spatial and range parts scaled separately)
+#define SPATIAL_EPSILON 0.01
+
+// Pixels per chunk of the dynamic schedule: a trajectory only scans a window, chunks of one pixel
+// would cost more in scheduling than in work
+#define SPATIAL_CHUNK 64
+
+// Kernel weights of the pixels [x0, x0 + count) of image row [y], with the 5D weight [WEIGHT]
+// (an expression of the squared spatial distance ds2 and squared range distance dr2), and their
+// weighted x. One loop per kernel, vectorized over the pixels of the row.
+#define SPATIAL_ROW_WEIGHTS(WEIGHT)                                             \
+    do {                                                                        \
+        _Pragma("omp simd reduction(+:row_weight, row_x)")                      \
+        for (int i = 0; i < count; i++) {                                       \
+            T dx = (T)(x0 + i) - position[0];                                   \
+            T ds2 = dx * dx + dy2;                                              \
+            T dr2 = 0;                                                          \
+            for (int d = 0; d < DIM; d++) {                                     \
+                T diff = coords[d][row + x0 + i] - colour[d];                   \
+                dr2 += diff * diff;                                             \
+            }                                                                   \
+            T weight = (WEIGHT);                                                \
+            row_weights[i] = weight;                                            \
+            row_weight += weight;                                               \
+            row_x += weight * (T)(x0 + i);                                      \
+        }                                                                       \
+    } while (0)
+
+// Product kernels on the squared distances (the gaussian product is a single exp); the values are
+// computed for every lane and then selected, so the conditions compile to blends
+#define GAUSSIAN_WEIGHT ((T)exp((T)-0.5 * (ds2 * inv_spatial_sqrd + dr2 * inv_range_sqrd)))
+#define UNIFORM_WEIGHT (ds2 * inv_spatial_sqrd <= 1 && dr2 * inv_range_sqrd <= 1 ? (T)1 : (T)0)
+#define EPANECHNIKOV_WEIGHT epanechnikov_product(ds2 * inv_spatial_sqrd, dr2 * inv_range_sqrd)
+
+static inline T epanechnikov_product(T u2_spatial, T u2_range)
+{
+    T value = ((T)1 - u2_spatial) * ((T)1 - u2_range);
+    return u2_spatial <= 1 && u2_range <= 1 ? value : (T)0;
+}
+
+// Convergence loop of pixel [pixel]: [row_weights] has room for a window row.
+// Returns the iterations, [visited] accumulates the pixels scanned.
+static unsigned int shift_pixel(const PointsSoA *image, int width, int height, unsigned int pixel,
+                                T spatial_bw, T range_bw, SoaKernel kernel, T window_radius,
+                                T row_weights[], Point *output, unsigned long long *visited)
+{
+    const T *const *coords = (const T *const *)image->coords;
+    const T inv_spatial_sqrd = (T)1 / (spatial_bw * spatial_bw);
+    const T inv_range_sqrd = (T)1 / (range_bw * range_bw);
+    T position[2] = {(T)(pixel % width), (T)(pixel / width)};
+    T colour[DIM];
+    for (int d = 0; d < DIM; d++) colour[d] = coords[d][pixel];
+
+    unsigned int iter = 0;
+    while (iter < SPATIAL_MAX_ITER) {
+        T total_weight = 0, sum_x = 0, sum_y = 0;
+        T sums[DIM];
+        for (int d = 0; d < DIM; d++) sums[d] = 0;
+
+        int y0 = (int)ceil(position[1] - window_radius);
+        int y1 = (int)floor(position[1] + window_radius);
+        if (y0 < 0) y0 = 0;
+        if (y1 > height - 1) y1 = height - 1;
+        for (int y = y0; y <= y1; y++) {
+            T dy = (T)y - position[1];
+            T dy2 = dy * dy;
+            // the window is a disc: only the pixels of the row within window_radius
+            T half = (T)sqrt(window_radius * window_radius - dy2 > 0 ? window_radius * window_radius - dy2 : 0);
+            int x0 = (int)ceil(position[0] - half);
+            int x1 = (int)floor(position[0] + half);
+            if (x0 < 0) x0 = 0;
+            if (x1 > width - 1) x1 = width - 1;
+            int count = x1 - x0 + 1;
+            if (count <= 0) continue;
+            size_t row = (size_t)y * width;
+            *visited += count;
+
+            T row_weight = 0, row_x = 0;
+            switch (kernel) {
+            case SOA_KERNEL_GAUSSIAN: SPATIAL_ROW_WEIGHTS(GAUSSIAN_WEIGHT); break;
+            case SOA_KERNEL_UNIFORM: SPATIAL_ROW_WEIGHTS(UNIFORM_WEIGHT); break;
+            default: SPATIAL_ROW_WEIGHTS(EPANECHNIKOV_WEIGHT); break;
+            }
+            if (row_weight == 0) continue;
+            total_weight += row_weight;
+            sum_x += row_x;
+            sum_y += row_weight * (T)y;
+            for (int d = 0; d < DIM; d++) {
+                const T *row_coords = coords[d] + row + x0;
+                T sum = 0;
+                #pragma omp simd reduction(+:sum)
+                for (int i = 0; i < count; i++) {
+                    sum += row_coords[i] * row_weights[i];
+                }
+                sums[d] += sum;
+            }
+        }
+        iter++;
+        if (total_weight <= 0) break; // the pixel weighs on itself: only with an empty image
+
+        T next_x = sum_x / total_weight, next_y = sum_y / total_weight;
+        T shift = ((next_x - position[0]) * (next_x - position[0]) +
+                   (next_y - position[1]) * (next_y - position[1])) * inv_spatial_sqrd;
+        position[0] = next_x;
+        position[1] = next_y;
+        for (int d = 0; d < DIM; d++) {
+            T next = sums[d] / total_weight;
+            shift += (next - colour[d]) * (next - colour[d]) * inv_range_sqrd;
+            colour[d] = next;
+        }
+        if (shift <= (T)(SPATIAL_EPSILON * SPATIAL_EPSILON)) break;
+    }
+
+    for (int d = 0; d < DIM; d++) output->coords[d] = colour[d];
+    return iter;
+}
+
+int mean_shift_spatial(unsigned int width, unsigned int height, const Point dataset[],
+                       Point shifted_dataset[], T spatial_bw, T range_bw,
+                       T (*kernel_func)(T, T), Point cluster_modes[], unsigned int *cluster_count)
+{
+    *cluster_count = 0;
+    SoaKernel kernel = soa_kernel_of(kernel_func);
+    if (kernel == SOA_KERNEL_NONE) {
+        fprintf(stderr, "Error: the spatial-range mode supports the gaussian, uniform and epanechnikov kernels\n");
+        return -1;
+    }
+    T window_radius = kernel == SOA_KERNEL_GAUSSIAN ? SPATIAL_GAUSSIAN_WINDOW * spatial_bw : spatial_bw;
+    unsigned int size = width * height;
+    printf("spatial-range mean shift: hs %g px, hr %g, window radius %g px\n",
+           (double)spatial_bw, (double)range_bw, (double)window_radius);
+
+    // SoA copy of the image: every window row is a unit-stride run of each coordinate
+    PointsSoA image;
+    if (points_to_soa(dataset, NULL, size, &image) != 0) return -1;
+
+    unsigned long long total_iterations = 0;
+    unsigned long long total_visited = 0;
+    int status = 0;
+
+    perf_phase_begin("shift_points");
+    #pragma omp parallel reduction(+:total_iterations, total_visited)
+    {
+        #pragma omp master
+        {
+            printf("Running with %d threads\n", omp_get_num_threads());
+        }
+        T *row_weights = (T *)malloc(((size_t)(2 * window_radius) + 2) * sizeof(T));
+        if (!row_weights) {
+            #pragma omp atomic write
+            status = -1;
+        }
+        #pragma omp for schedule(dynamic, SPATIAL_CHUNK)
+        for (unsigned int i = 0; i < size; i++) {
+            if (!row_weights) continue;
+            unsigned long long visited = 0;
+            total_iterations += shift_pixel(&image, (int)width, (int)height, i, spatial_bw, range_bw,
+                                            kernel, window_radius, row_weights, &shifted_dataset[i], &visited);
+            total_visited += visited;
+        }
+        free(row_weights);
+    }
+    perf_phase_end("shift_points");
+    free_soa(&image);
+    if (status != 0) {
+        fprintf(stderr, "Error: Memory allocation failed in mean_shift_spatial\n");
+        return -1;
+    }
+
+    if (total_iterations > 0) {
+        printf("spatial-range: %.1f iterations per pixel, %.1f pixels scanned per iteration (%.4f%% of the image)\n",
+               (double)total_iterations / size, (double)total_visited / total_iterations,
+               100.0 * total_visited / total_iterations / size);
+        record_stat("spatial_avg_iterations", (double)total_iterations / size);
+        record_stat("spatial_avg_window", (double)total_visited / total_iterations);
+    }
+
+    perf_phase_begin("cluster_assignment");
+    status = assign_clusters_parallel(size, shifted_dataset, cluster_modes, cluster_count);
+    perf_phase_end("cluster_assignment");
+    return status;
+}
@@ -1,6 +1,7 @@
 #include "../include/point.h"
 #include "../include/utils.h"
 #include "../include/mean_shift.h"
+#include "../include/coreset.h"
 #include <stdio.h>
 #include <stdlib.h>
 #include <openacc.h>
@@ -24,40 +25,56 @@ void print_acc_info() {
     printf("OpenACC: Device type: %s\n", dev_type ? dev_type : "default");
 }
 
-void mean_shift(unsigned int dataset_size, const Point dataset[],
-                Point shifted_dataset[], T bandwidth,
-                T (*kernel_func)(T, T), Point cluster_modes[],
-                unsigned int *cluster_count)
+void mean_shift_acc(unsigned int dataset_size, const Point dataset[],
+                    unsigned int support_size, const Point support[], const T support_weights[],
+                    Point shifted_dataset[], T bandwidth,
+                    T (*kernel_func)(T, T), Point cluster_modes[],
+                    unsigned int *cluster_count)
 {
     *cluster_count = 0;
     print_acc_info();
     printf("Debug: Beginning data transfer to device...\n");
 
-    #pragma acc data copyin(dataset[0:dataset_size]) copyout(shifted_dataset[0:dataset_size])
+    // Unweighted runs pass all-ones weights, so the device code has a single path
+    T *weights = (T *)malloc(support_size * sizeof(T));
+    if (!weights) {
+        fprintf(stderr, "Error: Memory allocation failed in mean_shift_acc\n");
+        return;
+    }
+    for (int j = 0; j < support_size; j++) {
+        weights[j] = support_weights ? support_weights[j] : 1;
+    }
+
+    #pragma acc data copyin(dataset[0:dataset_size], support[0:support_size], weights[0:support_size]) copyout(shifted_dataset[0:dataset_size])
     {
         printf("Debug: Data transfer complete, starting computation\n");
         #pragma acc parallel loop num_gangs(acc_num_gangs) num_workers(acc_num_workers)
         for (int i = 0; i < dataset_size; i++) {
             shift_point_until_convergence_acc(&dataset[i], &shifted_dataset[i],
-                                          dataset, dataset_size, bandwidth);
+                                          support, support_size, weights, bandwidth);
         }
         #pragma acc update self(shifted_dataset[0:dataset_size])
 	}
+    free(weights);
     
     printf("Debug: Dataset point [0] outside loop");
     print_point(&dataset[0]);
     printf("Debug: Shifted Dataset point [0] outside loop");
     print_point(&shifted_dataset[0]);;
 
-    for (int i = 0; i < dataset_size; i++) {
-        assign_clusters(&shifted_dataset[i], cluster_modes, cluster_count);
+    // Points left in place by an empty window (sparse support only)
+    if (support != dataset) {
+        report_empty_windows(count_empty_windows(dataset_size, shifted_dataset, support_size, support,
+                                                 bandwidth, kernel_func), dataset_size);
     }
+
+    assign_clusters_parallel(dataset_size, shifted_dataset, cluster_modes, cluster_count);
 }
 
 #pragma acc routine seq
 unsigned int shift_point_until_convergence_acc(const Point *input_point, Point *output_point,
                                            const Point dataset[], unsigned int dataset_size,
-                                           T bandwidth)
+                                           const T weights[], T bandwidth)
 {
     Point prev_point;
     Point next_point;
@@ -68,7 +85,7 @@ unsigned int shift_point_until_convergence_acc(const Point *input_point, Point *
 
     while (!stop_moving)
     {
-        shift_single_point_acc(&prev_point, &next_point, dataset, dataset_size, bandwidth);
+        shift_single_point_acc(&prev_point, &next_point, dataset, dataset_size, weights, bandwidth);
 
         T shift_distance = euclidean_distance(&prev_point, &next_point);
 
@@ -92,7 +109,7 @@ unsigned int shift_point_until_convergence_acc(const Point *input_point, Point *
 #pragma acc routine seq
 void shift_single_point_acc(const Point *point, Point *next_point,
                         const Point dataset[], unsigned int dataset_size,
-                        T bandwidth)
+                        const T weights[], T bandwidth)
 {
     T total_weight = 0;
     T sum_coords[3] = {0.0, 0.0, 0.0};
@@ -102,7 +119,7 @@ void shift_single_point_acc(const Point *point, Point *next_point,
     {
         copy_point(&dataset[i], &point_i);
         T distance = euclidean_distance(point, &point_i);
-        T weight = gaussian_kernel(distance, bandwidth); //kernel_func(distance, bandwidth);
+        T weight = gaussian_kernel(distance, bandwidth) * weights[i]; //kernel_func(distance, bandwidth);
 
         sum_coords[0] += point_i.coords[0] * weight;
         sum_coords[1] += point_i.coords[1] * weight;
@@ -119,30 +136,9 @@ void shift_single_point_acc(const Point *point, Point *next_point,
     }
     else
     {
-        next_point->coords[0] = NAN;
-        next_point->coords[1] = NAN;
-        next_point->coords[2] = NAN;
+        // empty window (only with a sparse support, e.g. --coreset): the point stays where it is
+        next_point->coords[0] = point->coords[0];
+        next_point->coords[1] = point->coords[1];
+        next_point->coords[2] = point->coords[2];
     }
 }
-
-
-void assign_clusters(Point *shifted_point, Point cluster_modes[],
-                     unsigned int *cluster_count)
-{
-    int c = 0;
-    for (; c < *cluster_count; c++)
-    {
-        T distance_from_cluster = euclidean_distance(shifted_point, &cluster_modes[c]);
-
-        if (distance_from_cluster <= CLUSTER_EPSILON)
-        {
-            copy_point(&cluster_modes[c], shifted_point);
-            break;
-        }
-    }
-    if (c == *cluster_count)
-    {
-        copy_point(shifted_point, &cluster_modes[c]);
-        (*cluster_count)++;
-    }
-}
\ No newline at end of file
@@ -1,167 +1,178 @@
 #include "../include/point.h"
 #include "../include/utils.h"
 #include "../include/mean_shift.h"
+#include "../include/coreset.h"
+#include "../include/tiling.h"
+#include "../metrics/run_record.h"
+#include "../metrics/perf_counters.h"
 #include <stdio.h>
 #include <stdlib.h>
 #include <math.h>
 #include <omp.h>
 
-// 8GB RAM using 4 bytes per float (T)
-#define MAX_DATASET_SIZE 100000 // Define a maximum dataset size for safety
-
-// Matrix-based implementation of Mean Shift algorithm
-void mean_shift(unsigned int dataset_size, const Point dataset[],
-                Point shifted_dataset[], T bandwidth,
-                T (*kernel_func)(T, T), Point cluster_modes[],
-                unsigned int *cluster_count)
+// Matrix-based implementation of Mean Shift algorithm.
+// The N x N weight matrix is never stored: every thread processes row blocks of it
+// one tile (rows x cols) at a time, fusing distance, kernel, row-sum and product.
+// Points are shifted towards the density of the (weighted) support, and each point stops
+// as soon as its own shift drops below EPSILON (as in shift_point_until_convergence):
+// converged points are compacted out of the active set, so the rows of the weight
+// matrix shrink from one iteration to the next.
+void mean_shift_matrix(unsigned int dataset_size, const Point dataset[],
+                       unsigned int support_size, const Point support[], const T support_weights[],
+                       Point shifted_dataset[], T bandwidth,
+                       T (*kernel_func)(T, T), Point cluster_modes[],
+                       unsigned int *cluster_count)
 {
-    if (dataset_size > MAX_DATASET_SIZE) {
-        fprintf(stderr, "Error: dataset_size exceeds MAX_DATASET_SIZE (%d)\n", MAX_DATASET_SIZE);
-        return;
+    int num_threads = 1;
+    #pragma omp parallel
+    {
+        #pragma omp master
+        {
+            num_threads = omp_get_num_threads();
+            printf("Running with %d threads\n", num_threads);
+        }
     }
-    T* distances = (T*)malloc(dataset_size * dataset_size * sizeof(T));
-    T* weights = (T*)malloc(dataset_size * dataset_size * sizeof(T));
+
+    TileSize tile = choose_tile_size_per_thread(support_size, num_threads);
+    size_t tile_elems = (size_t)tile.rows * tile.cols;
+    printf("Tile size: %u x %u (%.2f MB per thread)\n", tile.rows, tile.cols,
+           tile_elems * sizeof(T) / (1024.0 * 1024.0));
+
+    T* tiles = (T*)malloc(num_threads * tile_elems * sizeof(T)); // one weight tile per thread
     T* weight_sums = (T*)malloc(dataset_size * sizeof(T));
     
-    Point* next_points = (Point*)malloc(dataset_size * sizeof(Point)); // Matrix of next points
+    Point* next_points = (Point*)malloc(dataset_size * sizeof(Point)); // next position of each active point
+    unsigned int* active = (unsigned int*)malloc(dataset_size * sizeof(unsigned int)); // unconverged point indices
+    unsigned char* converged = (unsigned char*)malloc(dataset_size * sizeof(unsigned char));
+    const unsigned int MAX_ITER = 1000; // safety cap, points stop on their own shift
+    double* active_sizes = (double*)malloc(MAX_ITER * sizeof(double)); // active points of every iteration
     
-    if (!distances || !weights || !weight_sums || !next_points) {
+    if (!tiles || !weight_sums || !next_points || !active || !converged || !active_sizes) {
         fprintf(stderr, "Error: Memory allocation failed in mean_shift_matrix\n");
         goto cleanup;
     }
-    
-    #pragma omp parallel
-    {
-        #pragma omp master
-        {
-            printf("Running with %d threads\n", omp_get_num_threads());
-        }
-    }
 
     #pragma omp parallel for
     for (unsigned int i = 0; i < dataset_size; i++) {
         copy_point(&dataset[i], &shifted_dataset[i]);
+        active[i] = i;
     }
     
     *cluster_count = 0;
     
-    // Iterate until convergence or max iterations
+    // Iterate until every point converged or max iterations
     unsigned int iter = 0;
-    T shift_norm = INFINITY;
-    const unsigned int MAX_ITER = 50;
+    unsigned int active_count = dataset_size;
     const T TOLERANCE = EPSILON;
+    unsigned long long shifts = 0; // point updates, summed over the iterations
+    unsigned int empty_windows = 0; // points stopped by an empty window (they converge right away)
     
-    while (iter < MAX_ITER && shift_norm > TOLERANCE) {
-        shift_norm = 0.0;
-        
-        // Compute all pairwise distances 
-        #pragma omp parallel for
-        for (unsigned int i = 0; i < dataset_size; i++) {
-            for (unsigned int j = 0; j < dataset_size; j++) {
-                distances[i * dataset_size + j] = euclidean_distance(&shifted_dataset[i], &dataset[j]);
-            }
-        }
-        
-        // Apply kernel function to distances
-        #pragma omp parallel for
-        for (unsigned int i = 0; i < dataset_size; i++) {
-            for (unsigned int j = 0; j < dataset_size; j++) {
-                weights[i * dataset_size + j] = kernel_func(distances[i * dataset_size + j], bandwidth);
-            }
-        }
-        
-        // Calculate sum of weights (kernels)
-        #pragma omp parallel for
-        for (unsigned int i = 0; i < dataset_size; i++) {
-            weight_sums[i] = 0.0;
-            for (unsigned int j = 0; j < dataset_size; j++) {
-                weight_sums[i] += weights[i * dataset_size + j];
-            }
-        }
-        
-        // Compute new points
-        #pragma omp parallel for
-        for (unsigned int i = 0; i < dataset_size; i++) {
-            init_point(&next_points[i]);
-            
-            // Matrix multiplication: weights * points
-            for (unsigned int j = 0; j < dataset_size; j++) {
-                for (unsigned int d = 0; d < DIM; d++) {
-                    next_points[i].coords[d] += weights[i * dataset_size + j] * shifted_dataset[j].coords[d];
+    while (iter < MAX_ITER && active_count > 0) {
+        perf_phase_begin("matrix_tiles");
+        #pragma omp parallel
+        {
+            T* weights = tiles + omp_get_thread_num() * tile_elems;
+
+            // Rows of the weight matrix are the active points (a = position in the active set)
+            #pragma omp for schedule(dynamic) reduction(+:empty_windows)
+            for (unsigned int row_start = 0; row_start < active_count; row_start += tile.rows) {
+                unsigned int row_end = row_start + tile.rows < active_count ? row_start + tile.rows : active_count;
+
+                for (unsigned int a = row_start; a < row_end; a++) {
+                    init_point(&next_points[a]);
+                    weight_sums[a] = 0.0;
                 }
-            }
-            
-            // Normalize by weight sum
-            if (weight_sums[i] > 0) {
-                for (unsigned int d = 0; d < DIM; d++) {
-                    next_points[i].coords[d] /= weight_sums[i];
+
+                for (unsigned int col_start = 0; col_start < support_size; col_start += tile.cols) {
+                    unsigned int col_end = col_start + tile.cols < support_size ? col_start + tile.cols : support_size;
+                    unsigned int width = col_end - col_start;
+
+                    // Pairwise distances and kernel on the tile
+                    for (unsigned int a = row_start; a < row_end; a++) {
+                        const Point* point = &shifted_dataset[active[a]];
+                        T* row = &weights[(a - row_start) * width];
+                        for (unsigned int j = col_start; j < col_end; j++) {
+                            row[j - col_start] = kernel_func(euclidean_distance(point, &support[j]), bandwidth);
+                        }
+                        if (support_weights) {
+                            for (unsigned int j = col_start; j < col_end; j++) {
+                                row[j - col_start] *= support_weights[j];
+                            }
+                        }
+                    }
+
+                    // Row sums and weights * points on the tile
+                    for (unsigned int a = row_start; a < row_end; a++) {
+                        const T* row = &weights[(a - row_start) * width];
+                        for (unsigned int j = col_start; j < col_end; j++) {
+                            T w = row[j - col_start];
+                            weight_sums[a] += w;
+                            for (unsigned int d = 0; d < DIM; d++) {
+                                next_points[a].coords[d] += w * support[j].coords[d];
+                            }
+                        }
+                    }
                 }
-            } else {
-                #pragma omp critical
-                {
-                    fprintf(stderr, "Error: total_weight == 0, couldn't normalize.\n");
+
+                // Normalize by weight sum, update the point and test its own convergence
+                for (unsigned int a = row_start; a < row_end; a++) {
+                    Point* point = &shifted_dataset[active[a]];
+                    if (weight_sums[a] > 0) {
+                        for (unsigned int d = 0; d < DIM; d++) {
+                            next_points[a].coords[d] /= weight_sums[a];
+                        }
+                    } else {
+                        // empty window (only with a sparse support, e.g. --coreset): the point stays
+                        copy_point(point, &next_points[a]);
+                        empty_windows++;
+                    }
+                    converged[a] = euclidean_distance(point, &next_points[a]) <= TOLERANCE;
+                    copy_point(&next_points[a], point);
                 }
             }
         }
         
-        // Calculate convergence metric
-        T total_shift = 0.0;
-        #pragma omp parallel for reduction(+:total_shift)
-        for (unsigned int i = 0; i < dataset_size; i++) {
-            T point_shift = euclidean_distance(&shifted_dataset[i], &next_points[i]);
-            total_shift += point_shift;
-        }
-        shift_norm = total_shift / dataset_size;
-        
-        // Update current points
-        #pragma omp parallel for
-        for (unsigned int i = 0; i < dataset_size; i++) {
-            copy_point(&next_points[i], &shifted_dataset[i]);
+        perf_phase_end("matrix_tiles");
+
+        // Compact the active set, keeping the dataset order of the remaining points
+        perf_phase_begin("matrix_compact");
+        unsigned int remaining = 0;
+        for (unsigned int a = 0; a < active_count; a++) {
+            if (!converged[a]) active[remaining++] = active[a];
         }
+        perf_phase_end("matrix_compact");
         
+        active_sizes[iter] = active_count;
         iter++;
+        shifts += active_count;
 #ifdef DEBUG
-        if (iter % 10 == 0)
-            printf("Iteration %d, shift_norm: %f\n", iter, shift_norm);
+        printf("Iteration %u: %u active points, %u converged\n", iter, remaining, active_count - remaining);
 #endif
+        active_count = remaining;
     }
+    printf("Iterations completed: %u (%.2f per point on average)\n", iter, dataset_size > 0 ? (double)shifts / dataset_size : 0.0);
+    if (active_count > 0) {
+        printf("Warning: %u points did not converge in %u iterations\n", active_count, MAX_ITER);
+    }
+    record_stat("matrix_iterations", iter);
+    record_stat("unconverged_points", active_count);
+    record_stat("matrix_shifts", (double)shifts);
+    record_stat("matrix_avg_iterations", dataset_size > 0 ? (double)shifts / dataset_size : 0.0);
+    record_stat_values("matrix_active_per_iteration", active_sizes, iter);
+    if (support != dataset) report_empty_windows(empty_windows, dataset_size);
     
     // Cluster assignment (same as in original mean_shift)
-    for (int i = 0; i < dataset_size; i++) {
-        #pragma omp critical
-        {
-            assign_clusters(&shifted_dataset[i], cluster_modes, cluster_count);
-        }
-    }
+    perf_phase_begin("cluster_assignment");
+    assign_clusters_parallel(dataset_size, shifted_dataset, cluster_modes, cluster_count);
+    perf_phase_end("cluster_assignment");
     
 cleanup:
     // Free allocated memory
-    free(distances);
-    free(weights);
+    free(tiles);
     free(weight_sums);
     free(next_points);
+    free(active);
+    free(converged);
+    free(active_sizes);
 }
 
-// Assign clusters to shifted points
-void assign_clusters(Point *shifted_point, Point cluster_modes[],
-                     unsigned int *cluster_count)
-{
-    int c = 0;
-    for (; c < *cluster_count; c++)
-    {
-        T distance_from_cluster = euclidean_distance(shifted_point, &cluster_modes[c]);
-
-        if (distance_from_cluster <= CLUSTER_EPSILON)
-        {
-            copy_point(&cluster_modes[c], shifted_point); // assign cluster mode to shifted point
-            break;
-        }
-    }
-    // Whenever [shifted_point] doesn't belong to any cluster:
-    // --> create cluster with mode in [shifted_point]
-    if (c == *cluster_count)
-    {
-        copy_point(shifted_point, &cluster_modes[c]); // assign cluster mode to shifted point
-        (*cluster_count)++;
-    }
-}
\ No newline at end of file
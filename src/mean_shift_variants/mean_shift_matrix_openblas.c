@@ -1,34 +1,60 @@
 #include "../include/point.h"
 #include "../include/utils.h"
 #include "../include/mean_shift.h"
+#include "../include/coreset.h"
 #include <stdio.h>
 #include <stdlib.h>
 #include <string.h>
 #include <math.h>
 #include <omp.h>
 #include <cblas.h>
-
-// Matrix-based implementation of Mean Shift algorithm (using OpenBLAS)
-void mean_shift(unsigned int dataset_size, const Point dataset[],
-                     Point shifted_dataset[], T bandwidth,
-                     T (*kernel_func)(T, T), Point cluster_modes[],
-                     unsigned int* cluster_count)
+#include "../include/tiling.h"
+#include "../metrics/run_record.h"
+#include "../metrics/perf_counters.h"
+
+// Matrix-based implementation of Mean Shift algorithm (using OpenBLAS).
+// The weight matrix is processed one tile (row block x column block) at a time,
+// so peak memory is bounded by the tile size instead of N x N.
+// Distances come from a GEMM (||x||^2 + ||y||^2 - 2 X Y^T), so kernel_func must be
+// one of the *_kernel_sqrd functions (backends.c passes the squared version of the
+// selected kernel).
+// Rows are the points that have not converged yet (compacted after every iteration),
+// columns are the (weighted) support, whose squared norms are computed once.
+void mean_shift_matrix_blas(unsigned int dataset_size, const Point dataset[],
+                            unsigned int support_size, const Point support[], const T support_weights[],
+                            Point shifted_dataset[], T bandwidth,
+                            T (*kernel_func)(T, T), Point cluster_modes[],
+                            unsigned int* cluster_count)
 {
     printf("OpenBLAS Mean shift\n");
     const unsigned int N = dataset_size;
+    const unsigned int M = support_size;
     const unsigned int D = DIM;
-    const unsigned int MAX_ITER = 50;
+    const unsigned int MAX_ITER = 1000; // safety cap, points stop on their own shift
     const T TOLERANCE = EPSILON;
-    T shift_norm = INFINITY;
+    const T bandwidth_sqrd = bandwidth * bandwidth; // kernel_func takes squared distances
     unsigned int iter = 0;
+    unsigned long long shifts = 0; // point updates, summed over the iterations
+    unsigned int empty_windows = 0; // points stopped by an empty window (they converge right away)
+    unsigned int active_count = N;
+
+    TileSize tile = choose_tile_size_shared(M);
+    printf("Tile size: %u x %u (%.2f MB)\n", tile.rows, tile.cols,
+           (size_t)tile.rows * tile.cols * sizeof(T) / (1024.0 * 1024.0));
 
-    T* distances = (T*)malloc(N * N * sizeof(T));
-    T* weights = (T*)malloc(N * N * sizeof(T));
+    T* weights = (T*)malloc((size_t)tile.rows * tile.cols * sizeof(T));
     T* weight_sums = (T*)malloc(N * sizeof(T));
-    T* flat_points = (T*)malloc(N * D * sizeof(T));
+    T* sqrd_norms = (T*)malloc(N * sizeof(T));          // squared norms of the active points
+    T* support_sqrd_norms = (T*)malloc(M * sizeof(T));  // squared norms of the support
+    T* flat_support = (T*)malloc(M * D * sizeof(T));    // support [M x D]
+    T* flat_points = (T*)malloc(N * D * sizeof(T));     // active points [active_count x D]
     T* flat_new_points = (T*)malloc(N * D * sizeof(T));
+    unsigned int* active = (unsigned int*)malloc(N * sizeof(unsigned int)); // dataset index of each active row
+    unsigned char* converged = (unsigned char*)malloc(N * sizeof(unsigned char));
+    double* active_sizes = (double*)malloc(MAX_ITER * sizeof(double)); // active rows of every iteration
     
-    if (!distances || !weights || !weight_sums || !flat_points || !flat_new_points) {
+    if (!weights || !weight_sums || !sqrd_norms || !support_sqrd_norms || !flat_support ||
+        !flat_points || !flat_new_points || !active || !converged || !active_sizes) {
         fprintf(stderr, "Error: Memory allocation failed in mean_shift_blas\n");
         goto cleanup;
     }
@@ -42,130 +68,170 @@ void mean_shift(unsigned int dataset_size, const Point dataset[],
         }
     }
 
-    // Flatten dataset into row-major matrix [N x D]
+    // Flatten support into row-major matrix [M x D]
     #pragma omp parallel for
-    for (unsigned int i = 0; i < N; i++)
+    for (unsigned int j = 0; j < M; j++) {
+        T norm = 0.0;
+        for (unsigned int d = 0; d < D; d++) {
+            flat_support[j * D + d] = support[j].coords[d];
+            norm += support[j].coords[d] * support[j].coords[d];
+        }
+        support_sqrd_norms[j] = norm;
+    }
+
+    // Flatten dataset into row-major matrix [N x D], every point starts active
+    #pragma omp parallel for
+    for (unsigned int i = 0; i < N; i++) {
         for (unsigned int d = 0; d < D; d++)
             flat_points[i * D + d] = dataset[i].coords[d];
-
+        active[i] = i;
+    }
     memcpy(shifted_dataset, dataset, N * sizeof(Point)); // Initial copy
 
-    while (iter < MAX_ITER && shift_norm > TOLERANCE) {
-        // 1. Compute pairwise distances
-        #pragma omp parallel for collapse(2)
-        for (unsigned int i = 0; i < N; i++) {
-            for (unsigned int j = 0; j < N; j++) {
-                T dist = 0.0;
-                for (unsigned int d = 0; d < D; d++) {
-                    T diff = shifted_dataset[i].coords[d] - shifted_dataset[j].coords[d];
-                    dist += diff * diff;
-                }
-                distances[i * N + j] = sqrt(dist);
-            }
-        }
-
-        // 2. Apply kernel
-        #pragma omp parallel for
-        for (unsigned int i = 0; i < N * N; i++)
-            weights[i] = kernel_func(distances[i], bandwidth);
+    while (iter < MAX_ITER && active_count > 0) {
+        const unsigned int A = active_count;
 
-        // 3. Compute row-wise sum of weights (W1)
+        // Squared norms of the active points, shared by all the tiles
+        perf_phase_begin("matrix_norms");
         #pragma omp parallel for
-        for (unsigned int i = 0; i < N; i++) {
-            // Use appropriate BLAS function based on T type
-            #if defined(T) && T == float
-                weight_sums[i] = cblas_sasum(N, &weights[i * N], 1);
-            #else
-                weight_sums[i] = cblas_dasum(N, (const double*)&weights[i * N], 1);
-            #endif
+        for (unsigned int a = 0; a < A; a++) {
+            T norm = 0.0;
+            for (unsigned int d = 0; d < D; d++)
+                norm += flat_points[a * D + d] * flat_points[a * D + d];
+            sqrd_norms[a] = norm;
+        }
+        perf_phase_end("matrix_norms");
+
+        for (unsigned int row_start = 0; row_start < A; row_start += tile.rows) {
+            const unsigned int rows = row_start + tile.rows < A ? tile.rows : A - row_start;
+
+            for (unsigned int col_start = 0; col_start < M; col_start += tile.cols) {
+                const unsigned int cols = col_start + tile.cols < M ? tile.cols : M - col_start;
+                const int first_block = col_start == 0;
+
+                // 1. Pairwise products: weights = -2 * points[rows] @ support[cols]^T
+                perf_phase_begin("blas_gemm_distances");
+                #if defined(T) && T == float
+                    cblas_sgemm(CblasRowMajor, CblasNoTrans, CblasTrans,
+                                rows, cols, D,
+                                -2.0f, (const float*)&flat_points[(size_t)row_start * D], D,
+                                (const float*)&flat_support[(size_t)col_start * D], D,
+                                0.0f, (float*)weights, cols);
+                #else
+                    cblas_dgemm(CblasRowMajor, CblasNoTrans, CblasTrans,
+                                rows, cols, D,
+                                -2.0, (const double*)&flat_points[(size_t)row_start * D], D,
+                                (const double*)&flat_support[(size_t)col_start * D], D,
+                                0.0, (double*)weights, cols);
+                #endif
+                perf_phase_end("blas_gemm_distances");
+
+                // 2-3. Single pass over the tile: squared distance ||x||^2 + ||y||^2 - 2 x.y,
+                // squared-distance kernel (times the support weight) and row-wise sum of weights (W1)
+                perf_phase_begin("blas_kernel");
+                #pragma omp parallel for
+                for (unsigned int i = 0; i < rows; i++) {
+                    T* row = &weights[(size_t)i * cols];
+                    const T norm_i = sqrd_norms[row_start + i];
+                    T sum = 0.0;
+                    for (unsigned int j = 0; j < cols; j++) {
+                        T dist_sqrd = row[j] + norm_i + support_sqrd_norms[col_start + j];
+                        if (dist_sqrd < 0) dist_sqrd = 0; // rounding on (near) duplicate points
+                        row[j] = kernel_func(dist_sqrd, bandwidth_sqrd);
+                        if (support_weights) row[j] *= support_weights[col_start + j];
+                        sum += row[j];
+                    }
+                    weight_sums[row_start + i] = first_block ? sum : weight_sums[row_start + i] + sum;
+                }
+                perf_phase_end("blas_kernel");
+
+                // 4. Matrix multiplication: new_points[rows] (+)= weights @ support[cols]
+                // weights: [rows x cols], flat_support: [cols x D], result: flat_new_points [rows x D]
+                perf_phase_begin("blas_gemm_update");
+                #if defined(T) && T == float
+                    cblas_sgemm(CblasRowMajor, CblasNoTrans, CblasNoTrans,
+                                rows, D, cols,
+                                1.0f, (const float*)weights, cols, (const float*)&flat_support[(size_t)col_start * D], D,
+                                first_block ? 0.0f : 1.0f, (float*)&flat_new_points[(size_t)row_start * D], D);
+                #else
+                    cblas_dgemm(CblasRowMajor, CblasNoTrans, CblasNoTrans,
+                                rows, D, cols,
+                                1.0, (const double*)weights, cols, (const double*)&flat_support[(size_t)col_start * D], D,
+                                first_block ? 0.0 : 1.0, (double*)&flat_new_points[(size_t)row_start * D], D);
+                #endif
+                perf_phase_end("blas_gemm_update");
+            }
         }
 
-        // 4. Matrix multiplication: new_points = weights @ flat_points
-        // weights: [N x N], flat_points: [N x D], result: flat_new_points [N x D]
-        #if defined(T) && T == float
-            cblas_sgemm(CblasRowMajor, CblasNoTrans, CblasNoTrans,
-                        N, D, N,
-                        1.0f, (const float*)weights, N, (const float*)flat_points, D,
-                        0.0f, (float*)flat_new_points, D);
-        #else
-            cblas_dgemm(CblasRowMajor, CblasNoTrans, CblasNoTrans,
-                        N, D, N,
-                        1.0, (const double*)weights, N, (const double*)flat_points, D,
-                        0.0, (double*)flat_new_points, D);
-        #endif
-
-        // 5. Normalize rows by weight_sums
-        #pragma omp parallel for
-        for (unsigned int i = 0; i < N; i++) {
-            T norm = weight_sums[i];
+        // 5-6. Normalize rows by weight_sums, per-point convergence check and sync back
+        perf_phase_begin("matrix_normalize");
+        #pragma omp parallel for reduction(+:empty_windows)
+        for (unsigned int a = 0; a < A; a++) {
+            T norm = weight_sums[a];
             if (norm > 0) {
                 for (unsigned int d = 0; d < D; d++)
-                    flat_new_points[i * D + d] /= norm;
+                    flat_new_points[a * D + d] /= norm;
             } else {
-                fprintf(stderr, "Warning: weight_sums[%u] == 0\n", i);
+                // empty window (only with a sparse support, e.g. --coreset): the point stays
+                for (unsigned int d = 0; d < D; d++)
+                    flat_new_points[a * D + d] = flat_points[a * D + d];
+                empty_windows++;
+            }
+            T diff_norm = 0.0;
+            for (unsigned int d = 0; d < D; d++) {
+                T diff = flat_new_points[a * D + d] - flat_points[a * D + d];
+                diff_norm += diff * diff;
+                shifted_dataset[active[a]].coords[d] = flat_new_points[a * D + d];
             }
+            converged[a] = sqrt(diff_norm) <= TOLERANCE;
         }
-
-        // 6. Convergence check: compute L2 norm of difference
-        T diff_norm = 0.0;
-        #pragma omp parallel for reduction(+:diff_norm)
-        for (unsigned int i = 0; i < N * D; i++) {
-            T diff = flat_new_points[i] - flat_points[i];
-            diff_norm += diff * diff;
+        perf_phase_end("matrix_normalize");
+
+        // 7. Compact the active rows: only unconverged points take part in the next GEMMs
+        perf_phase_begin("matrix_compact");
+        unsigned int remaining = 0;
+        for (unsigned int a = 0; a < A; a++) {
+            if (converged[a]) continue;
+            memcpy(&flat_points[(size_t)remaining * D], &flat_new_points[(size_t)a * D], D * sizeof(T));
+            active[remaining++] = active[a];
         }
-        shift_norm = sqrt(diff_norm);
-
-        // 7. Update current points
-        memcpy(flat_points, flat_new_points, N * D * sizeof(T));
-
-        // Sync back to shifted_dataset
-        #pragma omp parallel for
-        for (unsigned int i = 0; i < N; i++)
-            for (unsigned int d = 0; d < D; d++)
-                shifted_dataset[i].coords[d] = flat_points[i * D + d];
+        active_count = remaining;
+        perf_phase_end("matrix_compact");
 
+        active_sizes[iter] = A;
         iter++;
+        shifts += A;
 #ifdef DEBUG
-        if (iter % 10 == 0)
-            printf("Iteration %d, shift_norm: %f\n", iter, shift_norm);
+        printf("Iteration %u: %u active points, %u converged\n", iter, remaining, A - remaining);
 #endif
     }
-    printf("Iterations completed: %d\n", iter);
+    printf("Iterations completed: %u (%.2f per point on average)\n", iter, N > 0 ? (double)shifts / N : 0.0);
+    if (active_count > 0) {
+        printf("Warning: %u points did not converge in %u iterations\n", active_count, MAX_ITER);
+    }
+    record_stat("matrix_iterations", iter);
+    record_stat("unconverged_points", active_count);
+    record_stat("matrix_shifts", (double)shifts);
+    record_stat("matrix_avg_iterations", N > 0 ? (double)shifts / N : 0.0);
+    record_stat_values("matrix_active_per_iteration", active_sizes, iter);
+    if (support != dataset) report_empty_windows(empty_windows, N);
 
     // Cluster assignment
-    for (int i = 0; i < N; i++) {
-        assign_clusters(&shifted_dataset[i], cluster_modes, cluster_count);
-    }
+    perf_phase_begin("cluster_assignment");
+    assign_clusters_parallel(N, shifted_dataset, cluster_modes, cluster_count);
+    perf_phase_end("cluster_assignment");
 
 cleanup:
-    free(distances);
     free(weights);
     free(weight_sums);
+    free(sqrd_norms);
+    free(support_sqrd_norms);
+    free(flat_support);
     free(flat_points);
     free(flat_new_points);
+    free(active);
+    free(converged);
+    free(active_sizes);
 }
 
 
-// Assign clusters to shifted points
-void assign_clusters(Point *shifted_point, Point cluster_modes[],
-                     unsigned int *cluster_count)
-{
-    int c = 0;
-    for (; c < *cluster_count; c++)
-    {
-        T distance_from_cluster = euclidean_distance(shifted_point, &cluster_modes[c]);
-
-        if (distance_from_cluster <= CLUSTER_EPSILON)
-        {
-            copy_point(&cluster_modes[c], shifted_point); // assign cluster mode to shifted point
-            break;
-        }
-    }
-    // Whenever [shifted_point] doesn't belong to any cluster:
-    // --> create cluster with mode in [shifted_point]
-    if (c == *cluster_count)
-    {
-        copy_point(shifted_point, &cluster_modes[c]); // assign cluster mode to shifted point
-        (*cluster_count)++;
-    }
-}
\ No newline at end of file
@@ -0,0 +1,131 @@
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <omp.h>
+#include "include/point.h"
+#include "include/utils.h"
+#include "include/mean_shift.h"
+#include "include/backends.h"
+#include "include/dataset_io.h"
+#include "include/meanshift_api.h"
+#include "preprocessing/preprocessing.h"
+
+// The float buffers of the API are reinterpreted as Point arrays
+_Static_assert(sizeof(Point) == DIM * sizeof(float), "the C API needs T=float");
+
+int ms_api_version(void)
+{
+    return MS_API_VERSION;
+}
+
+int ms_point_dim(void)
+{
+    return DIM;
+}
+
+const char *ms_backends(void)
+{
+    return available_backends();
+}
+
+const char *ms_status_message(int status)
+{
+    switch (status) {
+    case MS_OK: return "success";
+    case MS_ERROR_ARGUMENT: return "invalid argument";
+    case MS_ERROR_KERNEL: return "invalid kernel, available: gaussian, uniform, epanechnikov";
+    case MS_ERROR_BACKEND: return "backend not available in this library";
+    case MS_ERROR_MEMORY: return "memory allocation failed";
+    default: return "unknown status";
+    }
+}
+
+static T (*kernel_by_name(const char *name))(T, T)
+{
+    if (strcmp(name, "gaussian") == 0) return gaussian_kernel;
+    if (strcmp(name, "uniform") == 0) return uniform_kernel;
+    if (strcmp(name, "epanechnikov") == 0) return epanechnikov_kernel;
+    return NULL;
+}
+
+// Mean shift of the [count] points, then the label of every point: the shifted points are
+// copies of their mode, so their palette is the list of modes (rewritten in [modes])
+static int shift_and_label(unsigned int count, const Point points[], Point shifted[], uint32_t ids[],
+                           T bandwidth, T (*kernel_func)(T, T), const char *backend,
+                           Point modes[], unsigned int *mode_count)
+{
+    if (mean_shift_weighted_backend(backend, count, points, count, points, NULL, shifted,
+                                    bandwidth, kernel_func, modes, mode_count) != 0) {
+        return MS_ERROR_BACKEND;
+    }
+    long palette_size = build_palette(count, shifted, ids, modes);
+    if (palette_size < 0) return MS_ERROR_MEMORY;
+    *mode_count = (unsigned int)palette_size;
+    return MS_OK;
+}
+
+// SLIC on the image, mean shift of the superpixels, then every pixel takes the mode of its
+// superpixel. [labels] holds the superpixel of every pixel, then its mode.
+static int segment_superpixels(unsigned int count, const Point points[], unsigned int width, unsigned int height,
+                               unsigned int superpixels, T compactness, T bandwidth, T (*kernel_func)(T, T),
+                               const char *backend, Point shifted[], int32_t labels[],
+                               Point modes[], unsigned int *mode_count)
+{
+    if (superpixels > count) superpixels = count;
+    Point *superpixel_dataset = (Point *)malloc(superpixels * sizeof(Point));
+    Point *shifted_superpixels = (Point *)malloc(superpixels * sizeof(Point));
+    uint32_t *ids = (uint32_t *)malloc(superpixels * sizeof(uint32_t));
+    int status = MS_ERROR_MEMORY;
+    if (superpixel_dataset && shifted_superpixels && ids) {
+        // SLIC may place fewer centres than asked for: only those are shifted
+        unsigned int centers = preprocess_dataset(count, points, labels, superpixel_dataset,
+                                                  width, height, superpixels, compactness);
+        status = shift_and_label(centers, superpixel_dataset, shifted_superpixels, ids,
+                                 bandwidth, kernel_func, backend, modes, mode_count);
+    }
+    if (status == MS_OK) {
+        #pragma omp parallel for schedule(static)
+        for (unsigned int i = 0; i < count; i++) {
+            int superpixel = labels[i];
+            copy_point(&shifted_superpixels[superpixel], &shifted[i]);
+            labels[i] = (int32_t)ids[superpixel];
+        }
+    }
+    free(superpixel_dataset);
+    free(shifted_superpixels);
+    free(ids);
+    return status;
+}
+
+int ms_segment(const float *points, unsigned int count, unsigned int width, unsigned int height,
+               double bandwidth, const char *kernel, const char *backend, int threads,
+               unsigned int superpixels, double compactness,
+               float *shifted, int32_t *labels, float *modes, unsigned int *mode_count)
+{
+    if (!points || !shifted || !labels || !modes || !mode_count || count == 0 || !(bandwidth > 0)) {
+        return MS_ERROR_ARGUMENT;
+    }
+    if (superpixels > 0 && (size_t)width * height != count) return MS_ERROR_ARGUMENT;
+    T (*kernel_func)(T, T) = kernel_by_name(kernel ? kernel : KERNEL);
+    if (!kernel_func) return MS_ERROR_KERNEL;
+    if (!backend) backend = selected_backend_name();
+    *mode_count = 0;
+
+    // The thread count is an ICV of the calling thread: other callers keep theirs
+    int previous_threads = omp_get_max_threads();
+    if (threads > 0) omp_set_num_threads(threads);
+
+    int status;
+    if (superpixels > 0) {
+        status = segment_superpixels(count, (const Point *)points, width, height, superpixels, (T)compactness,
+                                     (T)bandwidth, kernel_func, backend, (Point *)shifted, labels,
+                                     (Point *)modes, mode_count);
+    } else {
+        // the labels buffer doubles as the uint32 palette indices (same size, all < count)
+        status = shift_and_label(count, (const Point *)points, (Point *)shifted, (uint32_t *)labels,
+                                 (T)bandwidth, kernel_func, backend, (Point *)modes, mode_count);
+    }
+
+    if (threads > 0) omp_set_num_threads(previous_threads);
+    return status;
+}
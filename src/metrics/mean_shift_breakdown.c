@@ -1,21 +1,33 @@
 #include "../include/point.h"
 #include "../include/utils.h"
 #include "../include/mean_shift.h"
+#include "../include/coreset.h"
+#include "../include/basin.h"
 #include "timing.h"
+#include "run_record.h"
+#include "perf_counters.h"
 #include <stdio.h>
 #include <stdlib.h>
+#include <omp.h>
 
 #ifdef TIMING_BREAKDOWN
-static unsigned int total_shift_calls = 0;
+TIMER_SUM_DEF(kernel)
+TIMER_SUM_DEF(distance_shift)
+TIMER_SUM_DEF(coords_update)
+TIMER_SUM_DEF(distance_kernel)
+TIMER_SUM_DEF(distance_cluster)
+TIMER_SUM_DEF(shift_calls)      // items: shift_single_point calls of each thread
+TIMER_SUM_DEF(shift_points)     // time of each thread in the shifting loop, items: points
+TIMER_SUM_DEF(shift_region)     // wall time of the shifting region
 #endif
 
 // Move a single point towards the maximum density area
 void shift_single_point(const Point *point, Point *next_point,
                               const Point dataset[], unsigned int dataset_size,
-                              T bandwidth, T (*kernel_func)(T, T)) {
+                              const T weights[], T bandwidth, T (*kernel_func)(T, T)) {
 
 #ifdef TIMING_BREAKDOWN
-    total_shift_calls++;
+    TIMER_COUNT(shift_calls, 1)
 #endif
 
     T total_weight = 0;
@@ -26,24 +38,25 @@ void shift_single_point(const Point *point, Point *next_point,
     for (int i = 0; i < dataset_size; i++) {
         copy_point(&dataset[i], &point_i); // xi = dataset[i]
 #ifdef TIMING_BREAKDOWN
-        TIMER_START(distance_kernel)
+        TIMER_SAMPLE_START(distance_kernel)
 #endif
         T distance = euclidean_distance(point, &point_i); // x - xi
 #ifdef TIMING_BREAKDOWN
-        TIMER_SUM(distance_kernel)
-        TIMER_START(kernel)
+        TIMER_SAMPLE_SUM(distance_kernel)
+        TIMER_SAMPLE_START(kernel)
 #endif
         T weight = kernel_func(distance, bandwidth); // K(x - xi / h)
+        if (weights) weight *= weights[i]; // multiplicity of xi
 #ifdef TIMING_BREAKDOWN
-        TIMER_SUM(kernel)
-        TIMER_START(coords_update)
+        TIMER_SAMPLE_SUM(kernel)
+        TIMER_SAMPLE_START(coords_update)
 #endif
         // x' = x' + xi * K(x - xi / h)
         for (int j = 0; j < DIM; j++) {
             next_point->coords[j] += point_i.coords[j] * weight;
         }
 #ifdef TIMING_BREAKDOWN
-        TIMER_SUM(coords_update)
+        TIMER_SAMPLE_SUM(coords_update)
 #endif
         total_weight += weight; // total weight of all points with respect to [point]
     }
@@ -52,38 +65,15 @@ void shift_single_point(const Point *point, Point *next_point,
         // normalization
         divide_point(next_point, total_weight); // x' = x' / sum(K(x - xi / h))
     } else {
-        fprintf(stderr, "Error: total_weight == 0, couldn't normalize.\n");
+        // empty window (only with a sparse support, e.g. --coreset): the point stays where it is
+        copy_point(point, next_point);
     }
 }
 
-// Assign clusters to shifted points
-void assign_clusters(Point *shifted_point, Point cluster_modes[],
-                           unsigned int *cluster_count) {
-    int c = 0;
-    for (; c < *cluster_count; c++) {
-#ifdef TIMING_BREAKDOWN
-        TIMER_START(distance_cluster)
-#endif
-        T distance_from_cluster = euclidean_distance(shifted_point, &cluster_modes[c]);
-#ifdef TIMING_BREAKDOWN
-        TIMER_SUM(distance_cluster)
-#endif
-        if (distance_from_cluster <= CLUSTER_EPSILON) {
-            copy_point(&cluster_modes[c], shifted_point); // assign cluster mode to shifted point
-            break;
-        }
-    }
-    // Whenever [shifted_point] doesn't belong to any cluster:
-    // --> create cluster with mode in [shifted_point]
-    if (c == *cluster_count) {
-        copy_point(shifted_point, &cluster_modes[c]); // assign cluster mode to shifted point
-        (*cluster_count)++;
-    }
-}
 // Convergence loop for a single point
 unsigned int shift_point_until_convergence(const Point *input_point, Point *output_point,
                                    const Point dataset[], unsigned int dataset_size,
-                                   T bandwidth, T (*kernel_func)(T, T))
+                                   const T weights[], T bandwidth, T (*kernel_func)(T, T))
 {
     Point prev_point;
     Point next_point;
@@ -95,7 +85,7 @@ unsigned int shift_point_until_convergence(const Point *input_point, Point *outp
     // Shift until convergence
     while (!stop_moving)
     {
-        shift_single_point(&prev_point, &next_point, dataset, dataset_size, bandwidth, kernel_func);
+        shift_single_point(&prev_point, &next_point, dataset, dataset_size, weights, bandwidth, kernel_func);
 #ifdef TIMING_BREAKDOWN
             TIMER_START(distance_shift)
 #endif
@@ -113,34 +103,91 @@ unsigned int shift_point_until_convergence(const Point *input_point, Point *outp
     copy_point(&prev_point, output_point);
     return iter;
 }
-// Perform the mean shift clustering
-void mean_shift(unsigned int dataset_size, const Point dataset[],
+void mean_shift_basic(unsigned int dataset_size, const Point dataset[],
+                      unsigned int support_size, const Point support[], const T support_weights[],
                       Point shifted_dataset[], T bandwidth,
                       T (*kernel_func)(T, T), Point cluster_modes[],
                       unsigned int *cluster_count) {
+#ifdef TIMING_BREAKDOWN
+    // Every call reports its own times
+    TIMER_RESET(kernel)
+    TIMER_RESET(distance_shift)
+    TIMER_RESET(coords_update)
+    TIMER_RESET(distance_kernel)
+    TIMER_RESET(distance_cluster)
+    TIMER_RESET(shift_calls)
+    TIMER_RESET(shift_points)
+    TIMER_RESET(shift_region)
+#endif
  
     // Shift each point
-    for (int i = 0; i < dataset_size; i++) {
+    perf_phase_begin("shift_points");
+    if (basin_radius > 0) {
+        mean_shift_basins(dataset_size, dataset, support_size, support, support_weights,
+                          shifted_dataset, bandwidth, kernel_func, NULL, NULL, SOA_KERNEL_NONE);
+    } else {
+#ifdef TIMING_BREAKDOWN
+        TIMER_START(shift_region)
+#endif
+        #pragma omp parallel
+        {
+            #pragma omp master
+            {
+                printf("Running with %d threads\n", omp_get_num_threads());
+            }
+#ifdef TIMING_BREAKDOWN
+            TIMER_START(shift_points)
+#endif
+            // nowait: the time a thread waits for the others is its idle time
+            #pragma omp for schedule(dynamic) nowait
+            for (int i = 0; i < dataset_size; i++) {
 #ifdef DEBUG
-        if (i % 500 == 0) {
-            printf("points [%d/%u] ...\n", i, dataset_size);
+                if (i % 500 == 0) {
+                    printf("points [%d/%u] ...\n", i, dataset_size);
+                }
+#endif
+                shift_point_until_convergence(&dataset[i], &shifted_dataset[i], support, support_size,
+                                              support_weights, bandwidth, kernel_func);
+#ifdef TIMING_BREAKDOWN
+                TIMER_COUNT(shift_points, 1)
+#endif
+            }
+#ifdef TIMING_BREAKDOWN
+            TIMER_SUM(shift_points)
+#endif
         }
+#ifdef TIMING_BREAKDOWN
+        TIMER_SUM(shift_region)
 #endif
-    shift_point_until_convergence(&dataset[i], &shifted_dataset[i],
-                                      dataset, dataset_size, bandwidth, kernel_func);
-
-
-       }
-    for (int i = 0; i < dataset_size; i++){
-        assign_clusters(&shifted_dataset[i], cluster_modes, cluster_count);
     }
+    perf_phase_end("shift_points");
+    // Points left in place by an empty window (sparse support only)
+    if (support != dataset) {
+        report_empty_windows(count_empty_windows(dataset_size, shifted_dataset, support_size, support,
+                                                 bandwidth, kernel_func), dataset_size);
+    }
+#ifdef TIMING_BREAKDOWN
+    TIMER_START(distance_cluster)
+#endif
+    perf_phase_begin("cluster_assignment");
+    assign_clusters_parallel(dataset_size, shifted_dataset, cluster_modes, cluster_count);
+    perf_phase_end("cluster_assignment");
+#ifdef TIMING_BREAKDOWN
+    TIMER_SUM(distance_cluster)
+#endif
     
 #ifdef TIMING_BREAKDOWN
-    printf("shift_single_point total calls: %u\n", total_shift_calls);
+    unsigned long long total_shift_calls = 0;
+    for (int t = 0; t < TIMER_MAX_THREADS; t++) total_shift_calls += timers_shift_calls[t].items;
+    printf("shift_single_point total calls: %llu\n", total_shift_calls);
+    record_stat("shift_single_point_calls", (double)total_shift_calls);
     TIMER_SUM_PRINT(coords_update)
     TIMER_SUM_PRINT(kernel)
     TIMER_SUM_PRINT(distance_shift)
     TIMER_SUM_PRINT(distance_kernel)
     TIMER_SUM_PRINT(distance_cluster)
+    if (basin_radius <= 0) {
+        TIMER_BALANCE_PRINT(shift_points, shift_region)
+    }
 #endif
 }
@@ -1,6 +1,7 @@
 #include "../include/point.h"
 #include "../include/utils.h"
 #include "../include/mean_shift.h"
+#include "../include/coreset.h"
 #include "metrics.h"
 #include <stdio.h>
 #include <stdlib.h>
@@ -11,10 +12,11 @@ unsigned int min_iterations = UINT_MAX;
 unsigned int max_iterations = 0;
 double sum_iterations = 0.0;
 double sum_sq_iterations = 0.0;
-clock_t timing_start, timing_end;
+double timing_start, timing_end;
 double elapsed_seconds = 0.0;
 
-void mean_shift(unsigned int dataset_size, const Point dataset[],
+void mean_shift_basic(unsigned int dataset_size, const Point dataset[],
+                      unsigned int support_size, const Point support[], const T support_weights[],
                       Point shifted_dataset[], T bandwidth,
                       T (*kernel_func)(T, T), Point cluster_modes[],
                       unsigned int *cluster_count)
@@ -24,15 +26,19 @@ void mean_shift(unsigned int dataset_size, const Point dataset[],
     // Phase 1: Independent point shifting - parallelizable
     for (int i = 0; i < dataset_size; i++){
         unsigned int iters = shift_point_until_convergence(&dataset[i], &shifted_dataset[i],
-                                      dataset, dataset_size, bandwidth, kernel_func);
+                                      support, support_size, support_weights, bandwidth, kernel_func);
         METRICS_RECORD(i, iters);
     }
 
-    // Phase 2: Cluster assignment - requires synchronization when parallelized
-    for (int i = 0; i < dataset_size; i++){
-        assign_clusters(&shifted_dataset[i], cluster_modes, cluster_count);
+    // Points left in place by an empty window (sparse support only)
+    if (support != dataset) {
+        report_empty_windows(count_empty_windows(dataset_size, shifted_dataset, support_size, support,
+                                                 bandwidth, kernel_func), dataset_size);
     }
 
+    // Phase 2: Cluster assignment
+    assign_clusters_parallel(dataset_size, shifted_dataset, cluster_modes, cluster_count);
+
     METRICS_STOP_TIMER();
     METRICS_WRITE_TO_FILE("./data/metrics_mean_shift.txt", dataset_size, bandwidth, CLUSTER_EPSILON, EPSILON, TYPENAME);
     free(point_iterations);
@@ -42,7 +48,7 @@ void mean_shift(unsigned int dataset_size, const Point dataset[],
 // Convergence loop for a single point
 unsigned int shift_point_until_convergence(const Point *input_point, Point *output_point,
                                    const Point dataset[], unsigned int dataset_size,
-                                   T bandwidth, T (*kernel_func)(T, T))
+                                   const T weights[], T bandwidth, T (*kernel_func)(T, T))
 {
     Point prev_point;
     Point next_point;
@@ -54,7 +60,7 @@ unsigned int shift_point_until_convergence(const Point *input_point, Point *outp
     // Shift until convergence
     while (!stop_moving)
     {
-        shift_single_point(&prev_point, &next_point, dataset, dataset_size, bandwidth, kernel_func);
+        shift_single_point(&prev_point, &next_point, dataset, dataset_size, weights, bandwidth, kernel_func);
         T shift_distance = euclidean_distance(&prev_point, &next_point);
         if (shift_distance <= EPSILON) stop_moving = 1;
         copy_point(&next_point, &prev_point);
@@ -67,7 +73,7 @@ unsigned int shift_point_until_convergence(const Point *input_point, Point *outp
 // Move a single point towards the maximum density area
 void shift_single_point(const Point *point, Point *next_point,
                         const Point dataset[], unsigned int dataset_size,
-                        T bandwidth, T (*kernel_func)(T, T))
+                        const T weights[], T bandwidth, T (*kernel_func)(T, T))
 {
     T total_weight = 0;
     Point point_i;
@@ -80,6 +86,7 @@ void shift_single_point(const Point *point, Point *next_point,
         T distance = euclidean_distance(point, &point_i); // x - xi
 
         T weight = kernel_func(distance, bandwidth);      // K(x - xi / h)
+        if (weights) weight *= weights[i];                // multiplicity of xi
 
         for (int j = 0; j < DIM; j++)                     
         {
@@ -96,32 +103,8 @@ void shift_single_point(const Point *point, Point *next_point,
     }
     else
     {
-        fprintf(stderr, "Error: total_weight == 0, couldn't normalize.\n");
+        // empty window (only with a sparse support, e.g. --coreset): the point stays where it is
+        copy_point(point, next_point);
     }
 }
 
-// Assign clusters to shifted points
-void assign_clusters(Point *shifted_point, Point cluster_modes[],
-                     unsigned int *cluster_count)
-{
-    int c = 0;
-    for (; c < *cluster_count; c++)
-    {
-
-        T distance_from_cluster = euclidean_distance(shifted_point, &cluster_modes[c]);
-
-        if (distance_from_cluster <= CLUSTER_EPSILON)
-        {
-            copy_point(&cluster_modes[c], shifted_point); // assign cluster mode to shifted point
-            break;
-        }
-    }
-    // Whenever [shifted_point] doesn't belong to any cluster:
-    // --> create cluster with mode in [shifted_point]
-    if (c == *cluster_count)
-    {
-        copy_point(shifted_point, &cluster_modes[c]); // assign cluster mode to shifted point
-        (*cluster_count)++;
-
-    }
-}
\ No newline at end of file
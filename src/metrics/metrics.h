@@ -3,9 +3,10 @@
 
 #include <float.h>
 #include <math.h>
-#include <time.h>
 #include <stdio.h>
 #include <limits.h>
+#include <omp.h>
+#include "run_record.h"
 
 extern unsigned int *point_iterations;
 extern unsigned int total_iterations;
@@ -13,7 +14,7 @@ extern unsigned int min_iterations;
 extern unsigned int max_iterations;
 extern double sum_iterations;
 extern double sum_sq_iterations;
-extern clock_t timing_start, timing_end;
+extern double timing_start, timing_end;
 extern double elapsed_seconds;
 
 #define METRICS_INIT(size) \
@@ -36,8 +37,9 @@ extern double elapsed_seconds;
         sum_sq_iterations += (iters)*(iters); \
     } while(0)
 
-#define METRICS_START_TIMER() timing_start = clock()
-#define METRICS_STOP_TIMER()  do { timing_end = clock(); elapsed_seconds = (double)(timing_end - timing_start) / CLOCKS_PER_SEC; } while(0)
+// Wall-clock time: clock() adds up the CPU time of all the threads
+#define METRICS_START_TIMER() timing_start = omp_get_wtime()
+#define METRICS_STOP_TIMER()  do { timing_end = omp_get_wtime(); elapsed_seconds = timing_end - timing_start; } while(0)
 
 #define METRICS_WRITE_TO_FILE(filename, n_points, bandwidth, cluster_epsilon, epsilon, dtype) \
     do { \
@@ -74,6 +76,16 @@ extern double elapsed_seconds;
         else { \
             fprintf(stderr, "Error opening file %s\n", filename); \
         } \
+        double record_mean = sum_iterations / n_points; \
+        record_stat("cluster_epsilon", cluster_epsilon); \
+        record_stat("iteration_epsilon", epsilon); \
+        record_stat("total_iterations", total_iterations); \
+        record_stat("iterations_per_sec", total_iterations / elapsed_seconds); \
+        record_stat("min_iterations", min_iterations); \
+        record_stat("max_iterations", max_iterations); \
+        record_stat("mean_iterations", record_mean); \
+        record_stat("stddev_iterations", sqrt(sum_sq_iterations / n_points - record_mean * record_mean)); \
+        record_timer("metrics_mean_shift", elapsed_seconds); \
     } while(0)
 
 #endif // __METRICS_H__
\ No newline at end of file
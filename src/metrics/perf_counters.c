@@ -0,0 +1,325 @@
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <math.h>
+#include <omp.h>
+#include "perf_counters.h"
+#include "run_record.h"
+
+int perf_counters_enabled = 0;
+
+#ifdef __linux__
+#include <unistd.h>
+#include <errno.h>
+#include <sys/syscall.h>
+#include <linux/perf_event.h>
+
+// Counters of a phase, as reported (and written to the run record)
+static const char *counter_names[] = {
+    "cycles", "instructions", "llc_references", "llc_misses", "fp_ops", "task_clock"
+};
+#define COUNTER_COUNT (int)(sizeof(counter_names) / sizeof(counter_names[0]))
+enum { CYCLES, INSTRUCTIONS, LLC_REFERENCES, LLC_MISSES, FP_OPS, TASK_CLOCK };
+
+typedef struct {
+    const char *name;
+    unsigned int type;
+    unsigned long long config;
+    int counter;            // entry of counter_names it adds to
+    double weight;          // operations per count (FP events count instructions, not lanes)
+} CounterEvent;
+
+// FP_ARITH_INST_RETIRED (event 0xC7, Intel Broadwell and later), one event per vector width:
+// scalar, 128-bit double, 128-bit single + 256-bit double, 256-bit single + 512-bit double,
+// 512-bit single. FMA instructions are already counted twice.
+#define INTEL_FP_EVENT(umask) (((umask) << 8) | 0xC7)
+
+static const CounterEvent events[] = {
+    {"cycles", PERF_TYPE_HARDWARE, PERF_COUNT_HW_CPU_CYCLES, CYCLES, 1},
+    {"instructions", PERF_TYPE_HARDWARE, PERF_COUNT_HW_INSTRUCTIONS, INSTRUCTIONS, 1},
+    {"llc_references", PERF_TYPE_HARDWARE, PERF_COUNT_HW_CACHE_REFERENCES, LLC_REFERENCES, 1},
+    {"llc_misses", PERF_TYPE_HARDWARE, PERF_COUNT_HW_CACHE_MISSES, LLC_MISSES, 1},
+    {"fp_scalar", PERF_TYPE_RAW, INTEL_FP_EVENT(0x03), FP_OPS, 1},
+    {"fp_128_double", PERF_TYPE_RAW, INTEL_FP_EVENT(0x04), FP_OPS, 2},
+    {"fp_128_single_256_double", PERF_TYPE_RAW, INTEL_FP_EVENT(0x18), FP_OPS, 4},
+    {"fp_256_single_512_double", PERF_TYPE_RAW, INTEL_FP_EVENT(0x60), FP_OPS, 8},
+    {"fp_512_single", PERF_TYPE_RAW, INTEL_FP_EVENT(0x80), FP_OPS, 16},
+    {"task_clock", PERF_TYPE_SOFTWARE, PERF_COUNT_SW_TASK_CLOCK, TASK_CLOCK, 1e-9},  // ns
+};
+#define EVENT_COUNT (int)(sizeof(events) / sizeof(events[0]))
+
+// read() of an event opened with TOTAL_TIME_ENABLED | TOTAL_TIME_RUNNING
+typedef struct {
+    unsigned long long value;
+    unsigned long long enabled;
+    unsigned long long running;   // < enabled when the kernel multiplexed the event
+} EventReading;
+
+typedef struct {
+    char name[RUN_RECORD_KEY_SIZE];
+    unsigned int calls;
+    int inside;                   // between begin and end
+    int multiplexed;
+    EventReading *start;          // [threads x events] at perf_phase_begin
+    double counts[EVENT_COUNT];   // counts of all the threads and calls (scaled if multiplexed)
+} Phase;
+
+static int num_threads = 0;
+static int *fds = NULL;           // [threads x events], -1 if not open
+static int available[EVENT_COUNT];
+static int counters_open = 0;
+static int paused = 0;
+static Phase phases[PERF_MAX_PHASES];
+static int phase_count = 0;
+
+// The FP events are Intel-specific raw events
+static int intel_cpu(void)
+{
+    FILE *file = fopen("/proc/cpuinfo", "r");
+    if (!file) return 0;
+    char line[256];
+    int intel = 0;
+    while (fgets(line, sizeof(line), file)) {
+        if (strncmp(line, "vendor_id", 9) == 0) {
+            intel = strstr(line, "GenuineIntel") != NULL;
+            break;
+        }
+    }
+    fclose(file);
+    return intel;
+}
+
+// User-space counter of the calling thread, on any CPU
+static int open_event(const CounterEvent *event)
+{
+    struct perf_event_attr attr;
+    memset(&attr, 0, sizeof(attr));
+    attr.size = sizeof(attr);
+    attr.type = event->type;
+    attr.config = event->config;
+    attr.read_format = PERF_FORMAT_TOTAL_TIME_ENABLED | PERF_FORMAT_TOTAL_TIME_RUNNING;
+    attr.exclude_kernel = 1;
+    attr.exclude_hv = 1;
+    return (int)syscall(SYS_perf_event_open, &attr, 0, -1, -1, 0);
+}
+
+static int read_event(int fd, EventReading *reading)
+{
+    return read(fd, reading, sizeof(*reading)) == (ssize_t)sizeof(*reading) ? 0 : -1;
+}
+
+int init_perf_counters(void)
+{
+    if (!perf_counters_enabled || counters_open) return counters_open ? 0 : -1;
+
+    num_threads = omp_get_max_threads();
+    fds = (int *)malloc((size_t)num_threads * EVENT_COUNT * sizeof(int));
+    if (!fds) {
+        fprintf(stderr, "Error: Memory allocation failed in init_perf_counters\n");
+        return -1;
+    }
+    for (int i = 0; i < num_threads * EVENT_COUNT; i++) fds[i] = -1;
+
+    int intel = intel_cpu();
+    int errors[EVENT_COUNT] = {0};
+
+    // Every thread of the team opens (and will count) its own events
+    #pragma omp parallel num_threads(num_threads)
+    {
+        int t = omp_get_thread_num();
+        for (int e = 0; e < EVENT_COUNT; e++) {
+            if (events[e].type == PERF_TYPE_RAW && !intel) continue;
+            fds[t * EVENT_COUNT + e] = open_event(&events[e]);
+            if (fds[t * EVENT_COUNT + e] < 0) {
+                #pragma omp atomic write
+                errors[e] = errno;
+            }
+        }
+    }
+
+    // An event counts only if every thread has it, so that the phases add up the whole team
+    int opened = 0;
+    int reported[COUNTER_COUNT] = {0};
+    for (int e = 0; e < EVENT_COUNT; e++) {
+        available[e] = 1;
+        for (int t = 0; t < num_threads; t++) {
+            if (fds[t * EVENT_COUNT + e] < 0) available[e] = 0;
+        }
+        if (available[e]) {
+            opened++;
+            continue;
+        }
+        for (int t = 0; t < num_threads; t++) {
+            if (fds[t * EVENT_COUNT + e] >= 0) close(fds[t * EVENT_COUNT + e]);
+            fds[t * EVENT_COUNT + e] = -1;
+        }
+        if (reported[events[e].counter]++) continue; // one line per counter (fp_ops has 5 events)
+        if (events[e].type == PERF_TYPE_RAW && !intel) {
+            printf("perf counters: %s unavailable (no FP event for this CPU)\n", counter_names[events[e].counter]);
+        } else {
+            printf("perf counters: %s unavailable (%s)\n", counter_names[events[e].counter],
+                   errors[e] ? strerror(errors[e]) : "not opened on every thread");
+        }
+    }
+    printf("perf counters: %d of %d events on %d threads\n", opened, EVENT_COUNT, num_threads);
+
+    counters_open = opened > 0;
+    if (!counters_open) {
+        free(fds);
+        fds = NULL;
+        return -1;
+    }
+    return 0;
+}
+
+static Phase *find_phase(const char *name)
+{
+    for (int p = 0; p < phase_count; p++) {
+        if (strcmp(phases[p].name, name) == 0) return &phases[p];
+    }
+    if (phase_count == PERF_MAX_PHASES) {
+        fprintf(stderr, "Warning: too many perf phases, ignoring %s\n", name);
+        return NULL;
+    }
+    Phase *phase = &phases[phase_count];
+    memset(phase, 0, sizeof(*phase));
+    phase->start = (EventReading *)calloc((size_t)num_threads * EVENT_COUNT, sizeof(EventReading));
+    if (!phase->start) return NULL;
+    snprintf(phase->name, sizeof(phase->name), "%s", name);
+    phase_count++;
+    return phase;
+}
+
+void perf_phase_begin(const char *name)
+{
+    if (!counters_open || paused) return;
+    Phase *phase = find_phase(name);
+    if (!phase) return;
+
+    for (int t = 0; t < num_threads; t++) {
+        for (int e = 0; e < EVENT_COUNT; e++) {
+            if (available[e]) read_event(fds[t * EVENT_COUNT + e], &phase->start[t * EVENT_COUNT + e]);
+        }
+    }
+    phase->inside = 1;
+}
+
+void perf_phase_end(const char *name)
+{
+    if (!counters_open || paused) return;
+    Phase *phase = find_phase(name);
+    if (!phase || !phase->inside) return;
+
+    for (int t = 0; t < num_threads; t++) {
+        for (int e = 0; e < EVENT_COUNT; e++) {
+            EventReading end;
+            if (!available[e] || read_event(fds[t * EVENT_COUNT + e], &end) != 0) continue;
+            const EventReading *start = &phase->start[t * EVENT_COUNT + e];
+            double count = (double)(end.value - start->value);
+            unsigned long long enabled = end.enabled - start->enabled;
+            unsigned long long running = end.running - start->running;
+            if (running < enabled) {
+                // Multiplexed: scale the count up to the time the event was enabled
+                phase->multiplexed = 1;
+                count = running > 0 ? count * ((double)enabled / running) : 0.0;
+            }
+            phase->counts[e] += count;
+        }
+    }
+    phase->calls++;
+    phase->inside = 0;
+}
+
+void pause_perf_counters(int pause)
+{
+    paused = pause;
+}
+
+// Appends ", <label> <value><unit>" to [line] unless [value] is n/a (NaN)
+static void append_count(char *line, size_t size, const char *label, double value, const char *unit)
+{
+    if (isnan(value)) return;
+    size_t n = strlen(line);
+    snprintf(line + n, size - n, ", %s %.4g%s", label, value, unit);
+}
+
+void report_perf_counters(void)
+{
+    if (!counters_open) return;
+
+    printf("perf counters (%d threads, user space):\n", num_threads);
+    for (int p = 0; p < phase_count; p++) {
+        Phase *phase = &phases[p];
+
+        // Events added up into the reported counters, n/a unless all of their events counted
+        double values[COUNTER_COUNT];
+        int complete[COUNTER_COUNT];
+        for (int c = 0; c < COUNTER_COUNT; c++) {
+            values[c] = 0.0;
+            complete[c] = 1;
+        }
+        for (int e = 0; e < EVENT_COUNT; e++) {
+            if (available[e]) {
+                values[events[e].counter] += phase->counts[e] * events[e].weight;
+            } else {
+                complete[events[e].counter] = 0;
+            }
+        }
+        for (int c = 0; c < COUNTER_COUNT; c++) {
+            if (!complete[c]) values[c] = NAN;
+        }
+
+        double ipc = values[CYCLES] > 0 ? values[INSTRUCTIONS] / values[CYCLES] : NAN;
+        double miss_rate = values[LLC_REFERENCES] > 0 ? values[LLC_MISSES] / values[LLC_REFERENCES] : NAN;
+        double mpki = values[INSTRUCTIONS] > 0 ? 1000.0 * values[LLC_MISSES] / values[INSTRUCTIONS] : NAN;
+
+        char line[512];
+        // name bounded by its field: with the 8 counters (%.4g) the line stays well below 512
+        snprintf(line, sizeof(line), "perf %.*s: calls %u", (int)sizeof(phase->name), phase->name, phase->calls);
+        append_count(line, sizeof(line), "cycles", values[CYCLES], "");
+        append_count(line, sizeof(line), "instructions", values[INSTRUCTIONS], "");
+        append_count(line, sizeof(line), "IPC", ipc, "");
+        append_count(line, sizeof(line), "LLC misses", values[LLC_MISSES], "");
+        append_count(line, sizeof(line), "LLC miss rate", 100.0 * miss_rate, "%");
+        append_count(line, sizeof(line), "LLC MPKI", mpki, "");
+        append_count(line, sizeof(line), "FP ops", values[FP_OPS], "");
+        append_count(line, sizeof(line), "task-clock", values[TASK_CLOCK], " s");
+        printf("%s%s\n", line, phase->multiplexed ? " (multiplexed, scaled)" : "");
+
+        const char *names[COUNTER_COUNT + 2];
+        double record_values[COUNTER_COUNT + 2];
+        for (int c = 0; c < COUNTER_COUNT; c++) {
+            names[c] = counter_names[c];
+            record_values[c] = values[c];
+        }
+        names[COUNTER_COUNT] = "calls";
+        record_values[COUNTER_COUNT] = phase->calls;
+        names[COUNTER_COUNT + 1] = "threads";
+        record_values[COUNTER_COUNT + 1] = num_threads;
+        record_counters(phase->name, names, record_values, COUNTER_COUNT + 2);
+    }
+
+    for (int i = 0; i < num_threads * EVENT_COUNT; i++) {
+        if (fds[i] >= 0) close(fds[i]);
+    }
+    for (int p = 0; p < phase_count; p++) free(phases[p].start);
+    free(fds);
+    fds = NULL;
+    phase_count = 0;
+    counters_open = 0;
+}
+
+#else // perf_event_open is Linux only
+
+int init_perf_counters(void)
+{
+    if (perf_counters_enabled) printf("perf counters: unavailable (perf_event_open is Linux only)\n");
+    return -1;
+}
+
+void perf_phase_begin(const char *phase) { (void)phase; }
+void perf_phase_end(const char *phase) { (void)phase; }
+void pause_perf_counters(int paused) { (void)paused; }
+void report_perf_counters(void) {}
+
+#endif
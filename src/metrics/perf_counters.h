@@ -0,0 +1,41 @@
+#ifndef __PERF_COUNTERS_H__
+#define __PERF_COUNTERS_H__
+
+// Opt-in hardware counters per phase (--perf-counters on), read with Linux perf_event_open.
+// Every OpenMP thread counts its own user-space events; a phase adds up the counts of all the
+// threads between perf_phase_begin and perf_phase_end, over all its calls.
+// Counted: cycles, instructions, LLC references and misses, FP operations (Intel
+// FP_ARITH_INST_RETIRED, weighted by vector width) and task clock. Events the machine or the
+// kernel (perf_event_paranoid) don't provide are reported as n/a.
+
+// Phases kept (extra phases are ignored with a warning)
+#define PERF_MAX_PHASES 32
+
+// Set from the command line (--perf-counters on|off)
+extern int perf_counters_enabled;
+
+#ifdef __cplusplus
+extern "C" {
+#endif
+
+// Opens the counters of every thread of the OpenMP team. Call once, before the first phase.
+// Returns 0 if at least one event could be opened, -1 otherwise (the phases are then no-ops).
+int init_perf_counters(void);
+
+// Phase boundaries (no-ops unless the counters are enabled and open). The same phase can be
+// entered several times (e.g. once per SLIC iteration), but not nested in itself.
+void perf_phase_begin(const char *phase);
+void perf_phase_end(const char *phase);
+
+// While paused (e.g. during the backend calibration) the phase boundaries are ignored
+void pause_perf_counters(int paused);
+
+// Prints the counters of every phase (IPC, LLC miss rate, FP operations), adds them to the
+// counters section of the run record and closes the counters.
+void report_perf_counters(void);
+
+#ifdef __cplusplus
+}
+#endif
+
+#endif // __PERF_COUNTERS_H__
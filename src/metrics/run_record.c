@@ -0,0 +1,222 @@
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <math.h>
+#include <time.h>
+#include "run_record.h"
+
+const char *metrics_out_path = NULL;
+
+typedef struct {
+    char key[RUN_RECORD_KEY_SIZE];
+    char value[RUN_RECORD_VALUE_SIZE];  // JSON text of the value
+} RecordField;
+
+typedef struct {
+    RecordField fields[RUN_RECORD_MAX_FIELDS];
+    int count;
+} RecordSection;
+
+// Zero-initialised (bss): the sections only take memory once they are filled
+static RecordSection meta;
+static RecordSection timers;
+static RecordSection stats;
+static RecordSection per_thread;  // not "threads": that key is the thread count
+static RecordSection counters;
+static int paused = 0;
+
+// Field [key] of [section], added if missing. NULL when the section is full.
+static RecordField *find_field(RecordSection *section, const char *key)
+{
+    for (int f = 0; f < section->count; f++) {
+        if (strcmp(section->fields[f].key, key) == 0) return &section->fields[f];
+    }
+    if (section->count == RUN_RECORD_MAX_FIELDS) {
+        fprintf(stderr, "Warning: run record section is full, dropping %s\n", key);
+        return NULL;
+    }
+    RecordField *field = &section->fields[section->count++];
+    snprintf(field->key, sizeof(field->key), "%s", key);
+    field->value[0] = '\0';
+    return field;
+}
+
+static void format_number(char *out, size_t size, double value)
+{
+    if (isfinite(value)) {
+        snprintf(out, size, "%.9g", value);
+    } else {
+        snprintf(out, size, "null"); // JSON has no NaN or infinity
+    }
+}
+
+// Writes [text] as a JSON string (quoted and escaped) into [out]
+static void format_string(char *out, size_t size, const char *text)
+{
+    size_t n = 0;
+    if (size < 3) return;
+    out[n++] = '"';
+    for (const unsigned char *c = (const unsigned char *)text; *c && n + 7 < size; c++) {
+        if (*c == '"' || *c == '\\') {
+            out[n++] = '\\';
+            out[n++] = *c;
+        } else if (*c < 0x20) {
+            n += snprintf(out + n, size - n, "\\u%04x", *c);
+        } else {
+            out[n++] = *c;
+        }
+    }
+    out[n++] = '"';
+    out[n] = '\0';
+}
+
+void record_string(const char *key, const char *value)
+{
+    if (paused) return;
+    #pragma omp critical(run_record)
+    {
+        RecordField *field = find_field(&meta, key);
+        if (field) format_string(field->value, sizeof(field->value), value ? value : "");
+    }
+}
+
+void record_number(const char *key, double value)
+{
+    if (paused) return;
+    #pragma omp critical(run_record)
+    {
+        RecordField *field = find_field(&meta, key);
+        if (field) format_number(field->value, sizeof(field->value), value);
+    }
+}
+
+void record_timer(const char *label, double seconds)
+{
+    if (paused) return;
+    #pragma omp critical(run_record)
+    {
+        RecordField *field = find_field(&timers, label);
+        if (field) {
+            double total = field->value[0] ? strtod(field->value, NULL) : 0.0;
+            format_number(field->value, sizeof(field->value), total + seconds);
+        }
+    }
+}
+
+void record_stat(const char *key, double value)
+{
+    if (paused) return;
+    #pragma omp critical(run_record)
+    {
+        RecordField *field = find_field(&stats, key);
+        if (field) format_number(field->value, sizeof(field->value), value);
+    }
+}
+
+// Writes [values] as a JSON array into [out], cut short (still valid) when it doesn't fit
+static void format_values(char *out, size_t size, const double values[], int count)
+{
+    size_t n = snprintf(out, size, "[");
+    for (int v = 0; v < count && n + 32 < size; v++) {
+        char number[32];
+        format_number(number, sizeof(number), values[v]);
+        n += snprintf(out + n, size - n, v ? ", %s" : "%s", number);
+    }
+    snprintf(out + n, size - n, "]");
+}
+
+void record_stat_values(const char *key, const double values[], int count)
+{
+    if (paused) return;
+    #pragma omp critical(run_record)
+    {
+        RecordField *field = find_field(&stats, key);
+        if (field) format_values(field->value, sizeof(field->value), values, count);
+    }
+}
+
+void record_thread_values(const char *key, const double values[], int count)
+{
+    if (paused) return;
+    #pragma omp critical(run_record)
+    {
+        RecordField *field = find_field(&per_thread, key);
+        if (field) format_values(field->value, sizeof(field->value), values, count);
+    }
+}
+
+void record_counters(const char *phase, const char *names[], const double values[], int count)
+{
+    if (paused) return;
+    #pragma omp critical(run_record)
+    {
+        RecordField *field = find_field(&counters, phase);
+        if (field) {
+            size_t size = sizeof(field->value);
+            size_t n = snprintf(field->value, size, "{");
+            for (int c = 0; c < count && n + 96 < size; c++) {
+                char name[RUN_RECORD_KEY_SIZE + 8], number[32];
+                format_string(name, sizeof(name), names[c]);
+                format_number(number, sizeof(number), values[c]);
+                n += snprintf(field->value + n, size - n, c ? ", %s: %s" : "%s: %s", name, number);
+            }
+            snprintf(field->value + n, size - n, "}");
+        }
+    }
+}
+
+void pause_run_record(int pause)
+{
+    paused = pause;
+}
+
+static void write_section(FILE *file, const RecordSection *section)
+{
+    for (int f = 0; f < section->count; f++) {
+        char key[RUN_RECORD_KEY_SIZE + 8];
+        format_string(key, sizeof(key), section->fields[f].key);
+        fprintf(file, "%s%s: %s", f ? ", " : "", key, section->fields[f].value);
+    }
+}
+
+int write_run_record(void)
+{
+    if (!metrics_out_path) return 0;
+
+    FILE *file = fopen(metrics_out_path, "a");
+    if (!file) {
+        fprintf(stderr, "Error opening %s\n", metrics_out_path);
+        return -1;
+    }
+
+    char timestamp[32];
+    time_t now = time(NULL);
+    strftime(timestamp, sizeof(timestamp), "%Y-%m-%dT%H:%M:%SZ", gmtime(&now));
+
+    // {"timestamp": ..., <meta fields>, "timers": {...}, "stats": {...}[, "per_thread": {...}][, "counters": {...}]}
+    fprintf(file, "{\"timestamp\": \"%s\"", timestamp);
+    if (meta.count > 0) {
+        fprintf(file, ", ");
+        write_section(file, &meta);
+    }
+    fprintf(file, ", \"timers\": {");
+    write_section(file, &timers);
+    fprintf(file, "}, \"stats\": {");
+    write_section(file, &stats);
+    fprintf(file, "}");
+    if (per_thread.count > 0) {
+        fprintf(file, ", \"per_thread\": {");
+        write_section(file, &per_thread);
+        fprintf(file, "}");
+    }
+    if (counters.count > 0) {
+        fprintf(file, ", \"counters\": {");
+        write_section(file, &counters);
+        fprintf(file, "}");
+    }
+    fprintf(file, "}\n");
+    fclose(file);
+
+    printf(">>>> Run record appended to: [%s] <<<<\n", metrics_out_path);
+    return 0;
+}
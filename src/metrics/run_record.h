@@ -0,0 +1,52 @@
+#ifndef __RUN_RECORD_H__
+#define __RUN_RECORD_H__
+
+// One JSON Lines record per run (--metrics-out): run metadata, phase timers, statistics,
+// per-thread values of the breakdown builds and hardware counters per phase.
+// Every binary fills the record as it goes and main() appends it to the file at the end.
+
+// Fields kept per section (extra fields are dropped with a warning)
+#define RUN_RECORD_MAX_FIELDS 64
+#define RUN_RECORD_KEY_SIZE 64
+#define RUN_RECORD_VALUE_SIZE 2048    // room for a per-thread or per-iteration array
+
+// Set from the command line (--metrics-out), NULL = no record
+extern const char *metrics_out_path;
+
+#ifdef __cplusplus
+extern "C" {
+#endif
+
+// Run metadata (backend, threads, dataset, ...). Setting a key again replaces its value.
+void record_string(const char *key, const char *value);
+void record_number(const char *key, double value);
+
+// Phase timer in seconds, added up when the same label is recorded more than once
+void record_timer(const char *label, double seconds);
+
+// Iteration and work statistics. Setting a key again replaces its value.
+void record_stat(const char *key, double value);
+
+// Statistic with one value per iteration (e.g. the active points of the matrix variants),
+// stored as an array. Setting a key again replaces its values.
+void record_stat_values(const char *key, const double values[], int count);
+
+// One value per thread (breakdown timers, busy/idle times), stored as an array.
+// Setting a key again replaces its values.
+void record_thread_values(const char *key, const double values[], int count);
+
+// Hardware counters of a phase (--perf-counters), stored as an object {names[i]: values[i]}
+void record_counters(const char *phase, const char *names[], const double values[], int count);
+
+// While paused (e.g. during the backend calibration) the record calls are ignored
+void pause_run_record(int paused);
+
+// Appends the record as one line to metrics_out_path (no-op if NULL).
+// Returns 0 on success, -1 if the file can't be written.
+int write_run_record(void);
+
+#ifdef __cplusplus
+}
+#endif
+
+#endif // __RUN_RECORD_H__
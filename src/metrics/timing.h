@@ -1,50 +1,199 @@
 #ifndef __TIMING_H__
 #define __TIMING_H__
 #include <stdio.h>
+#include <string.h>
 
 #include <omp.h> // Use OpenMP for timing
+#include "run_record.h" // every printed timer also goes to the --metrics-out record
+#include "perf_counters.h" // the total timers are also the phases of --perf-counters
 
 #ifdef TIMING_BREAKDOWN
+// Every label keeps one accumulator per thread: the timers are called from inside the OpenMP
+// regions, and the totals are reported per thread (and summed) by TIMER_SUM_PRINT.
+
+// Per-thread slots of every timer (raise it with -DTIMER_MAX_THREADS=... on bigger machines)
+#ifndef TIMER_MAX_THREADS
+#define TIMER_MAX_THREADS 256
+#endif
+
+// The hot-spot timers (TIMER_SAMPLE_*) time one call in TIMER_SAMPLE_RATE and scale the total
+// up to all the calls. 1 = time every call.
+#ifndef TIMER_SAMPLE_RATE
+#define TIMER_SAMPLE_RATE 1
+#endif
+
+#define TIMER_CACHE_LINE 64
+
+#if defined(__GNUC__)
+#define TIMER_ALIGNED __attribute__((aligned(TIMER_CACHE_LINE)))
+#else
+#define TIMER_ALIGNED
+#endif
+
+// Accumulator of one thread, alone in its cache line so that threads don't invalidate each other
+typedef struct TIMER_ALIGNED {
+    double start;
+    double last;                    // duration of the last timed call
+    double total;                   // sum of the timed calls
+    unsigned long long calls;       // calls, timed or not
+    unsigned long long samples;     // timed calls
+    unsigned long long items;       // work items counted with TIMER_COUNT
+    char padding[TIMER_CACHE_LINE - 3 * sizeof(double) - 3 * sizeof(unsigned long long)];
+} ThreadTimer;
+
+#define TIMER_THREAD() (omp_get_thread_num() % TIMER_MAX_THREADS)
+
 // Timer definition
 #define TIMER_DEF(label) \
-    static double start_##label, end_##label; \
-    static double duration_##label = 0.0;
+    static ThreadTimer timers_##label[TIMER_MAX_THREADS];
+
+// Zeroes every thread of the timer: the timers are static, a second run in the same process
+// (--coreset-verify, the --backend auto calibration) would report the sum of both otherwise
+#define TIMER_RESET(label) \
+    memset(timers_##label, 0, sizeof(timers_##label));
 
 // Timer start
 #define TIMER_START(label) \
-    start_##label = omp_get_wtime();
+    timers_##label[TIMER_THREAD()].start = omp_get_wtime();
 
 // Duration calculation
 #define TIMER_ELAPSED(label) \
-    end_##label = omp_get_wtime(); \
-    duration_##label = end_##label - start_##label;
+    { ThreadTimer *timer_ = &timers_##label[TIMER_THREAD()]; \
+      timer_->last = omp_get_wtime() - timer_->start; }
 
 // Print elapsed time
 #define TIMER_PRINT(label) \
-    printf(#label " execution time: %f s\n", duration_##label);
+    printf(#label " execution time: %f s\n", timers_##label[TIMER_THREAD()].last);
 
 // Define the total time spent in the function
 #define TIMER_SUM_DEF(label) \
-    TIMER_DEF(label) \
-    static double total_##label##_time = 0.0;
+    TIMER_DEF(label)
 
 // Accumulates the total time spent in the function
 #define TIMER_SUM(label) \
-    TIMER_ELAPSED(label) \
-    total_##label##_time += duration_##label;
+    { ThreadTimer *timer_ = &timers_##label[TIMER_THREAD()]; \
+      timer_->last = omp_get_wtime() - timer_->start; \
+      timer_->total += timer_->last; \
+      timer_->calls++; \
+      timer_->samples++; }
+
+// Same as TIMER_START/TIMER_SUM, for the fine-grained hot spots: only one call in
+// TIMER_SAMPLE_RATE reads the clock
+#define TIMER_SAMPLE_START(label) \
+    { ThreadTimer *timer_ = &timers_##label[TIMER_THREAD()]; \
+      if (timer_->calls++ % TIMER_SAMPLE_RATE == 0) timer_->start = omp_get_wtime(); }
+
+#define TIMER_SAMPLE_SUM(label) \
+    { ThreadTimer *timer_ = &timers_##label[TIMER_THREAD()]; \
+      if ((timer_->calls - 1) % TIMER_SAMPLE_RATE == 0) { \
+          timer_->last = omp_get_wtime() - timer_->start; \
+          timer_->total += timer_->last; \
+          timer_->samples++; } }
 
-// Print the total time spent in the function
+// Counts [n] work items (e.g. points) done by the calling thread
+#define TIMER_COUNT(label, n) \
+    timers_##label[TIMER_THREAD()].items += (n);
+
+// Print the total time spent in the function, summed over the threads, then per thread
 #define TIMER_SUM_PRINT(label) \
-    printf(#label " total execution time: %f s\n", total_##label##_time);
+    print_thread_timers(#label, timers_##label);
+
+// Print the busy and idle time of every thread in a parallel loop: [busy] is started by every
+// thread before the loop and summed after it (nowait), [region] times the whole region
+#define TIMER_BALANCE_PRINT(busy, region) \
+    print_thread_balance(#busy, timers_##busy, thread_timer_total(&timers_##region[0]));
+
+// Time of one thread: the timed calls scaled up to all the calls
+static inline double thread_timer_total(const ThreadTimer *timer)
+{
+    return timer->samples ? timer->total * ((double)timer->calls / timer->samples) : 0.0;
+}
+
+// Threads reported: the slots the threads of this run can use
+static inline int timer_thread_count(void)
+{
+    int threads = omp_get_max_threads();
+    if (threads > TIMER_MAX_THREADS) {
+        fprintf(stderr, "Warning: %d threads share %d timer slots, rebuild with a larger TIMER_MAX_THREADS\n",
+                threads, TIMER_MAX_THREADS);
+        threads = TIMER_MAX_THREADS;
+    }
+    return threads;
+}
+
+static inline void print_thread_timers(const char *label, const ThreadTimer timers[])
+{
+    int threads = timer_thread_count();
+    double per_thread[TIMER_MAX_THREADS];
+    double total = 0.0, max = 0.0;
+    int active = 0;
+    for (int t = 0; t < threads; t++) {
+        per_thread[t] = thread_timer_total(&timers[t]);
+        total += per_thread[t];
+        if (per_thread[t] > max) max = per_thread[t];
+        if (timers[t].calls > 0) active++;
+    }
+
+    printf("%s total execution time: %f s\n", label, total);
+    if (active > 1) { // timed inside a parallel region
+        for (int t = 0; t < threads; t++) {
+            printf("\t%s thread %d: %f s\n", label, t, per_thread[t]);
+        }
+        if (total > 0) printf("\t%s imbalance (max/mean): %.3f\n", label, max * threads / total);
+    }
+    record_timer(label, total);
+    record_thread_values(label, per_thread, threads);
+}
+
+static inline void print_thread_balance(const char *label, const ThreadTimer busy[], double region)
+{
+    int threads = timer_thread_count();
+    double busy_time[TIMER_MAX_THREADS], idle_time[TIMER_MAX_THREADS], items[TIMER_MAX_THREADS];
+    double total_busy = 0.0, max_busy = 0.0;
+    for (int t = 0; t < threads; t++) {
+        busy_time[t] = thread_timer_total(&busy[t]);
+        idle_time[t] = region > busy_time[t] ? region - busy_time[t] : 0.0;
+        items[t] = (double)busy[t].items;
+        total_busy += busy_time[t];
+        if (busy_time[t] > max_busy) max_busy = busy_time[t];
+    }
+
+    printf("%s thread balance (%d threads, %f s region):\n", label, threads, region);
+    for (int t = 0; t < threads; t++) {
+        printf("\tthread %d: busy %f s, idle %f s, %.0f items\n", t, busy_time[t], idle_time[t], items[t]);
+    }
+    double imbalance = total_busy > 0 ? max_busy * threads / total_busy : 1.0;
+    double idle_fraction = region > 0 ? 1.0 - total_busy / (region * threads) : 0.0;
+    printf("%s load imbalance (max/mean busy): %.3f, idle: %.1f%%\n", label, imbalance, 100.0 * idle_fraction);
+
+    char key[RUN_RECORD_KEY_SIZE];
+    snprintf(key, sizeof(key), "%s_busy", label);
+    record_thread_values(key, busy_time, threads);
+    snprintf(key, sizeof(key), "%s_idle", label);
+    record_thread_values(key, idle_time, threads);
+    snprintf(key, sizeof(key), "%s_items", label);
+    record_thread_values(key, items, threads);
+    snprintf(key, sizeof(key), "%s_imbalance", label);
+    record_stat(key, imbalance);
+    snprintf(key, sizeof(key), "%s_idle_fraction", label);
+    record_stat(key, idle_fraction);
+    snprintf(key, sizeof(key), "%s_region", label);
+    record_timer(key, region);
+}
 
 #else
 #define TIMER_DEF(label)
+#define TIMER_RESET(label)
 #define TIMER_START(label)
 #define TIMER_ELAPSED(label)
 #define TIMER_PRINT(label)
 #define TIMER_SUM_DEF(label)
 #define TIMER_SUM(label)
+#define TIMER_SAMPLE_START(label)
+#define TIMER_SAMPLE_SUM(label)
+#define TIMER_COUNT(label, n)
 #define TIMER_SUM_PRINT(label)
+#define TIMER_BALANCE_PRINT(busy, region)
 #endif
 
 #ifdef TOTAL_TIMING
@@ -52,12 +201,15 @@
 #define TOTAL_TIMER_START(label) \
     double start_##label, end_##label; \
     double duration_##label = 0.0; \
+    perf_phase_begin(#label); \
     start_##label = omp_get_wtime();
 
 #define TOTAL_TIMER_STOP(label) \
     end_##label = omp_get_wtime(); \
+    perf_phase_end(#label); \
     duration_##label = end_##label - start_##label; \
-    printf(#label " execution time: %f s\n", duration_##label);
+    printf(#label " execution time: %f s\n", duration_##label); \
+    record_timer(#label, duration_##label);
 
 #endif
 #endif // __TIMING_H__
\ No newline at end of file
@@ -6,13 +6,50 @@
 #ifndef NUM_SUPERPIXELS
 #define NUM_SUPERPIXELS 1000
 #endif
-#define MAX_SUPERPIXELS 6000
 #define MAX_ITER 10
 
+// Set from the command line (--slic-tolerance): SLIC stops before MAX_ITER iterations once the
+// residual (see center_residual) is at most this value. 0 stops only when the centres no longer change.
+extern T slic_tolerance;
+
+// Centres bucketed on their S-spaced grid by a counting sort: the centres in cell (gx, gy) are
+// cell_centers[cell_start[gy * grid_width + gx] .. cell_start[gy * grid_width + gx + 1]),
+// in increasing order. Every centre within S of a pixel is in the 3x3 cells around it.
+typedef struct {
+    int grid_width;
+    int grid_height;
+    int *cell_start;
+    int *cell_centers;
+} CenterGrid;
+
+// Per-thread partial sums of the centre update: thread t owns the entries
+// [t * stride, t * stride + num_centers) of every array. Allocated once per SLIC run
+// (sized to the actual number of centres) and reused by every iteration.
+typedef struct {
+    int num_threads;
+    int num_centers;
+    int stride;         // num_centers rounded up to a cache line of ints
+    Point *centers;
+    int *counts;
+    int *sum_x;
+    int *sum_y;
+} SlicPartialSums;
+
 #ifdef __cplusplus
 extern "C" {
 #endif
 
+// Grid step S of the initial centres, about sqrt(area / num_superpixels). The centres sit at
+// S/2, S/2 + S, ... on both axes and initialize_centers stops at num_superpixels: S grows until
+// the whole grid fits, otherwise the last rows would have no centre and their pixels no label.
+static inline unsigned int slic_grid_step(unsigned int width, unsigned int height, unsigned int num_superpixels)
+{
+    unsigned int S = (unsigned int)sqrt((width * height) / (T)num_superpixels);
+    if (S < 1) S = 1;
+    while (((width - 1 - S / 2) / S + 1) * ((height - 1 - S / 2) / S + 1) > num_superpixels) S++;
+    return S;
+}
+
 unsigned int preprocess_dataset(unsigned int dataset_size,
                         const Point dataset[], int dataset_labels[], Point superpixel_dataset[],
                         unsigned int width, unsigned int height, unsigned int num_superpixels, T m);
@@ -26,14 +63,31 @@ void initialize_centers(const Point dataset[], unsigned int width, unsigned int
 
 void reset_labels_and_distances(int dataset_size, int labels[], T distances[]);
 
+// Returns 0 on success, -1 on allocation failure
+int build_center_grid(CenterGrid *grid, const int center_x[], const int center_y[], int num_centers,
+                      int width, int height, int S);
+
+void free_center_grid(CenterGrid *grid);
+
+// Mean SLIC distance (colour and scaled position) moved by the centres in one update
+T center_residual(int num_centers, const Point old_centers[], const int old_x[], const int old_y[],
+                  const Point centers[], const int center_x[], const int center_y[], int S, T m);
+
 void assignment_step(const Point dataset[], const Point centers[], const int center_x[], const int center_y[],
                             int num_centers, int width, int height, int S, T m,
                             int labels[], T distances[], int dataset_size);
 
 void reset_new_centers(int num_centers, Point new_centers[], int counts[], int sum_x[], int sum_y[]);
 
-void accumulate_cluster_sums(const Point dataset[], int dataset_size, int width,
-                                    int labels[], Point new_centers[], int counts[], int sum_x[], int sum_y[]);
+// Returns 0 on success, -1 on allocation failure
+int init_partial_sums(SlicPartialSums *partials, int num_centers);
+
+void free_partial_sums(SlicPartialSums *partials);
+
+// [partials] holds the per-thread buffers (unused by the OpenACC version, which reduces with atomics)
+void accumulate_cluster_sums(const Point dataset[], int dataset_size, int width, int labels[],
+                                    int num_centers, SlicPartialSums *partials,
+                                    Point new_centers[], int counts[], int sum_x[], int sum_y[]);
 
 void update_centers(int num_centers, Point centers[], int center_x[], int center_y[],
                            const Point new_centers[], const int counts[], const int sum_x[], const int sum_y[]);
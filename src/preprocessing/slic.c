@@ -1,14 +1,20 @@
 #include "preprocessing.h"
 #include "../include/point.h"
 #include "../include/utils.h"
+#include "../metrics/run_record.h"
+#include "../metrics/perf_counters.h"
 #include <math.h>
 #include <float.h>
 #include <omp.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
 
 #ifdef TOTAL_TIMING
 #include "../metrics/timing.h"
 #endif
 
+T slic_tolerance = 0;
 
 unsigned int preprocess_dataset(unsigned int dataset_size,
                                 const Point dataset[], int dataset_labels[], Point superpixel_dataset[],
@@ -16,7 +22,7 @@ unsigned int preprocess_dataset(unsigned int dataset_size,
 {
 
     // Ideal distance between superpixels
-    unsigned int S = sqrt((width * height) / (T)num_superpixels); // area for each superpixel
+    unsigned int S = slic_grid_step(width, height, num_superpixels); // area for each superpixel
 
     unsigned int *center_x = malloc(num_superpixels * sizeof(unsigned int)); // x-coordinates of superpixel centers
     unsigned int *center_y = malloc(num_superpixels * sizeof(unsigned int)); // y-coordinates of superpixel centers
@@ -32,25 +38,70 @@ unsigned int preprocess_dataset(unsigned int dataset_size,
     unsigned int *sum_x = malloc(num_superpixels * sizeof(unsigned int));
     unsigned int *sum_y = malloc(num_superpixels * sizeof(unsigned int));
 
-    for (int iter = 0; iter < MAX_ITER; iter++)
+    // Per-thread buffers of the update step, reused by every iteration
+    SlicPartialSums partials;
+    if (init_partial_sums(&partials, num_centers) != 0)
+        exit(-1);
+
+    // Centres before the update, for the residual
+    Point *old_centers = malloc(num_centers * sizeof(Point));
+    int *old_x = malloc(num_centers * sizeof(int));
+    int *old_y = malloc(num_centers * sizeof(int));
+    double residuals[MAX_ITER]; // for the run record
+
+    int iter = 0;
+    while (iter < MAX_ITER)
     {
         // Associate each pixel with nearest cluster center based on combined color and spatial distance metric
+        perf_phase_begin("slic_assignment");
         assignment_step(dataset, superpixel_dataset, center_x, center_y, num_centers, width, height, S, m, dataset_labels, distances, dataset_size);
+        perf_phase_end("slic_assignment");
 
         // Zero out temporary arrays for calculating new cluster centers in the update phase
         reset_new_centers(num_centers, new_centers, counts, sum_x, sum_y);
 
         // For each cluster, sum color values and spatial coordinates of all assigned pixels for centroid calculation
-        accumulate_cluster_sums(dataset, dataset_size, width, dataset_labels, new_centers, counts, sum_x, sum_y);
+        perf_phase_begin("slic_accumulate");
+        accumulate_cluster_sums(dataset, dataset_size, width, dataset_labels, num_centers, &partials, new_centers, counts, sum_x, sum_y);
+        perf_phase_end("slic_accumulate");
 
         // Recalculate each cluster's center position and color  by averaging the values of all pixels belonging to that cluster
+        memcpy(old_centers, superpixel_dataset, num_centers * sizeof(Point));
+        memcpy(old_x, center_x, num_centers * sizeof(int));
+        memcpy(old_y, center_y, num_centers * sizeof(int));
+        perf_phase_begin("slic_update");
         update_centers(num_centers, superpixel_dataset, center_x, center_y, new_centers, counts, sum_x, sum_y);
+        perf_phase_end("slic_update");
+        iter++;
+
+        // Stop when the centres (almost) no longer move
+        T residual = center_residual(num_centers, old_centers, old_x, old_y, superpixel_dataset, center_x, center_y, S, m);
+        residuals[iter - 1] = residual;
+        if (residual <= slic_tolerance)
+            break;
 
 // reset distances
 #pragma omp parallel for
         for (int i = 0; i < dataset_size; i++)
             distances[i] = DBL_MAX;
     }
+    record_stat("slic_iterations", iter);
+    record_stat("slic_skipped_iterations", MAX_ITER - iter);
+    record_stat_values("slic_residuals", residuals, iter);
+    if (iter < MAX_ITER)
+        printf("SLIC converged after %d of %d iterations (residual <= %g)\n", iter, MAX_ITER, (double)slic_tolerance);
+
+    free_partial_sums(&partials);
+    free(old_centers);
+    free(old_x);
+    free(old_y);
+    free(center_x);
+    free(center_y);
+    free(distances);
+    free(new_centers);
+    free(counts);
+    free(sum_x);
+    free(sum_y);
 
     return num_centers;
 }
@@ -80,35 +131,60 @@ void update_centers(int num_centers, Point centers[], int center_x[], int center
     }
 }
 
-void accumulate_cluster_sums(const Point dataset[], int dataset_size, int width,
-                             int labels[], Point new_centers[], int counts[], int sum_x[], int sum_y[])
+int init_partial_sums(SlicPartialSums *partials, int num_centers)
 {
-    // Private arrays for reduction
-    int local_counts[MAX_SUPERPIXELS] = {0};
-    int local_sum_x[MAX_SUPERPIXELS] = {0};
-    int local_sum_y[MAX_SUPERPIXELS] = {0};
-    Point local_centers[MAX_SUPERPIXELS];
-
-    // Initialize local centers
-    for (int c = 0; c < MAX_SUPERPIXELS; c++)
+    partials->num_threads = omp_get_max_threads();
+    partials->num_centers = num_centers;
+    partials->stride = (num_centers + 15) / 16 * 16; // threads never share a cache line
+    size_t entries = (size_t)partials->num_threads * partials->stride;
+
+    partials->centers = malloc(entries * sizeof(Point));
+    partials->counts = malloc(entries * sizeof(int));
+    partials->sum_x = malloc(entries * sizeof(int));
+    partials->sum_y = malloc(entries * sizeof(int));
+    if (!partials->centers || !partials->counts || !partials->sum_x || !partials->sum_y)
     {
-        init_point(&local_centers[c]);
+        fprintf(stderr, "Error: Memory allocation failed in init_partial_sums\n");
+        free_partial_sums(partials);
+        return -1;
     }
+    return 0;
+}
 
-#pragma omp parallel
+void free_partial_sums(SlicPartialSums *partials)
+{
+    free(partials->centers);
+    free(partials->counts);
+    free(partials->sum_x);
+    free(partials->sum_y);
+    partials->centers = NULL;
+    partials->counts = NULL;
+    partials->sum_x = NULL;
+    partials->sum_y = NULL;
+}
+
+void accumulate_cluster_sums(const Point dataset[], int dataset_size, int width, int labels[],
+                             int num_centers, SlicPartialSums *partials,
+                             Point new_centers[], int counts[], int sum_x[], int sum_y[])
+{
+#pragma omp parallel num_threads(partials->num_threads)
     {
-        // Thread-private arrays
-        int private_counts[MAX_SUPERPIXELS] = {0};
-        int private_sum_x[MAX_SUPERPIXELS] = {0};
-        int private_sum_y[MAX_SUPERPIXELS] = {0};
-        Point private_centers[MAX_SUPERPIXELS];
+        // Thread-private slice of the partial sums, zeroed by its owner
+        size_t offset = (size_t)omp_get_thread_num() * partials->stride;
+        Point *private_centers = partials->centers + offset;
+        int *private_counts = partials->counts + offset;
+        int *private_sum_x = partials->sum_x + offset;
+        int *private_sum_y = partials->sum_y + offset;
 
-        for (int c = 0; c < MAX_SUPERPIXELS; c++)
+        for (int c = 0; c < num_centers; c++)
         {
             init_point(&private_centers[c]);
+            private_counts[c] = 0;
+            private_sum_x[c] = 0;
+            private_sum_y[c] = 0;
         }
 
-#pragma omp for nowait
+#pragma omp for
         for (int i = 0; i < dataset_size; i++)
         {
             int c = labels[i];
@@ -123,33 +199,28 @@ void accumulate_cluster_sums(const Point dataset[], int dataset_size, int width,
             private_counts[c]++;
         }
 
-// Combine results from all threads
-#pragma omp critical
+        // Combine results from all threads: every thread sums a chunk of the centres
+        // over all the slices (after the implicit barrier of the loop above)
+        int team_size = omp_get_num_threads();
+#pragma omp for schedule(static)
+        for (int c = 0; c < num_centers; c++)
         {
-            for (int c = 0; c < MAX_SUPERPIXELS; c++)
+            Point center;
+            init_point(&center);
+            int count = 0, x = 0, y = 0;
+            for (int t = 0; t < team_size; t++)
             {
-                if (private_counts[c] > 0)
-                {
-                    for (int j = 0; j < DIM; j++)
-                        local_centers[c].coords[j] += private_centers[c].coords[j];
-                    local_sum_x[c] += private_sum_x[c];
-                    local_sum_y[c] += private_sum_y[c];
-                    local_counts[c] += private_counts[c];
-                }
+                size_t e = (size_t)t * partials->stride + c;
+                for (int j = 0; j < DIM; j++)
+                    center.coords[j] += partials->centers[e].coords[j];
+                count += partials->counts[e];
+                x += partials->sum_x[e];
+                y += partials->sum_y[e];
             }
-        }
-    }
-
-    // Copy local results to output arrays
-    for (int c = 0; c < MAX_SUPERPIXELS; c++)
-    {
-        if (local_counts[c] > 0)
-        {
-            for (int j = 0; j < DIM; j++)
-                new_centers[c].coords[j] = local_centers[c].coords[j];
-            sum_x[c] = local_sum_x[c];
-            sum_y[c] = local_sum_y[c];
-            counts[c] = local_counts[c];
+            copy_point(&center, &new_centers[c]);
+            counts[c] = count;
+            sum_x[c] = x;
+            sum_y[c] = y;
         }
     }
 }
@@ -197,31 +268,100 @@ void reset_labels_and_distances(int dataset_size, int labels[], T distances[])
     }
 }
 
+int build_center_grid(CenterGrid *grid, const int center_x[], const int center_y[], int num_centers,
+                      int width, int height, int S)
+{
+    grid->grid_width = (width - 1) / S + 1;
+    grid->grid_height = (height - 1) / S + 1;
+    int cells = grid->grid_width * grid->grid_height;
+    grid->cell_start = calloc(cells + 1, sizeof(int));
+    grid->cell_centers = malloc(num_centers * sizeof(int));
+    if (!grid->cell_start || !grid->cell_centers)
+    {
+        fprintf(stderr, "Error: Memory allocation failed in build_center_grid\n");
+        free_center_grid(grid);
+        return -1;
+    }
+
+    // Count the centres of every cell, prefix sum, then scatter (in increasing order)
+    for (int c = 0; c < num_centers; c++)
+        grid->cell_start[(center_y[c] / S) * grid->grid_width + center_x[c] / S + 1]++;
+    for (int cell = 0; cell < cells; cell++)
+        grid->cell_start[cell + 1] += grid->cell_start[cell];
+    int *next = malloc(cells * sizeof(int));
+    if (!next)
+    {
+        fprintf(stderr, "Error: Memory allocation failed in build_center_grid\n");
+        free_center_grid(grid);
+        return -1;
+    }
+    memcpy(next, grid->cell_start, cells * sizeof(int));
+    for (int c = 0; c < num_centers; c++)
+        grid->cell_centers[next[(center_y[c] / S) * grid->grid_width + center_x[c] / S]++] = c;
+    free(next);
+    return 0;
+}
+
+void free_center_grid(CenterGrid *grid)
+{
+    free(grid->cell_start);
+    free(grid->cell_centers);
+    grid->cell_start = NULL;
+    grid->cell_centers = NULL;
+}
+
+T center_residual(int num_centers, const Point old_centers[], const int old_x[], const int old_y[],
+                  const Point centers[], const int center_x[], const int center_y[], int S, T m)
+{
+    T residual = 0;
+#pragma omp parallel for reduction(+ : residual)
+    for (int c = 0; c < num_centers; c++)
+        residual += slic_distance(&old_centers[c], &centers[c], old_x[c], old_y[c], center_x[c], center_y[c], S, m);
+    return num_centers > 0 ? residual / num_centers : 0;
+}
+
 void assignment_step(const Point dataset[], const Point centers[], const int center_x[], const int center_y[],
                      int num_centers, int width, int height, int S, T m,
                      int labels[], T distances[], int dataset_size)
 {
+    CenterGrid grid;
+    if (build_center_grid(&grid, center_x, center_y, num_centers, width, height, S) != 0)
+        exit(-1);
 
 #pragma omp parallel for
-        for (int i = 0; i < dataset_size; i++)
-        {
-            int x = i % width;
-            int y = i / width;
-            T min_dist = DBL_MAX;
-            int best_label = -1;
+    for (int i = 0; i < dataset_size; i++)
+    {
+        int x = i % width;
+        int y = i / width;
+        int gx = x / S;
+        int gy = y / S;
+        T min_dist = DBL_MAX;
+        int best_label = -1;
 
-            for (int c = 0; c < num_centers; c++)
+        // Only the 3x3 cells around the pixel can hold centres within S
+        for (int ny = (gy > 0 ? gy - 1 : 0); ny <= gy + 1 && ny < grid.grid_height; ny++)
+        {
+            for (int nx = (gx > 0 ? gx - 1 : 0); nx <= gx + 1 && nx < grid.grid_width; nx++)
             {
-                if (abs(x - center_x[c]) > S || abs(y - center_y[c]) > S)
-                    continue;
-                T d = slic_distance(&dataset[i], &centers[c], x, y, center_x[c], center_y[c], S, m);
-                if (d < min_dist)
+                int cell = ny * grid.grid_width + nx;
+                for (int k = grid.cell_start[cell]; k < grid.cell_start[cell + 1]; k++)
                 {
-                    min_dist = d;
-                    best_label = c;
+                    int c = grid.cell_centers[k];
+                    if (abs(x - center_x[c]) > S || abs(y - center_y[c]) > S)
+                        continue;
+                    T d = slic_distance(&dataset[i], &centers[c], x, y, center_x[c], center_y[c], S, m);
+                    // lowest index on ties, as the scan over all the centres
+                    if (d < min_dist || (d == min_dist && c < best_label))
+                    {
+                        min_dist = d;
+                        best_label = c;
+                    }
                 }
             }
-            labels[i] = best_label;
-            distances[i] = min_dist;
         }
-    }
\ No newline at end of file
+        labels[i] = best_label;
+        distances[i] = min_dist;
+    }
+
+    free_center_grid(&grid);
+}
@@ -8,11 +8,13 @@
 #include "../metrics/timing.h"
 #endif
 
+T slic_tolerance = 0; // the OpenACC version always runs MAX_ITER iterations
+
 unsigned int preprocess_dataset(unsigned int dataset_size,
                                 const Point dataset[], int dataset_labels[], Point superpixel_dataset[],
                                 unsigned int width, unsigned int height, unsigned int num_superpixels, T m)
 {
-    unsigned int S = sqrt((width * height) / (T)num_superpixels);
+    unsigned int S = slic_grid_step(width, height, num_superpixels); // area for each superpixel
 
     unsigned int *center_x = malloc(num_superpixels * sizeof(unsigned int));
     unsigned int *center_y = malloc(num_superpixels * sizeof(unsigned int));
@@ -36,7 +38,7 @@ unsigned int preprocess_dataset(unsigned int dataset_size,
 
             reset_new_centers(num_centers, new_centers, counts, sum_x, sum_y);
 
-            accumulate_cluster_sums(dataset, dataset_size, width, dataset_labels, new_centers, counts, sum_x, sum_y);
+            accumulate_cluster_sums(dataset, dataset_size, width, dataset_labels, num_centers, NULL, new_centers, counts, sum_x, sum_y);
 
             update_centers(num_centers, superpixel_dataset, center_x, center_y, new_centers, counts, sum_x, sum_y);
 
@@ -103,8 +105,9 @@ void assignment_step(const Point dataset[], const Point centers[], const int cen
     }
 }
 
-void accumulate_cluster_sums(const Point dataset[], int dataset_size, int width,
-                             int labels[], Point new_centers[], int counts[], int sum_x[], int sum_y[])
+void accumulate_cluster_sums(const Point dataset[], int dataset_size, int width, int labels[],
+                             int num_centers, SlicPartialSums *partials,
+                             Point new_centers[], int counts[], int sum_x[], int sum_y[])
 {
 #pragma acc parallel loop
     for (int i = 0; i < dataset_size; i++) {
@@ -0,0 +1,182 @@
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <math.h>
+#include "include/utils.h"
+#include "include/point.h"
+#include "include/mean_shift.h"
+#include "include/soa.h"
+
+int soa_enabled = 1;
+
+SoaKernel soa_kernel_of(T (*kernel_func)(T, T))
+{
+    if (kernel_func == gaussian_kernel) return SOA_KERNEL_GAUSSIAN;
+    if (kernel_func == uniform_kernel) return SOA_KERNEL_UNIFORM;
+    if (kernel_func == epanechnikov_kernel) return SOA_KERNEL_EPANECHNIKOV;
+    return SOA_KERNEL_NONE;
+}
+
+static void *alloc_aligned(size_t size)
+{
+#ifdef _WIN32
+    return _aligned_malloc(size, SOA_ALIGNMENT);
+#else
+    void *block = NULL;
+    return posix_memalign(&block, SOA_ALIGNMENT, size) == 0 ? block : NULL;
+#endif
+}
+
+static void free_aligned(void *block)
+{
+#ifdef _WIN32
+    _aligned_free(block);
+#else
+    free(block);
+#endif
+}
+
+int points_to_soa(const Point points[], const T weights[], unsigned int size, PointsSoA *soa)
+{
+    memset(soa, 0, sizeof(*soa));
+    // every array starts on its own SOA_ALIGNMENT boundary
+    size_t stride = ((size_t)size * sizeof(T) + SOA_ALIGNMENT - 1) / SOA_ALIGNMENT * SOA_ALIGNMENT / sizeof(T);
+    int arrays = DIM + (weights ? 1 : 0);
+    T *block = (T *)alloc_aligned((stride > 0 ? stride : 1) * arrays * sizeof(T));
+    if (!block) {
+        fprintf(stderr, "Error: Memory allocation failed in points_to_soa\n");
+        return -1;
+    }
+    soa->block = block;
+    soa->size = size;
+    for (int d = 0; d < DIM; d++) soa->coords[d] = block + d * stride;
+    if (weights) soa->weights = block + DIM * stride;
+
+    #pragma omp parallel for schedule(static)
+    for (unsigned int i = 0; i < size; i++) {
+        for (int d = 0; d < DIM; d++) soa->coords[d][i] = points[i].coords[d];
+        if (weights) soa->weights[i] = weights[i];
+    }
+    return 0;
+}
+
+void free_soa(PointsSoA *soa)
+{
+    free_aligned(soa->block);
+    memset(soa, 0, sizeof(*soa));
+}
+
+// Neighbours per block of the hot loop: their weights stay in a stack buffer (L1)
+#define SOA_BLOCK 256
+
+// Kernel weights of the block [start, start + count) of the support, with the kernel weight [WEIGHT]
+// (an expression of the squared distance d2). Every specialization gets its own loop, with no call,
+// no sqrt and no branch, so the compiler vectorizes it (one neighbour per SIMD lane).
+#define SOA_BLOCK_WEIGHTS(WEIGHT)                                           \
+    do {                                                                    \
+        _Pragma("omp simd reduction(+:block_weight)")                       \
+        for (unsigned int i = 0; i < count; i++) {                          \
+            T d2 = 0;                                                       \
+            for (int d = 0; d < DIM; d++) {                                 \
+                T diff = coords[d][start + i] - center[d];                  \
+                d2 += diff * diff;                                          \
+            }                                                               \
+            block_weights[i] = (WEIGHT);                                    \
+            block_weight += block_weights[i];                               \
+        }                                                                   \
+    } while (0)
+
+// Kernels on the squared distance, as the *_kernel_sqrd functions of kernels.c. The value is
+// computed for every lane and then selected, so the condition compiles to a blend.
+#define GAUSSIAN_WEIGHT ((T)exp((T)-0.5 * d2 * inv_bandwidth_sqrd))
+#define UNIFORM_WEIGHT (d2 <= bandwidth_sqrd ? (T)1 : (T)0)
+#define EPANECHNIKOV_WEIGHT epanechnikov_select(d2, bandwidth_sqrd, inv_bandwidth_sqrd)
+
+static inline T epanechnikov_select(T d2, T bandwidth_sqrd, T inv_bandwidth_sqrd)
+{
+    T value = (T)0.75 * ((T)1 - d2 * inv_bandwidth_sqrd);
+    return d2 <= bandwidth_sqrd ? value : (T)0;
+}
+
+void shift_single_point_soa(const Point *point, Point *next_point, const PointsSoA *support,
+                            T bandwidth, SoaKernel kernel)
+{
+    const T *const *coords = (const T *const *)support->coords;
+    const T *weights = support->weights;
+    const T bandwidth_sqrd = bandwidth * bandwidth;
+    const T inv_bandwidth_sqrd = (T)1 / bandwidth_sqrd;
+    T center[DIM];
+    T sums[DIM];
+    for (int d = 0; d < DIM; d++) {
+        center[d] = point->coords[d];
+        sums[d] = 0;
+    }
+    T total_weight = 0;
+    T block_weights[SOA_BLOCK];
+
+    for (unsigned int start = 0; start < support->size; start += SOA_BLOCK) {
+        unsigned int count = support->size - start < SOA_BLOCK ? support->size - start : SOA_BLOCK;
+        T block_weight = 0;
+        switch (kernel) {
+        case SOA_KERNEL_GAUSSIAN:
+            if (weights) SOA_BLOCK_WEIGHTS(GAUSSIAN_WEIGHT * weights[start + i]);
+            else SOA_BLOCK_WEIGHTS(GAUSSIAN_WEIGHT);
+            break;
+        case SOA_KERNEL_UNIFORM:
+            if (weights) SOA_BLOCK_WEIGHTS(UNIFORM_WEIGHT * weights[start + i]);
+            else SOA_BLOCK_WEIGHTS(UNIFORM_WEIGHT);
+            break;
+        case SOA_KERNEL_EPANECHNIKOV:
+        default:
+            if (weights) SOA_BLOCK_WEIGHTS(EPANECHNIKOV_WEIGHT * weights[start + i]);
+            else SOA_BLOCK_WEIGHTS(EPANECHNIKOV_WEIGHT);
+            break;
+        }
+        total_weight += block_weight;
+
+        // weighted coordinates, one unit-stride reduction per dimension
+        for (int d = 0; d < DIM; d++) {
+            const T *block_coords = coords[d] + start;
+            T sum = 0;
+            #pragma omp simd reduction(+:sum)
+            for (unsigned int i = 0; i < count; i++) {
+                sum += block_coords[i] * block_weights[i];
+            }
+            sums[d] += sum;
+        }
+    }
+
+    // normalization
+    if (total_weight > 0) {
+        for (int d = 0; d < DIM; d++) next_point->coords[d] = sums[d] / total_weight;
+    } else {
+        // empty window (only with a sparse support, e.g. --coreset): the point stays where it is
+        copy_point(point, next_point);
+    }
+}
+
+unsigned int shift_point_until_convergence_soa(const Point *input_point, Point *output_point,
+                                               const PointsSoA *support, T bandwidth, SoaKernel kernel)
+{
+    Point prev_point;
+    Point next_point;
+    unsigned int iter = 0;
+    int stop_moving = 0;
+
+    copy_point(input_point, &prev_point);
+
+    while (!stop_moving)
+    {
+        shift_single_point_soa(&prev_point, &next_point, support, bandwidth, kernel);
+
+        // squared distances: no sqrt per iteration
+        if (sqrd_euclidean_distance(&prev_point, &next_point) <= (T)(EPSILON * EPSILON))
+        {
+            stop_moving = 1;
+        }
+        copy_point(&next_point, &prev_point);
+        iter++;
+    }
+    copy_point(&prev_point, output_point);
+    return iter;
+}
@@ -0,0 +1,259 @@
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <math.h>
+#include <float.h>
+#include <omp.h>
+#include "include/utils.h"
+#include "include/point.h"
+#include "include/spatial_index.h"
+
+int spatial_index_enabled = 0;
+
+int is_finite_support_kernel(T (*kernel_func)(T, T))
+{
+    return kernel_func == uniform_kernel || kernel_func == epanechnikov_kernel;
+}
+
+// Cell coordinate of [value] along dimension [d]
+static inline int cell_coord(const SpatialIndex *index, const Point *p, int d)
+{
+    return (int)floor((p->coords[d] - index->origin[d]) / index->cell_size);
+}
+
+static unsigned int cell_of(const SpatialIndex *index, const Point *p)
+{
+    unsigned int cell = 0;
+    for (int d = 0; d < DIM; d++) {
+        int c = cell_coord(index, p, d);
+        if (c < 0) c = 0;
+        if (c >= index->dims[d]) c = index->dims[d] - 1;
+        cell = cell * index->dims[d] + c;
+    }
+    return cell;
+}
+
+static int compare_uint(const void *a, const void *b)
+{
+    unsigned int x = *(const unsigned int *)a;
+    unsigned int y = *(const unsigned int *)b;
+    return (x > y) - (x < y);
+}
+
+int build_spatial_index(SpatialIndex *index, const Point dataset[], unsigned int dataset_size,
+                        const T weights[], T bandwidth)
+{
+    memset(index, 0, sizeof(*index));
+    index->size = dataset_size;
+
+    // Bounding box
+    T min_c[DIM], max_c[DIM];
+    for (int d = 0; d < DIM; d++) {
+        min_c[d] = FLT_MAX;
+        max_c[d] = -FLT_MAX;
+    }
+    #pragma omp parallel
+    {
+        T local_min[DIM], local_max[DIM];
+        for (int d = 0; d < DIM; d++) {
+            local_min[d] = FLT_MAX;
+            local_max[d] = -FLT_MAX;
+        }
+        #pragma omp for nowait
+        for (int i = 0; i < dataset_size; i++) {
+            for (int d = 0; d < DIM; d++) {
+                if (dataset[i].coords[d] < local_min[d]) local_min[d] = dataset[i].coords[d];
+                if (dataset[i].coords[d] > local_max[d]) local_max[d] = dataset[i].coords[d];
+            }
+        }
+        #pragma omp critical
+        {
+            for (int d = 0; d < DIM; d++) {
+                if (local_min[d] < min_c[d]) min_c[d] = local_min[d];
+                if (local_max[d] > max_c[d]) max_c[d] = local_max[d];
+            }
+        }
+    }
+
+    // Cell size: at least the bandwidth, enlarged until the grid is small enough
+    double max_cells = (double)dataset_size * SPATIAL_INDEX_MAX_CELLS_PER_POINT;
+    if (max_cells < SPATIAL_INDEX_MIN_CELLS) max_cells = SPATIAL_INDEX_MIN_CELLS;
+    T cell_size = bandwidth > 0 ? bandwidth : 1;
+    double num_cells;
+    for (;;) {
+        num_cells = 1;
+        for (int d = 0; d < DIM; d++) {
+            index->dims[d] = (int)floor((max_c[d] - min_c[d]) / cell_size) + 1;
+            num_cells *= index->dims[d];
+        }
+        if (num_cells <= max_cells) break;
+        cell_size *= 2;
+    }
+    index->cell_size = cell_size;
+    index->num_cells = (unsigned int)num_cells;
+    for (int d = 0; d < DIM; d++) index->origin[d] = min_c[d];
+
+    unsigned int *cell_ids = (unsigned int *)malloc(dataset_size * sizeof(unsigned int));
+    index->ids = (unsigned int *)malloc(dataset_size * sizeof(unsigned int));
+    unsigned int *order = index->ids;
+    unsigned int *fill = (unsigned int *)calloc(index->num_cells, sizeof(unsigned int));
+    index->cell_start = (unsigned int *)calloc(index->num_cells + 1, sizeof(unsigned int));
+    index->points = (Point *)malloc(dataset_size * sizeof(Point));
+    if (weights) index->weights = (T *)malloc(dataset_size * sizeof(T));
+    if (!cell_ids || !order || !fill || !index->cell_start || !index->points || (weights && !index->weights)) {
+        fprintf(stderr, "Error: Memory allocation failed in build_spatial_index\n");
+        free(cell_ids);
+        free(fill);
+        free_spatial_index(index);
+        return -1;
+    }
+
+    // Histogram of points per cell
+    #pragma omp parallel for
+    for (int i = 0; i < dataset_size; i++) {
+        unsigned int cell = cell_of(index, &dataset[i]);
+        cell_ids[i] = cell;
+        #pragma omp atomic
+        index->cell_start[cell + 1]++;
+    }
+
+    // Prefix sum -> first slot of each cell
+    for (unsigned int c = 0; c < index->num_cells; c++) {
+        index->cell_start[c + 1] += index->cell_start[c];
+    }
+
+    // Scatter point indices into their cells
+    #pragma omp parallel for
+    for (int i = 0; i < dataset_size; i++) {
+        unsigned int cell = cell_ids[i];
+        unsigned int slot;
+        #pragma omp atomic capture
+        slot = fill[cell]++;
+        order[index->cell_start[cell] + slot] = i;
+    }
+
+    // Restore dataset order inside each cell (deterministic summation order), then gather
+    #pragma omp parallel for schedule(dynamic, 256)
+    for (unsigned int c = 0; c < index->num_cells; c++) {
+        unsigned int begin = index->cell_start[c];
+        unsigned int count = index->cell_start[c + 1] - begin;
+        if (count > 1) qsort(&order[begin], count, sizeof(unsigned int), compare_uint);
+        for (unsigned int k = begin; k < begin + count; k++) {
+            copy_point(&dataset[order[k]], &index->points[k]);
+            if (weights) index->weights[k] = weights[order[k]];
+        }
+    }
+
+    free(cell_ids);
+    free(fill);
+    return 0;
+}
+
+void free_spatial_index(SpatialIndex *index)
+{
+    free(index->cell_start);
+    free(index->points);
+    free(index->ids);
+    free(index->weights);
+    index->cell_start = NULL;
+    index->points = NULL;
+    index->ids = NULL;
+    index->weights = NULL;
+}
+
+// Range [begin, end) of points in row [r] (0 .. 3^(DIM-1)-1) of the cells around [center].
+// Along the last dimension the 3 cells of a row are contiguous in [points].
+// Returns 0 if the row lies outside the grid.
+static int neighbour_row(const SpatialIndex *index, const int center[DIM], int r,
+                         unsigned int *begin, unsigned int *end)
+{
+    unsigned int row_cell = 0;
+    int code = r;
+    for (int d = 0; d < DIM - 1; d++) {
+        int c = center[d] + (code % 3) - 1;
+        code /= 3;
+        if (c < 0 || c >= index->dims[d]) return 0;
+        row_cell = row_cell * index->dims[d] + c;
+    }
+
+    int last = DIM - 1;
+    int lo = center[last] - 1 < 0 ? 0 : center[last] - 1;
+    int hi = center[last] + 1 >= index->dims[last] ? index->dims[last] - 1 : center[last] + 1;
+    if (lo > hi) return 0;
+    *begin = index->cell_start[row_cell * index->dims[last] + lo];
+    *end = index->cell_start[row_cell * index->dims[last] + hi + 1];
+    return 1;
+}
+
+static int neighbour_rows(void)
+{
+    int rows = 1;
+    for (int d = 0; d < DIM - 1; d++) rows *= 3;
+    return rows;
+}
+
+unsigned int shift_single_point_indexed(const Point *point, Point *next_point,
+                                        const SpatialIndex *index,
+                                        T bandwidth, T (*kernel_func)(T, T))
+{
+    T total_weight = 0;
+    unsigned int candidates = 0;
+    init_point(next_point);
+
+    int center[DIM];
+    for (int d = 0; d < DIM; d++) {
+        center[d] = cell_coord(index, point, d);
+    }
+
+    // Visit the 3^(DIM-1) rows of neighbouring cells
+    int rows = neighbour_rows();
+    for (int r = 0; r < rows; r++) {
+        unsigned int begin, end;
+        if (!neighbour_row(index, center, r, &begin, &end)) continue;
+        candidates += end - begin;
+
+        for (unsigned int i = begin; i < end; i++) {
+            T distance = euclidean_distance(point, &index->points[i]);
+            T weight = kernel_func(distance, bandwidth);
+            if (weight == 0) continue;
+            if (index->weights) weight *= index->weights[i];
+
+            for (int j = 0; j < DIM; j++) {
+                next_point->coords[j] += index->points[i].coords[j] * weight;
+            }
+            total_weight += weight;
+        }
+    }
+
+    // normalization
+    if (total_weight > 0) {
+        divide_point(next_point, total_weight);
+    } else {
+        // isolated point: no neighbour within the bandwidth, it is its own mode
+        copy_point(point, next_point);
+    }
+    return candidates;
+}
+
+unsigned int spatial_index_radius_query(const SpatialIndex *index, const Point *point, T radius,
+                                        void (*visit)(unsigned int id, void *user), void *user)
+{
+    unsigned int found = 0;
+    int center[DIM];
+    for (int d = 0; d < DIM; d++) {
+        center[d] = cell_coord(index, point, d);
+    }
+
+    int rows = neighbour_rows();
+    for (int r = 0; r < rows; r++) {
+        unsigned int begin, end;
+        if (!neighbour_row(index, center, r, &begin, &end)) continue;
+        for (unsigned int i = begin; i < end; i++) {
+            if (euclidean_distance(point, &index->points[i]) <= radius) {
+                visit(index->ids[i], user);
+                found++;
+            }
+        }
+    }
+    return found;
+}
@@ -0,0 +1,92 @@
+#include <stdio.h>
+#include <stdlib.h>
+#include "include/utils.h"
+#include "include/tiling.h"
+
+#ifndef _WIN32
+#include <unistd.h>
+#endif
+
+unsigned int matrix_tile_rows = 0;
+unsigned int matrix_tile_cols = 0;
+double matrix_memory_budget_mb = 0;
+
+size_t cache_size_bytes(int level)
+{
+    long size = -1;
+#if defined(_SC_LEVEL2_CACHE_SIZE) && defined(_SC_LEVEL3_CACHE_SIZE)
+    size = sysconf(level == 2 ? _SC_LEVEL2_CACHE_SIZE : _SC_LEVEL3_CACHE_SIZE);
+#endif
+    if (size > 0) return (size_t)size;
+    return level == 2 ? DEFAULT_L2_CACHE_SIZE : DEFAULT_L3_CACHE_SIZE;
+}
+
+size_t available_memory_bytes(void)
+{
+#if defined(_SC_AVPHYS_PAGES) && defined(_SC_PAGESIZE)
+    long pages = sysconf(_SC_AVPHYS_PAGES);
+    long page_size = sysconf(_SC_PAGESIZE);
+    if (pages > 0 && page_size > 0) return (size_t)pages * (size_t)page_size;
+#endif
+    return 0;
+}
+
+size_t memory_budget_bytes(void)
+{
+    if (matrix_memory_budget_mb > 0) {
+        return (size_t)(matrix_memory_budget_mb * 1024 * 1024);
+    }
+    size_t available = available_memory_bytes();
+    if (available == 0) return (size_t)1 << 30; // 1 GB if unknown
+    return (size_t)(available * DEFAULT_MEMORY_FRACTION);
+}
+
+static unsigned int clamp_tile(size_t value, unsigned int max_value)
+{
+    if (value < 1) return 1;
+    if (value > max_value) return max_value;
+    return (unsigned int)value;
+}
+
+TileSize choose_tile_size_per_thread(unsigned int dataset_size, int num_threads)
+{
+    TileSize tile;
+    size_t budget = memory_budget_bytes() / (num_threads > 0 ? num_threads : 1);
+
+    // Half of L2 for the weight tile, the rest for the column block of points
+    size_t tile_bytes = cache_size_bytes(2) / 2;
+    if (tile_bytes > budget) tile_bytes = budget;
+
+    tile.rows = clamp_tile(matrix_tile_rows ? matrix_tile_rows : 64, dataset_size);
+    if (matrix_tile_cols) {
+        tile.cols = clamp_tile(matrix_tile_cols, dataset_size);
+    } else {
+        tile.cols = clamp_tile(tile_bytes / (tile.rows * sizeof(T)), dataset_size);
+    }
+    if ((size_t)tile.rows * tile.cols * sizeof(T) > budget) {
+        tile.cols = clamp_tile(budget / ((size_t)tile.rows * sizeof(T)), dataset_size);
+    }
+    return tile;
+}
+
+TileSize choose_tile_size_shared(unsigned int dataset_size)
+{
+    TileSize tile;
+    size_t budget = memory_budget_bytes();
+
+    tile.cols = clamp_tile(matrix_tile_cols ? matrix_tile_cols : dataset_size, dataset_size);
+    if (matrix_tile_rows) {
+        tile.rows = clamp_tile(matrix_tile_rows, dataset_size);
+    } else {
+        // Rows that fill the L3 cache, so the GEMM reads the weights while still cached
+        tile.rows = clamp_tile(cache_size_bytes(3) / ((size_t)tile.cols * sizeof(T)), dataset_size);
+    }
+    // Enforce the memory budget, shrinking rows first and then columns
+    if ((size_t)tile.rows * tile.cols * sizeof(T) > budget) {
+        tile.rows = clamp_tile(budget / ((size_t)tile.cols * sizeof(T)), dataset_size);
+        if ((size_t)tile.rows * tile.cols * sizeof(T) > budget) {
+            tile.cols = clamp_tile(budget / ((size_t)tile.rows * sizeof(T)), dataset_size);
+        }
+    }
+    return tile;
+}